@@ -0,0 +1,114 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+import io
+import os
+import time
+import shutil
+import tarfile
+import zipfile
+
+# 支持的压缩包格式 -> 扩展名
+ARCHIVE_FORMATS = {
+    'zip': '.zip',
+    'tar': '.tar',
+}
+
+# 本身已经压缩过的图片格式，再压缩几乎没有收益，直接存储
+STORED_EXTENSIONS = frozenset(('jpg', 'jpeg', 'png', 'gif', 'webp', 'heic', 'avif'))
+
+
+class ArchiveWriter:
+    """按顺序把文件写入一个 ZIP 或 TAR 文件
+
+    先写入同目录下的临时文件，commit() 时再替换为正式文件名，
+    中途取消或出错时调用 abort() 删除临时文件，不会留下不完整的压缩包。
+    ZIP 中已压缩的图片格式直接存储，其余文件使用 deflate 压缩；TAR 不压缩。
+    """
+
+    COPY_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, path, archive_format):
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"不支持的压缩包格式: {archive_format}")
+        self.path = path
+        self.format = archive_format
+        self._tmp_path = f"{path}.{os.getpid()}.tmp"
+        self._names = set()
+        if archive_format == 'zip':
+            self._archive = zipfile.ZipFile(self._tmp_path, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            self._archive = tarfile.open(self._tmp_path, 'w', format=tarfile.PAX_FORMAT)
+
+    @staticmethod
+    def path_for(dst, archive_format):
+        """导出目录 dst 对应的压缩包路径"""
+        return f"{dst}{ARCHIVE_FORMATS[archive_format]}"
+
+    def unique_name(self, name, fallback=None):
+        """返回压缩包中尚未使用的文件名
+
+        name 已被占用时先尝试 fallback（修正扩展名前的文件名），仍被占用时在文件名后追加序号
+        """
+        for candidate in (name, fallback):
+            if candidate and candidate not in self._names:
+                return candidate
+        base, ext = os.path.splitext(name)
+        index = 1
+        while f"{base}_{index}{ext}" in self._names:
+            index += 1
+        return f"{base}_{index}{ext}"
+
+    def add_bytes(self, name, data, mtime):
+        if self.format == 'zip':
+            self._archive.writestr(self._zip_info(name, mtime), data,
+                                   compress_type=self._compress_type(name))
+        else:
+            self._archive.addfile(self._tar_info(name, len(data), mtime), io.BytesIO(data))
+        self._names.add(name)
+
+    def add_file(self, name, fileobj, size, mtime):
+        """从文件对象流式写入，用于无法整个读入内存的大文件"""
+        if self.format == 'zip':
+            info = self._zip_info(name, mtime)
+            info.compress_type = self._compress_type(name)
+            info.file_size = size
+            with self._archive.open(info, 'w', force_zip64=size >= zipfile.ZIP64_LIMIT) as dest:
+                shutil.copyfileobj(fileobj, dest, self.COPY_CHUNK_SIZE)
+        else:
+            self._archive.addfile(self._tar_info(name, size, mtime), fileobj)
+        self._names.add(name)
+
+    def commit(self):
+        self._archive.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        try:
+            self._archive.close()
+        except Exception:
+            pass
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _compress_type(name):
+        ext = os.path.splitext(name)[1][1:].lower()
+        return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+    @staticmethod
+    def _zip_info(name, mtime):
+        # ZIP 只能记录 1980 年以后的时间
+        date_time = time.localtime(max(mtime, 315532800))[:6]
+        return zipfile.ZipInfo(name, date_time)
+
+    @staticmethod
+    def _tar_info(name, size, mtime):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        return info
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""测量 GUI 从启动到首次绘制窗口的耗时
+
+用法：
+    python bench_startup.py                          # 运行 10 次并输出统计结果
+    python bench_startup.py --runs 20 --save-baseline startup_baseline.json
+    python bench_startup.py --baseline startup_baseline.json   # 与基准对比
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_once(script):
+    env = dict(os.environ, QQ_EMOJI_STARTUP_BENCH='1')
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, script], stdout=subprocess.PIPE, env=env, cwd=HERE)
+    # 子进程在首次绘制后输出一行 JSON，读到这一行的时间就是包含解释器启动在内的总耗时
+    line = proc.stdout.readline()
+    wall_ms = (time.perf_counter() - start) * 1000
+    proc.wait()
+    if not line:
+        raise RuntimeError(f"{script} 没有输出启动耗时，退出码 {proc.returncode}")
+    result = json.loads(line)
+    result['wall_ms'] = round(wall_ms, 2)
+    return result
+
+
+def summarize(samples, key):
+    values = [sample[key] for sample in samples]
+    return {
+        'min': round(min(values), 2),
+        'median': round(statistics.median(values), 2),
+        'max': round(max(values), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量 GUI 首次绘制耗时')
+    parser.add_argument('--runs', type=int, default=10, help='运行次数')
+    parser.add_argument('--script', default=os.path.join(HERE, 'main_gui.py'), help='要测量的脚本')
+    parser.add_argument('--baseline', help='与此基准文件对比')
+    parser.add_argument('--save-baseline', help='把本次结果保存为基准文件')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='允许的中位数变慢比例')
+    args = parser.parse_args()
+
+    # 第一次运行用于预热磁盘缓存，不计入统计
+    measure_once(args.script)
+    samples = [measure_once(args.script) for _ in range(args.runs)]
+    report = {
+        'runs': args.runs,
+        'python': sys.version.split()[0],
+        'wall_ms': summarize(samples, 'wall_ms'),
+        'time_to_first_paint_ms': summarize(samples, 'time_to_first_paint_ms'),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        old = baseline['wall_ms']['median']
+        new = report['wall_ms']['median']
+        change = (new - old) / old
+        print(f"启动耗时中位数: 基准 {old} ms, 本次 {new} ms, 变化 {change:+.1%}")
+        if change > args.tolerance:
+            print("❌ 启动速度变慢超过允许范围")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
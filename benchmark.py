@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""生成模拟的 QQ 表情目录，并测量导出各阶段的吞吐量
+
+用法：
+    python benchmark.py generate --root /tmp/qqbench --files 20000
+    python benchmark.py generate --root /tmp/qqbench --files 1000000 --mix jpg=50,gif=40,png=8,webp=2
+    python benchmark.py run --root /tmp/qqbench --runs 3 --save-baseline bench_baseline.json
+    python benchmark.py run --root /tmp/qqbench --baseline bench_baseline.json   # 与基准对比
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import statistics
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from export_engine import ExportEngine
+from qq_config import EMOJI_SUBPATH, detect_encoding, detect_file_encoding
+
+# 各格式的文件头，其余内容用随机字节填充
+FORMAT_HEADERS = {
+    'jpg': b'\xff\xd8\xff\xe0\x00\x10JFIF\x00',
+    'png': b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR',
+    'gif': b'GIF89a',
+    'webp': b'RIFF\x00\x00\x00\x00WEBPVP8 ',
+    'bmp': b'BM',
+}
+
+DEFAULT_MIX = 'jpg=55,gif=35,png=8,webp=2'
+
+STAGES = ('scan', 'copy', 'classify', 'rename', 'encoding')
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        ext, _, weight = item.partition('=')
+        ext = ext.strip().lower()
+        if ext not in FORMAT_HEADERS:
+            raise argparse.ArgumentTypeError(f"不支持的格式: {ext}")
+        mix[ext] = float(weight or 1)
+    return mix
+
+
+def parse_size(text):
+    units = {'k': 1024, 'm': 1024 * 1024}
+    text = text.strip().lower()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def write_user_data_ini(root):
+    """写入 UserDataInfo.ini，和真实的 QQ 一样使用 GBK 编码"""
+    path = os.path.join(root, 'UserDataInfo.ini')
+    with open(path, 'wb') as f:
+        f.write(f"[UserDataSet]\r\nUserDataSavePath={root}\r\n; 模拟数据\r\n".encode('gbk'))
+    return path
+
+
+def generate(root, files, accounts, mix, median_size, sigma, max_size, mislabel, seed):
+    """生成 root/<QQ号>/nt_qq/nt_data/Emoji/personal_emoji/Ori 目录，返回生成的文件数和总字节数
+
+    文件大小服从对数正态分布，mislabel 比例的文件扩展名与实际格式不符（QQ 缓存中很常见）
+    """
+    rng = random.Random(seed)
+    # 随机内容从一块预先生成的数据中截取，生成百万级文件时不会被随机数生成拖慢
+    pool = os.urandom(max_size + 4096)
+    formats = list(mix)
+    weights = [mix[ext] for ext in formats]
+    write_user_data_ini(root)
+
+    total_files = 0
+    total_bytes = 0
+    for index in range(accounts):
+        qq_number = str(10000 + index * 7919)
+        ori = os.path.join(root, qq_number, EMOJI_SUBPATH)
+        os.makedirs(ori, exist_ok=True)
+        for _ in range(files):
+            ext = rng.choices(formats, weights)[0]
+            name_ext = ext
+            if rng.random() < mislabel:
+                name_ext = rng.choice([other for other in FORMAT_HEADERS if other != ext] or [ext])
+            size = int(min(max_size, max(64, rng.lognormvariate(math.log(median_size), sigma))))
+            offset = rng.randrange(0, len(pool) - size)
+            header = FORMAT_HEADERS[ext]
+            name = f"{rng.getrandbits(128):032x}.{name_ext}"
+            with open(os.path.join(ori, name), 'wb') as f:
+                f.write(header)
+                f.write(pool[offset:offset + size - len(header)])
+            total_files += 1
+            total_bytes += size
+    return total_files, total_bytes
+
+
+def find_sources(root):
+    sources = []
+    for name in sorted(os.listdir(root)):
+        ori = os.path.join(root, name, EMOJI_SUBPATH)
+        if name.isdigit() and os.path.isdir(ori):
+            sources.append(ori)
+    return sources
+
+
+def list_files(directory):
+    paths = []
+    total = 0
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            paths.append(entry.path)
+            total += entry.stat().st_size
+    return paths, total
+
+
+def bench_scan(src, work_dir):
+    engine = ExportEngine()
+    files = 0
+    total = 0
+    start = time.perf_counter()
+    for entry, _ in engine.scan_files(src):
+        files += 1
+        total += entry.stat().st_size
+    return time.perf_counter() - start, files, total
+
+
+def bench_copy(src, work_dir, workers):
+    dst = os.path.join(work_dir, 'copy')
+    shutil.rmtree(dst, ignore_errors=True)
+    engine = ExportEngine(workers=workers, incremental=False, dedup=False)
+    start = time.perf_counter()
+    engine.copy_directory_with_progress(src, dst)
+    elapsed = time.perf_counter() - start
+    _, total = list_files(dst)
+    return elapsed, engine.copied, total
+
+
+def bench_classify(src, work_dir):
+    engine = ExportEngine()
+    paths, total = list_files(src)
+    start = time.perf_counter()
+    for path in paths:
+        engine.get_actual_extension(path)
+    return time.perf_counter() - start, len(paths), total
+
+
+def bench_rename(src, work_dir):
+    # 先复制一份未修正扩展名的文件（不计时），再测量批量修正扩展名
+    dst = os.path.join(work_dir, 'rename')
+    shutil.rmtree(dst, ignore_errors=True)
+    shutil.copytree(src, dst)
+    paths, total = list_files(dst)
+    engine = ExportEngine()
+    start = time.perf_counter()
+    engine.batch_correct_extensions(dst)
+    return time.perf_counter() - start, len(paths), total
+
+
+def bench_encoding(src, work_dir, repeat=200):
+    ini_path = os.path.join(work_dir, 'UserDataInfo.ini')
+    write_user_data_ini(work_dir)
+    with open(ini_path, 'rb') as f:
+        data = f.read()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        detect_encoding(data, '[UserDataSet]')
+        detect_file_encoding(ini_path, '[UserDataSet]')
+    return time.perf_counter() - start, repeat * 2, repeat * 2 * len(data)
+
+
+def run_stage(stage, src, work_dir, workers):
+    if stage == 'copy':
+        return bench_copy(src, work_dir, workers)
+    return {
+        'scan': bench_scan,
+        'classify': bench_classify,
+        'rename': bench_rename,
+        'encoding': bench_encoding,
+    }[stage](src, work_dir)
+
+
+def run_benchmarks(root, stages, runs, workers, work_dir):
+    sources = find_sources(root)
+    if not sources:
+        raise SystemExit(f"❌ {root} 中没有找到模拟数据，请先运行 generate")
+    src = sources[0]
+    report = {
+        'python': sys.version.split()[0],
+        'source': src,
+        'runs': runs,
+        'workers': workers,
+        'stages': {},
+    }
+    for stage in stages:
+        samples = []
+        for _ in range(runs):
+            elapsed, files, total = run_stage(stage, src, work_dir, workers)
+            samples.append((elapsed, files, total))
+        elapsed = statistics.median(sample[0] for sample in samples)
+        files, total = samples[-1][1], samples[-1][2]
+        report['stages'][stage] = {
+            'seconds': round(elapsed, 4),
+            'files': files,
+            'bytes': total,
+            'files_per_s': round(files / elapsed, 1) if elapsed else None,
+            'mb_per_s': round(total / elapsed / 1024 / 1024, 2) if elapsed else None,
+        }
+        print(f"{stage:>9}: {elapsed:8.3f} s  {files / elapsed:12.1f} 文件/s  {total / elapsed / 1024 / 1024:9.2f} MB/s",
+              file=sys.stderr)
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """返回比基准变慢超过 tolerance 的阶段列表"""
+    regressions = []
+    for stage, result in report['stages'].items():
+        old = baseline.get('stages', {}).get(stage)
+        if not old or not old.get('files_per_s') or not result.get('files_per_s'):
+            continue
+        change = (result['files_per_s'] - old['files_per_s']) / old['files_per_s']
+        print(f"{stage}: 基准 {old['files_per_s']} 文件/s, 本次 {result['files_per_s']} 文件/s, 变化 {change:+.1%}")
+        if change < -tolerance:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='QQ表情导出性能测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    gen = subparsers.add_parser('generate', help='生成模拟的表情目录')
+    gen.add_argument('--root', required=True, help='模拟的 UserDataSavePath')
+    gen.add_argument('--files', type=int, default=20000, help='每个账号的文件数')
+    gen.add_argument('--accounts', type=int, default=1, help='账号数')
+    gen.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help='格式比例，如 jpg=55,gif=35,png=10')
+    gen.add_argument('--median-size', type=parse_size, default=parse_size('48k'), help='文件大小中位数')
+    gen.add_argument('--sigma', type=float, default=1.0, help='文件大小对数正态分布的 sigma')
+    gen.add_argument('--max-size', type=parse_size, default=parse_size('4m'), help='单个文件最大大小')
+    gen.add_argument('--mislabel', type=float, default=0.3, help='扩展名与实际格式不符的文件比例')
+    gen.add_argument('--seed', type=int, default=1)
+
+    run = subparsers.add_parser('run', help='运行性能测试')
+    run.add_argument('--root', required=True, help='generate 生成的目录')
+    run.add_argument('--stages', default=','.join(STAGES), help=f"要测量的阶段，可选 {','.join(STAGES)}")
+    run.add_argument('--runs', type=int, default=3, help='每个阶段运行次数，取中位数')
+    run.add_argument('--workers', default='auto', help="复制线程数，默认 auto")
+    run.add_argument('--work-dir', help='存放临时输出的目录，默认使用系统临时目录')
+    run.add_argument('--baseline', help='与此基准文件对比')
+    run.add_argument('--save-baseline', help='把本次结果保存为基准文件')
+    run.add_argument('--tolerance', type=float, default=0.10, help='允许的吞吐量下降比例')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        os.makedirs(args.root, exist_ok=True)
+        start = time.perf_counter()
+        files, total = generate(os.path.abspath(args.root), args.files, args.accounts, args.mix, args.median_size,
+                                args.sigma, args.max_size, args.mislabel, args.seed)
+        print(f"✅ 已生成 {files} 个文件，共 {total / 1024 / 1024:.1f} MB，用时 {time.perf_counter() - start:.1f} 秒")
+        return 0
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error(f"未知的阶段: {stage}")
+    workers = args.workers if args.workers == 'auto' else int(args.workers)
+    work_dir = tempfile.mkdtemp(prefix='qq_emoji_bench_', dir=args.work_dir)
+    try:
+        report = run_benchmarks(os.path.abspath(args.root), stages, args.runs, workers, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ 以下阶段变慢超过允许范围: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+import os
+import sqlite3
+import threading
+
+CATALOG_FILE_NAME = '表情目录.db'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS emojis (
+    id INTEGER PRIMARY KEY,
+    account TEXT NOT NULL,
+    source_path TEXT NOT NULL,
+    output_path TEXT,
+    content_hash TEXT,
+    format TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    UNIQUE (account, source_path)
+);
+CREATE INDEX IF NOT EXISTS idx_emojis_account_format ON emojis (account, format);
+CREATE INDEX IF NOT EXISTS idx_emojis_account_first_seen ON emojis (account, first_seen);
+CREATE INDEX IF NOT EXISTS idx_emojis_content_hash ON emojis (content_hash);
+'''
+
+# 同一个源文件再次导出时只更新变化的字段，首次发现时间保持不变；
+# 跳过的文件没有新的哈希、格式和输出路径，保留原有的值；
+# 源文件没有变化且没有新的哈希时大小也保持不变，导出后压缩过的图片仍记录压缩后的大小
+_UPSERT = '''
+INSERT INTO emojis (account, source_path, output_path, content_hash, format, size, mtime_ns, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (account, source_path) DO UPDATE SET
+    output_path = COALESCE(excluded.output_path, emojis.output_path),
+    content_hash = COALESCE(excluded.content_hash, emojis.content_hash),
+    format = COALESCE(excluded.format, emojis.format),
+    size = CASE WHEN excluded.content_hash IS NULL AND excluded.mtime_ns IS emojis.mtime_ns
+                THEN emojis.size ELSE excluded.size END,
+    mtime_ns = excluded.mtime_ns,
+    last_seen = excluded.last_seen
+'''
+
+
+class EmojiCatalog:
+    """记录导出过的表情的 SQLite 数据库
+
+    导出时逐个调用 add()，记录先放在内存中，每 BATCH_SIZE 条在一个事务中批量写入，
+    导出结束时调用 flush() 写入剩余的记录。查询方法直接读数据库，不需要扫描文件。
+    多个程序实例或多个账号同时导出时由 SQLite 的锁保证写入互不干扰。
+    """
+
+    BATCH_SIZE = 1000
+    BUSY_TIMEOUT = 30
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+            # WAL 模式下写入时界面仍然可以查询
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def add(self, account, source_path, size, mtime_ns, seen_at, output_path=None, content_hash=None,
+            file_format=None):
+        with self._lock:
+            self._pending.append((account, source_path, output_path, content_hash, file_format,
+                                  size, mtime_ns, seen_at, seen_at))
+            if len(self._pending) < self.BATCH_SIZE:
+                return
+            rows, self._pending = self._pending, []
+        self._write(rows)
+
+    def flush(self):
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if rows:
+            self._write(rows)
+
+    def _write(self, rows):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(_UPSERT, rows)
+
+    def rename_outputs(self, renamed):
+        """导出文件被改名后更新输出路径和格式，renamed 为 {原输出路径: 新输出路径}"""
+        self.flush()
+        rows = [(new_path, os.path.splitext(new_path)[1][1:].lower() or None, old_path)
+                for old_path, new_path in renamed.items()]
+        if rows:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.executemany('UPDATE emojis SET output_path = ?, format = ? WHERE output_path = ?', rows)
+
+    def update_contents(self, contents):
+        """导出文件的内容被替换（例如压缩了图片）后更新哈希和大小，contents 为 {输出路径: (内容哈希, 大小)}"""
+        self.flush()
+        rows = [(content_hash, size, output_path) for output_path, (content_hash, size) in contents.items()]
+        if rows:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.executemany('UPDATE emojis SET content_hash = ?, size = ? WHERE output_path = ?', rows)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def accounts(self):
+        """返回 [(账号, 表情数, 总字节数, 最近一次导出时间), ...]"""
+        return self._query(
+            'SELECT account, COUNT(*), SUM(size), MAX(last_seen) FROM emojis GROUP BY account ORDER BY account')
+
+    def count_by_format(self, account=None):
+        """返回 [(格式, 数量, 总字节数), ...]，数量多的在前"""
+        if account is None:
+            return self._query(
+                'SELECT format, COUNT(*), SUM(size) FROM emojis GROUP BY format ORDER BY COUNT(*) DESC')
+        return self._query(
+            'SELECT format, COUNT(*), SUM(size) FROM emojis WHERE account = ? '
+            'GROUP BY format ORDER BY COUNT(*) DESC', (account,))
+
+    def new_since(self, timestamp, account=None):
+        """返回 timestamp 之后首次导出的表情 [(账号, 源路径, 输出路径, 格式, 大小, 首次发现时间), ...]"""
+        columns = 'account, source_path, output_path, format, size, first_seen'
+        if account is None:
+            return self._query(
+                f'SELECT {columns} FROM emojis WHERE first_seen >= ? ORDER BY first_seen', (timestamp,))
+        return self._query(
+            f'SELECT {columns} FROM emojis WHERE account = ? AND first_seen >= ? ORDER BY first_seen',
+            (account, timestamp))
+
+    def last_export_time(self, account):
+        """返回该账号最近一次导出的时间戳，没有记录时返回 None"""
+        return self._query('SELECT MAX(last_seen) FROM emojis WHERE account = ?', (account,))[0][0]
+
+    def find_by_hash(self, content_hash):
+        """返回内容相同的所有表情 [(账号, 源路径, 输出路径), ...]"""
+        return self._query(
+            'SELECT account, source_path, output_path FROM emojis WHERE content_hash = ?', (content_hash,))
+
+
+def default_catalog_path():
+    from qq_config import get_app_data_dir
+
+    return os.path.join(get_app_data_dir(), CATALOG_FILE_NAME)
+
+
+def format_size(size):
+    size = float(size or 0)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def describe_formats(rows):
+    """把 count_by_format() 的结果格式化为一行文字"""
+    return '，'.join(f"{file_format or '未知'} {count} 个（{format_size(size)}）" for file_format, count, size in rows)
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+"""不需要图形界面的命令行版本，不导入 PyQt5，可以在没有桌面环境的机器上使用
+
+每个事件输出为标准输出中的一行 JSON（JSON Lines），event 字段表示类型：
+    log       导出日志
+    progress  导出进度，按 --progress-interval 间隔输出
+    accounts  --list 列出的账号
+    query     --query 查询表情目录的结果
+    result    一个账号导出完成
+    summary   全部账号导出完成
+
+用法：
+    python cli.py --list
+    python cli.py --account 12345 --output D:\\表情
+    python cli.py --data-root D:\\QQData --account all --output D:\\表情 --archive zip
+    python cli.py --account 12345 --output D:\\表情 --formats gif --since 2024-01-01 --min-size 10k
+    python cli.py --query new --since 2024-01-01 --account 12345
+    python cli.py --query same --file D:\\表情\\a.gif
+
+退出码：
+    0  全部导出成功
+    1  有文件导出失败
+    2  参数错误
+    3  无法读取配置文件、聊天数据目录或表情目录
+    4  指定的账号不存在
+    130  导出被中断
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+
+from export_engine import ExportEngine
+from export_strategy import EXPORT_STRATEGIES
+from export_filter import ExportFilter, parse_formats, parse_size, parse_date
+from optimizer import ImageOptimizer, OPTIMIZE_MODES, DEFAULT_WEBP_QUALITY
+from catalog import EmojiCatalog, default_catalog_path
+import instrumentation
+from qq_config import (DEFAULT_INI_PATH, get_app_data_dir, get_encoding_cache, read_user_data_save_path,
+                       list_accounts, get_emoji_dir, sanitize_filename, get_account_index)
+
+EXIT_OK = 0
+EXIT_FILE_ERRORS = 1
+EXIT_USAGE = 2
+EXIT_CONFIG = 3
+EXIT_NO_ACCOUNT = 4
+EXIT_INTERRUPTED = 130
+
+
+class JsonEmitter:
+    """把事件逐行写为 JSON，导出引擎的回调可能来自多个线程"""
+
+    def __init__(self, stream, progress_interval):
+        self.stream = stream
+        self.progress_interval = progress_interval
+        self._lock = threading.Lock()
+        self._last_progress = 0.0
+
+    def emit(self, event, **fields):
+        line = json.dumps(dict(event=event, **fields), ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+    def log(self, account, message):
+        self.emit('log', account=account, message=message)
+
+    def progress(self, account, done, total, scan_finished, force=False):
+        if self.progress_interval <= 0:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        self.emit('progress', account=account, done=done, total=total, scan_finished=scan_finished)
+
+
+def resolve_data_root(args, emitter):
+    """返回聊天数据目录，--data-root 优先，否则从配置文件中读取，失败时返回 None"""
+    if args.data_root:
+        return args.data_root
+    try:
+        userdata_save_path, encoding, _ = read_user_data_save_path(args.ini, get_encoding_cache())
+    except FileNotFoundError:
+        emitter.log(None, f"❌ 未找到配置文件: {args.ini}，请用 --ini 或 --data-root 指定")
+        return None
+    except Exception as e:
+        emitter.log(None, f"❌ 读取配置文件失败: {e}")
+        return None
+    if not encoding:
+        emitter.log(None, "❌ 解码失败，未找到匹配编码。请联系开发者或者查看常见问题指南")
+        return None
+    if not userdata_save_path:
+        emitter.log(None, "❌ 无法从配置文件中获取聊天记录路径！请用 --data-root 指定")
+    return userdata_save_path
+
+
+def get_nickname_cache():
+    from nickname import NicknameCache
+
+    return NicknameCache(os.path.join(get_app_data_dir(), '用户昵称缓存.json'))
+
+
+def output_dir_for(output, qq_number, nickname_cache):
+    """与图形界面使用相同的目录名，两边的增量导出清单可以共用；只使用已缓存的昵称，不联网查询"""
+    nickname = nickname_cache.get_name(qq_number) if nickname_cache else None
+    display_name = f"{nickname}（{qq_number}）" if nickname else qq_number
+    return os.path.join(output, f"{sanitize_filename(display_name)}_提取的表情")
+
+
+def export_account(args, emitter, qq_number, src, dst):
+    catalog = EmojiCatalog(args.catalog) if args.catalog else None
+    engine = ExportEngine(
+        on_log=lambda message: emitter.log(qq_number, message),
+        on_progress=lambda done, total, scan_finished: emitter.progress(qq_number, done, total, scan_finished),
+        workers=args.workers, incremental=not args.no_incremental, dedup=not args.no_dedup,
+        archive=args.archive, catalog=catalog, account=qq_number if catalog else None, strategy=args.strategy,
+        export_filter=args.export_filter)
+    started_at = time.time()
+    # 设置了 QQ_EMOJI_PROFILE 环境变量时与图形界面一样用 cProfile 分析导出过程
+    profile_path = instrumentation.profile_output_path(dst)
+    optimize = None
+    try:
+        with instrumentation.maybe_profile(profile_path):
+            result = engine.export(src, dst)
+        emitter.progress(qq_number, engine.done_count(), engine.discovered, True, force=True)
+        if args.optimize and not result['cancelled'] and os.path.isdir(result['output_dir']):
+            with engine.stats.span('optimize'):
+                optimize = optimize_images(args, emitter, engine, qq_number, dst)
+    except KeyboardInterrupt:
+        engine.cancel()
+        raise
+    finally:
+        if catalog:
+            try:
+                catalog.close()
+            except Exception as e:
+                emitter.log(qq_number, f"❌ 写入表情目录失败: {e}")
+
+    stages = engine.stats.to_dict()
+    if args.report:
+        report = instrumentation.build_report(
+            result, stages, started_at, time.time(), profile=profile_path, optimize=optimize,
+            filter=engine.export_filter.to_dict() if engine.export_filter else None)
+        try:
+            instrumentation.write_report(report, instrumentation.report_path(dst))
+        except OSError as e:
+            emitter.log(qq_number, f"❌ 保存导出报告失败: {e}")
+    emitter.emit('result', account=qq_number, output=result['output_dir'], copied=result['copied'],
+                 skipped=result['skipped'], filtered=result['filtered'], renamed=result['renamed'],
+                 name_conflicts=result['name_conflicts'], duplicates=len(result['duplicates']),
+                 errors=[list(error) for error in result['errors']], cancelled=result['cancelled'],
+                 strategies=result['strategies'], optimize=optimize,
+                 seconds=round(time.time() - started_at, 3), stages=stages)
+    return result
+
+
+def optimize_images(args, emitter, engine, qq_number, dst):
+    image_optimizer = ImageOptimizer(
+        args.optimize, quality=args.webp_quality, max_workers=args.processes,
+        on_log=lambda message: emitter.log(qq_number, message),
+        on_progress=lambda done, total: emitter.progress(qq_number, done, total, True))
+    report = image_optimizer.run(dst, ImageOptimizer.record_path(dst))
+    # 转换了格式的文件需要更新导出清单，否则下次增量导出会重新复制原图
+    renamed = report.pop('renamed')
+    engine.rename_outputs(dst, renamed)
+    engine.update_output_contents(dst, report.pop('rewritten'))
+    report['renamed'] = len(renamed)
+    report['errors'] = [list(error) for error in report['errors']]
+    return report
+
+
+def file_content_hash(path):
+    """与导出时记录到表情目录的内容哈希相同"""
+    digest = ExportEngine.new_digest()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def query_catalog(args, emitter):
+    """查询表情目录，不读取 QQ 的配置文件，也不导出"""
+    if not args.catalog or not os.path.isfile(args.catalog):
+        emitter.log(None, f"❌ 还没有表情目录: {args.catalog or '（已用 --catalog 关闭）'}")
+        return EXIT_CONFIG
+    accounts = [qq for qq in dict.fromkeys(args.account) if qq != 'all'] or [None]
+    catalog = EmojiCatalog(args.catalog)
+    try:
+        if args.query == 'accounts':
+            rows = [{'qq': qq, 'files': count, 'bytes': total, 'last_export': last_seen}
+                    for qq, count, total, last_seen in catalog.accounts()
+                    if accounts == [None] or qq in accounts]
+        elif args.query == 'new':
+            rows = [{'qq': qq, 'source': source, 'output': output, 'format': file_format, 'bytes': size,
+                     'first_seen': first_seen}
+                    for account in accounts
+                    for qq, source, output, file_format, size, first_seen in catalog.new_since(args.since, account)]
+        else:
+            try:
+                content_hash = file_content_hash(args.file)
+            except OSError as e:
+                emitter.log(None, f"❌ 读取文件失败: {e}")
+                return EXIT_USAGE
+            rows = [{'qq': qq, 'source': source, 'output': output}
+                    for qq, source, output in catalog.find_by_hash(content_hash)
+                    if accounts == [None] or qq in accounts]
+    except sqlite3.Error as e:
+        emitter.log(None, f"❌ 读取表情目录失败: {e}")
+        return EXIT_CONFIG
+    finally:
+        catalog.close()
+    emitter.emit('query', query=args.query, catalog=args.catalog, rows=rows)
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='QQNT表情包批量提取工具（命令行版）')
+    parser.add_argument('--ini', default=DEFAULT_INI_PATH, help='QQ 的 UserDataInfo.ini 路径')
+    parser.add_argument('--data-root', help='聊天数据目录（包含QQ号文件夹的目录），指定后不读取配置文件')
+    parser.add_argument('--list', action='store_true', help='只列出找到的账号')
+    parser.add_argument('--query', choices=('accounts', 'new', 'same'),
+                        help='查询表情目录，不导出：accounts 各账号导出的数量，new 在 --since 之后首次导出的表情，'
+                             'same 与 --file 内容相同的表情；可以用 --account 只查询某些账号')
+    parser.add_argument('--file', help='--query same 要查找的文件')
+    parser.add_argument('--account', action='append', default=[],
+                        help='要导出的QQ号，可以多次指定，all 表示全部账号')
+    parser.add_argument('--output', help='保存位置，每个账号导出到其中的“<昵称（QQ号）>_提取的表情”')
+    parser.add_argument('--workers', default='auto', help='复制线程数，默认 auto')
+    parser.add_argument('--archive', choices=('zip', 'tar'), help='导出为单个压缩包')
+    parser.add_argument('--strategy', choices=tuple(EXPORT_STRATEGIES), default='copy',
+                        help='导出文件的方式：copy 完整复制，reflink 写时复制克隆，hardlink 硬链接，symlink 符号链接；'
+                             '某个文件不支持时改为完整复制')
+    parser.add_argument('--optimize', choices=tuple(OPTIMIZE_MODES),
+                        help='导出后处理图片：lossless 无损压缩 PNG/GIF/BMP，webp 或 png 把静态图片转换为该格式（需要 Pillow）')
+    parser.add_argument('--webp-quality', type=int, default=DEFAULT_WEBP_QUALITY, help='JPEG 转换为 WebP 时的质量')
+    parser.add_argument('--processes', type=int, default=None, help='处理图片的进程数，默认为 CPU 核心数')
+    parser.add_argument('--formats', type=parse_formats, help='只导出这些格式（按文件头识别），用逗号分隔，例如 gif,png')
+    parser.add_argument('--min-size', type=parse_size, help='只导出不小于此大小的文件，可以使用 k、m 单位，例如 10k')
+    parser.add_argument('--max-size', type=parse_size, help='只导出不大于此大小的文件')
+    parser.add_argument('--since', type=parse_date, help='只导出在这一天（YYYY-MM-DD）及之后修改的文件')
+    parser.add_argument('--until', type=parse_date, help='只导出在这一天（YYYY-MM-DD）及之前修改的文件')
+    parser.add_argument('--new-only', action='store_true', help='只导出上次导出之后新增或修改的文件')
+    parser.add_argument('--no-incremental', action='store_true', help='不跳过上次已导出且未变化的文件')
+    parser.add_argument('--no-dedup', action='store_true', help='不合并内容重复的文件')
+    parser.add_argument('--no-nickname', action='store_true', help='目录名只使用QQ号')
+    parser.add_argument('--catalog', default=None,
+                        help='表情目录数据库路径，默认与图形界面共用；传入空字符串表示不记录')
+    parser.add_argument('--no-report', dest='report', action='store_false', help='不写入导出报告')
+    parser.add_argument('--progress-interval', type=float, default=0.5,
+                        help='两次进度输出之间的最小间隔（秒），0 表示不输出进度')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.query == 'new' and args.since is None:
+        parser.error('--query new 需要同时指定 --since')
+    if args.query == 'same' and not args.file:
+        parser.error('--query same 需要同时指定 --file')
+    if not args.list and not args.query and (not args.account or not args.output):
+        parser.error('导出时必须指定 --account 和 --output')
+    if args.workers != 'auto':
+        try:
+            args.workers = int(args.workers)
+        except ValueError:
+            parser.error(f"无效的线程数: {args.workers}")
+    if args.catalog is None:
+        args.catalog = default_catalog_path()
+    # --until 包含当天，比较时使用下一天的零点
+    args.export_filter = ExportFilter(
+        formats=args.formats, min_size=args.min_size, max_size=args.max_size, modified_after=args.since,
+        modified_before=args.until + 24 * 3600 if args.until is not None else None,
+        new_since_last_export=args.new_only)
+
+    emitter = JsonEmitter(sys.stdout, args.progress_interval)
+    if args.query:
+        return query_catalog(args, emitter)
+    data_root = resolve_data_root(args, emitter)
+    if not data_root:
+        return EXIT_CONFIG
+    accounts = list_accounts(data_root)
+    if not accounts:
+        emitter.log(None, f"❌ 未找到任何用户目录: {data_root}")
+        return EXIT_CONFIG
+
+    if args.list:
+        # 表情数量和大小与图形界面共用缓存，目录没有变化的账号不必重新统计
+        emitter.emit('accounts', data_root=data_root, accounts=[
+            {'qq': qq, 'emoji_dir': get_emoji_dir(data_root, qq),
+             'has_emoji': os.path.isdir(get_emoji_dir(data_root, qq)), 'files': count, 'bytes': total}
+            for qq, count, total, _ in get_account_index().iter_accounts(data_root, sorted(accounts))])
+        return EXIT_OK
+
+    if 'all' in args.account:
+        selected = sorted(accounts)
+    else:
+        selected = list(dict.fromkeys(args.account))
+        missing = [qq for qq in selected if qq not in accounts]
+        if missing:
+            emitter.log(None, f"❌ 未找到账号: {', '.join(missing)}")
+            return EXIT_NO_ACCOUNT
+
+    os.makedirs(args.output, exist_ok=True)
+    nickname_cache = None if args.no_nickname else get_nickname_cache()
+    totals = {'copied': 0, 'skipped': 0, 'filtered': 0, 'renamed': 0, 'duplicates': 0, 'errors': 0}
+    started_at = time.time()
+    try:
+        for qq_number in selected:
+            src = get_emoji_dir(data_root, qq_number)
+            dst = output_dir_for(args.output, qq_number, nickname_cache)
+            result = export_account(args, emitter, qq_number, src, dst)
+            for key in totals:
+                value = result[key]
+                totals[key] += len(value) if isinstance(value, list) else value
+    except KeyboardInterrupt:
+        emitter.log(None, "💬 导出已取消")
+        emitter.emit('summary', accounts=selected, cancelled=True, seconds=round(time.time() - started_at, 3),
+                     **totals)
+        return EXIT_INTERRUPTED
+
+    emitter.emit('summary', accounts=selected, cancelled=False, seconds=round(time.time() - started_at, 3), **totals)
+    return EXIT_FILE_ERRORS if totals['errors'] else EXIT_OK
+
+
+if __name__ == '__main__':
+    # 打包后的程序用进程池处理图片时，子进程需要由这里接管
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,249 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+import os
+import time
+import threading
+from export_engine import ExportEngine
+
+
+class EmojiWatcher:
+    """实时监视表情目录，QQ 缓存新表情后立即导出
+
+    启动时先做一次增量导出，之后持续监视源目录。新文件的大小和修改时间
+    保持 SETTLE_TIME 秒不变才认为 QQ 已经写完，再复制并修正扩展名，
+    避免导出写了一半的文件。导出后源文件又发生变化时会重新导出。
+
+    安装了 watchdog 时由文件系统事件触发检查，并每隔 RESCAN_INTERVAL 秒全量扫描一次兜底；
+    没有安装时每隔 POLL_INTERVAL 秒全量扫描一次。
+    """
+
+    POLL_INTERVAL = 1.0
+    SETTLE_TIME = 2.0
+    RESCAN_INTERVAL = 30.0
+    SAVE_INTERVAL = 5.0
+
+    def __init__(self, src, dst, on_log=None, on_progress=None, on_idle=None, dedup=True,
+                 use_watchdog=True, poll_interval=POLL_INTERVAL, settle_time=SETTLE_TIME,
+                 catalog=None, account=None, strategy='copy'):
+        # on_idle() 在每轮检查结束后调用，可用于刷新界面上积攒的日志
+        self.src = os.path.abspath(src)
+        self.dst = dst
+        self.on_idle = on_idle
+        self.use_watchdog = use_watchdog
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.engine = ExportEngine(on_log=on_log, on_progress=on_progress, incremental=True, dedup=dedup,
+                                   catalog=catalog, account=account, strategy=strategy)
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._changed_lock = threading.Lock()
+        # watchdog 报告有变化的文件路径
+        self._changed = set()
+        # 相对路径 -> (源文件路径, (大小, 修改时间), 最近一次发生变化的时间)
+        self._pending = {}
+        # 相对路径 -> 导出失败时的 (大小, 修改时间)，文件再次变化前不再重试
+        self._failed = {}
+        self._manifest_dirty = False
+
+    def stop(self):
+        self._stop_event.set()
+        self.engine.cancel()
+        self._wake_event.set()
+
+    def log(self, message):
+        self.engine.log(message)
+
+    def run(self):
+        """导出并持续监视，直到调用 stop()，返回与 ExportEngine.export 相同格式的统计结果"""
+        result = self.engine.export(self.src, self.dst)
+        if result['cancelled'] or not os.path.isdir(self.src):
+            return result
+
+        observer = self._start_observer() if self.use_watchdog else None
+        if observer:
+            self.log(f"💬 正在监视表情目录（文件系统事件）: {self.src}")
+        else:
+            self.log(f"💬 正在监视表情目录（每 {self.poll_interval:g} 秒检查一次）: {self.src}")
+
+        last_full_scan = 0.0
+        last_save = time.monotonic()
+        try:
+            while not self._stop_event.is_set():
+                now = time.monotonic()
+                if observer is None or now - last_full_scan >= self.RESCAN_INTERVAL:
+                    with self._changed_lock:
+                        self._changed.clear()
+                    self._check_all()
+                    last_full_scan = now
+                else:
+                    self._check_changed()
+                self._export_ready()
+
+                if self._manifest_dirty and time.monotonic() - last_save >= self.SAVE_INTERVAL:
+                    self._save_manifest()
+                    last_save = time.monotonic()
+                if self.on_idle:
+                    self.on_idle()
+
+                # 有文件等待写完时按轮询间隔检查，否则等待文件系统事件
+                timeout = self.poll_interval if observer is None or self._pending else self.RESCAN_INTERVAL
+                self._wake_event.wait(timeout)
+                self._wake_event.clear()
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
+            if self._manifest_dirty:
+                self._save_manifest()
+
+        self.log(f"💬 已停止监视，本次共导出 {self.engine.copied} 个文件")
+        return self.engine.result(self.dst, cancelled=False)
+
+    def _start_observer(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return None
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                watcher._notify(event.src_path)
+                dest_path = getattr(event, 'dest_path', None)
+                if dest_path:
+                    watcher._notify(dest_path)
+
+        observer = Observer()
+        try:
+            observer.schedule(Handler(), self.src, recursive=True)
+            observer.start()
+        except OSError as e:
+            self.log(f"❌ 无法监听文件系统事件，改为定时检查: {e}")
+            return None
+        return observer
+
+    def _notify(self, path):
+        # 在 watchdog 线程中调用
+        if isinstance(path, bytes):
+            path = os.fsdecode(path)
+        with self._changed_lock:
+            self._changed.add(path)
+        self._wake_event.set()
+
+    def _rel_path(self, path):
+        return os.path.relpath(path, self.src).replace(os.sep, '/')
+
+    def _check_all(self):
+        seen = set()
+        for entry, rel_dir in self.engine.scan_files(self.src):
+            rel_path = os.path.join(rel_dir, entry.name).replace(os.sep, '/')
+            seen.add(rel_path)
+            self._observe(entry.path, rel_path, entry.stat())
+        for rel_path in [rel_path for rel_path in self._pending if rel_path not in seen]:
+            self._forget(rel_path)
+
+    def _check_changed(self):
+        with self._changed_lock:
+            paths = self._changed
+            self._changed = set()
+        paths.update(path for path, _, _ in self._pending.values())
+        for path in paths:
+            rel_path = self._rel_path(path)
+            if rel_path.startswith('../'):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # QQ 写完临时文件后可能会重命名或删除
+                self._forget(rel_path)
+                continue
+            if os.path.isfile(path):
+                self._observe(path, rel_path, stat)
+
+    def _observe(self, path, rel_path, stat):
+        manifest = self.engine.manifest
+        if manifest.is_unchanged(rel_path, stat, self.dst):
+            self._forget(rel_path)
+            return
+        key = (stat.st_size, stat.st_mtime_ns)
+        if self._failed.get(rel_path) == key:
+            return
+        entry = self._pending.get(rel_path)
+        if entry is None:
+            self.engine.discovered += 1
+            self.engine.progress(self.engine.done_count())
+        if entry is None or entry[1] != key:
+            self._pending[rel_path] = (path, key, time.monotonic())
+
+    def _forget(self, rel_path):
+        if self._pending.pop(rel_path, None) is not None:
+            self.engine.discovered -= 1
+            self.engine.progress(self.engine.done_count())
+
+    def _export_ready(self):
+        now = time.monotonic()
+        ready = [(rel_path, path, key) for rel_path, (path, key, changed_at) in self._pending.items()
+                 # 空文件通常是 QQ 刚创建还没写入内容的文件，不算写完
+                 if key[0] > 0 and now - changed_at >= self.settle_time]
+        for rel_path, path, key in ready:
+            if self._stop_event.is_set():
+                return
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self._forget(rel_path)
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != key:
+                # 等待期间文件又被写入，重新计时
+                self._pending[rel_path] = (path, (stat.st_size, stat.st_mtime_ns), time.monotonic())
+                continue
+            del self._pending[rel_path]
+            self._export_file(path, rel_path, stat)
+            self.engine.progress(self.engine.done_count())
+
+    def _export_file(self, path, rel_path, stat):
+        engine = self.engine
+        manifest = engine.manifest
+        if engine.dedup:
+            kept_rel_path = engine.find_duplicate(path, stat.st_size, rel_path)
+            if kept_rel_path and kept_rel_path != rel_path:
+                engine.duplicates.append((rel_path, kept_rel_path))
+                engine.remove_previous_output(rel_path)
+                manifest.update_duplicate(rel_path, stat, kept_rel_path)
+                if engine.catalog:
+                    engine.add_to_catalog(path, stat)
+                self._manifest_dirty = True
+                self.log(f"💬 跳过重复文件: {path} 与 {kept_rel_path} 内容相同")
+                return
+
+        rel_dir, name = os.path.split(rel_path)
+        dest_dir = os.path.join(self.dst, rel_dir)
+        dest_file = os.path.join(dest_dir, name)
+        try:
+            # 源文件在上次导出后又发生了变化时，新文件写好后 record_copy 会删除文件名不同的旧导出文件
+            os.makedirs(dest_dir, exist_ok=True)
+            digest = engine.new_digest() if engine.catalog else None
+            final_path, method, fallback = engine.copy_file(path, dest_file, rel_path, digest)
+        except OSError as e:
+            self._failed[rel_path] = (stat.st_size, stat.st_mtime_ns)
+            engine.errors.append((path, str(e)))
+            self.log(f"❌ 复制文件 {path} 时出错: {e}")
+            return
+        self._failed.pop(rel_path, None)
+        engine.record_copy(path, rel_path, stat, dest_file, final_path, self.dst,
+                           digest.hexdigest() if digest and method == 'copy' else None, method, fallback)
+        self._manifest_dirty = True
+
+    def _save_manifest(self):
+        try:
+            self.engine.manifest.save()
+            self._manifest_dirty = False
+        except OSError as e:
+            self.log(f"❌ 保存导出清单失败: {e}")
+        self.engine.flush_catalog()
@@ -0,0 +1,1035 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import shutil
+import hashlib
+import threading
+import mimetypes
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from file_signature import default_classifier
+from archive_writer import ArchiveWriter
+from export_strategy import EXPORT_STRATEGIES, STRATEGY_NAMES, clone_file, link_file, describe_strategies
+from instrumentation import StageStats
+
+# 扫描队列结束标记
+_SCAN_DONE = object()
+
+
+class _DigestReader:
+    """包装文件对象，读取的同时更新哈希"""
+
+    def __init__(self, fileobj, digest):
+        self._fileobj = fileobj
+        self._digest = digest
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self._digest.update(data)
+        return data
+
+
+class ExportCancelled(Exception):
+    """导出被用户取消"""
+
+
+class ConcurrencyTuner:
+    """根据实测的复制速度（文件/秒）自动调整并发数
+
+    每隔 interval 秒统计一次速度：比上一轮慢就反转调整方向，
+    否则沿当前方向继续增加或减少并发，到达上下限时自动掉头。
+    """
+
+    def __init__(self, initial, minimum, maximum, interval=0.5):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.interval = interval
+        self._direction = 1
+        self._last_rate = None
+        self._count = 0
+        self._window_start = time.monotonic()
+
+    def record(self, count=1):
+        self._count += count
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self.interval:
+            return
+
+        rate = self._count / elapsed
+        if self._last_rate is not None and rate < self._last_rate * 0.95:
+            self._direction = -self._direction
+        self._last_rate = rate
+
+        step = max(1, self.limit // 4)
+        new_limit = self.limit + self._direction * step
+        if new_limit > self.maximum or new_limit < self.minimum:
+            self._direction = -self._direction
+            new_limit = max(self.minimum, min(self.maximum, new_limit))
+        self.limit = new_limit
+        self._count = 0
+        self._window_start = now
+
+
+class ExportManifest:
+    """导出清单
+
+    保存在导出目录旁边，记录每个源文件的大小、修改时间和导出后的文件名，
+    再次导出时据此跳过没有变化的文件。
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self.files = {}
+        # 上次保存清单的时间戳，没有可用的清单时为 None
+        self.updated = None
+
+    @staticmethod
+    def manifest_path(dst):
+        return f"{dst}_导出清单.json"
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # 源目录变了说明是另一个账号或另一份数据，旧记录不再可信
+        if data.get('version') != self.VERSION or \
+           os.path.normcase(data.get('source', '')) != os.path.normcase(self.source):
+            return
+        self.files = data.get('files', {})
+        self.updated = data.get('updated')
+
+    def is_unchanged(self, rel_path, stat, dst):
+        record = self.files.get(rel_path)
+        if not record or record.get('size') != stat.st_size or record.get('mtime_ns') != stat.st_mtime_ns:
+            return False
+        # 重复文件没有自己的输出，只要保留下来的那一份还在就算未变化
+        if 'duplicate_of' in record:
+            record = self.files.get(record['duplicate_of'])
+            if not record or 'output' not in record:
+                return False
+        return os.path.exists(os.path.join(dst, record.get('output', '')))
+
+    def output_for(self, rel_path):
+        """返回源文件对应的导出文件（相对导出目录），重复文件返回保留下来的那一份"""
+        record = self.files.get(rel_path) or {}
+        if 'duplicate_of' in record:
+            record = self.files.get(record['duplicate_of']) or {}
+        return record.get('output')
+
+    def update(self, rel_path, stat, output):
+        self.files[rel_path] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'output': output,
+        }
+
+    def rename_outputs(self, renamed):
+        """导出文件被改名（例如转换了格式）后更新记录，renamed 为 {原输出路径: 新输出路径}"""
+        for record in self.files.values():
+            output = record.get('output')
+            if output in renamed:
+                record['output'] = renamed[output]
+
+    def update_duplicate(self, rel_path, stat, kept_rel_path):
+        self.files[rel_path] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'duplicate_of': kept_rel_path,
+        }
+
+    def save(self):
+        # 先写临时文件再替换，避免中途出错留下损坏的清单
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': self.VERSION,
+                'source': self.source,
+                'updated': int(time.time()),
+                'files': self.files,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class DuplicateFinder:
+    """查找内容完全相同的文件
+
+    按 文件大小 → 开头 4KB 的哈希 → 全文哈希 逐级比较，每一级都用字典索引，
+    只有大小相同的文件才需要读取内容，大部分文件只用到扫描时的 stat 信息。
+    """
+
+    PREFIX_SIZE = 4096
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self):
+        # 文件大小 -> 还没计算哈希的文件，出现同样大小的新文件时才计算
+        self._pending = {}
+        # (大小, 开头哈希) -> 第一个出现的文件
+        self._by_prefix = {}
+        # (大小, 全文哈希) -> 第一个出现的文件的标识
+        self._by_full = {}
+
+    def add(self, path, size, key):
+        """登记一个不参与比较的已知文件（例如增量导出时跳过的文件）"""
+        self._pending.setdefault(size, []).append(_DuplicateCandidate(path, size, key))
+
+    def find_duplicate(self, path, size, key):
+        """返回与 path 内容相同的已登记文件的标识，没有重复时登记 path 并返回 None"""
+        pending = self._pending.get(size)
+        if pending is None:
+            # 第一次出现这个大小，先不读取内容
+            self._pending[size] = [_DuplicateCandidate(path, size, key)]
+            return None
+
+        try:
+            for candidate in pending:
+                self._index(candidate)
+            pending.clear()
+            return self._index(_DuplicateCandidate(path, size, key))
+        except OSError:
+            # 读取失败时不做去重，按普通文件处理
+            return None
+
+    def _index(self, candidate):
+        """把文件加入哈希索引，已有相同内容的文件时返回其标识"""
+        prefix_key = (candidate.size, candidate.prefix_hash(self.PREFIX_SIZE))
+        first = self._by_prefix.get(prefix_key)
+        if first is None:
+            self._by_prefix[prefix_key] = candidate
+            return None
+        # 小文件的开头哈希已经覆盖全部内容
+        if candidate.size <= self.PREFIX_SIZE:
+            return first.key
+
+        if not first.full_indexed:
+            self._by_full.setdefault((first.size, first.full_hash(self.CHUNK_SIZE)), first.key)
+            first.full_indexed = True
+        full_key = (candidate.size, candidate.full_hash(self.CHUNK_SIZE))
+        existing = self._by_full.get(full_key)
+        if existing is not None:
+            return existing
+        self._by_full[full_key] = candidate.key
+        candidate.full_indexed = True
+        return None
+
+
+class _DuplicateCandidate:
+    __slots__ = ('path', 'size', 'key', 'full_indexed', '_prefix_hash', '_full_hash')
+
+    def __init__(self, path, size, key):
+        self.path = path
+        self.size = size
+        self.key = key
+        self.full_indexed = False
+        self._prefix_hash = None
+        self._full_hash = None
+
+    def prefix_hash(self, prefix_size):
+        if self._prefix_hash is None:
+            with open(self.path, 'rb') as f:
+                self._prefix_hash = hashlib.blake2b(f.read(prefix_size)).digest()
+        return self._prefix_hash
+
+    def full_hash(self, chunk_size):
+        if self._full_hash is None:
+            digest = hashlib.blake2b()
+            with open(self.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(chunk_size), b''):
+                    digest.update(chunk)
+            self._full_hash = digest.digest()
+        return self._full_hash
+
+
+class ExportEngine:
+    """表情包导出引擎
+
+    不依赖任何界面库，所有进度、日志都通过回调函数上报，
+    可以放在后台线程中运行，通过 cancel() 随时中止。
+    """
+
+    MIME_MAPPING = {
+        'jpg': 'image/jpeg',
+        'png': 'image/png',
+        'gif': 'image/gif',
+        'bmp': 'image/bmp',
+        'tiff': 'image/tiff',
+        'webp': 'image/webp',
+        'ico': 'image/x-icon',
+        'psd': 'image/vnd.adobe.photoshop',
+        'svg': 'image/svg+xml',
+        'heic': 'image/heic',
+        'avif': 'image/avif',
+    }
+
+    # 扫描线程最多领先复制阶段的文件数，保证内存占用不随目录规模增长
+    SCAN_LOOKAHEAD = 4096
+
+    # 复制时每次读写的块大小，第一块同时用于识别文件格式
+    COPY_CHUNK_SIZE = 64 * 1024
+
+    # 复制线程数上下限，workers='auto' 时在此范围内自动调整
+    MIN_WORKERS = 1
+    MAX_WORKERS = 32
+    AUTO_INITIAL_WORKERS = 4
+
+    # 导出到压缩包时，小于此大小的文件由读取线程整个读入内存，再由写入线程按顺序写入压缩包
+    ARCHIVE_BUFFER_LIMIT = 4 * 1024 * 1024
+
+    def __init__(self, on_log=None, on_progress=None, workers='auto', incremental=True, dedup=True,
+                 max_workers=None, archive=None, catalog=None, account=None, strategy='copy', export_filter=None):
+        # on_log(message)、on_progress(done, total, scan_finished) 只在调用 export() 的线程中被调用，
+        # 扫描未结束时 total 只是目前已发现的文件数，会随扫描逐步增加。
+        # max_workers 限制复制线程数上限，多个账号同时导出时用来分配线程。
+        # archive 为 'zip' 或 'tar' 时导出为单个压缩包，此时不做增量导出。
+        # catalog 为 EmojiCatalog 时把导出的每个文件记录到表情目录中，account 为所属账号。
+        # strategy 为导出文件的方式（见 EXPORT_STRATEGIES），某个文件不支持时单独改为完整复制。
+        # export_filter 为 ExportFilter 时只导出符合条件的文件，在扫描阶段就排除其余文件
+        self.on_log = on_log
+        self.on_progress = on_progress
+        self.workers = workers
+        self.max_workers = max(self.MIN_WORKERS, min(self.MAX_WORKERS, max_workers or self.MAX_WORKERS))
+        if strategy not in EXPORT_STRATEGIES:
+            raise ValueError(f"不支持的导出方式: {strategy}")
+        self.archive = archive
+        self.strategy = strategy
+        self.export_filter = export_filter if export_filter and export_filter.is_active() else None
+        self.catalog = catalog
+        self.account = account
+        self.incremental = incremental and not archive
+        self.manifest = None
+        self.dedup = DuplicateFinder() if dedup else None
+        self._cancel_event = threading.Event()
+        self.discovered = 0
+        self.scan_finished = False
+        self.copied = 0
+        self.skipped = 0
+        self.filtered = 0
+        self.renamed = 0
+        # 与其他文件重名、追加了序号的文件数，不计入 renamed
+        self.name_conflicts = 0
+        self.duplicates = []
+        self.errors = []
+        # 实际使用的导出方式 -> 文件数
+        self.strategies = {}
+        self._fallback_logged = set()
+        # 导出文件路径 -> 对应的源文件（相对路径），修正扩展名后与其他文件重名时用来避免互相覆盖
+        self._outputs = {}
+        # 源文件 -> 上次导出时使用的文件，重名时沿用原来追加了序号的文件名
+        self._previous_outputs = {}
+        self._outputs_lock = threading.Lock()
+        # 各阶段的耗时和计数
+        self.stats = StageStats()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise ExportCancelled()
+
+    def log(self, message):
+        if self.on_log:
+            self.on_log(message)
+
+    def done_count(self):
+        return self.copied + self.skipped + len(self.duplicates) + len(self.errors)
+
+    def progress(self, done):
+        if self.on_progress:
+            self.on_progress(done, self.discovered, self.scan_finished)
+
+    def export(self, src, dst):
+        """复制表情目录并修正扩展名，返回本次导出的统计结果"""
+        if self.archive:
+            return self.export_archive(src, ArchiveWriter.path_for(dst, self.archive))
+
+        cancelled = False
+        self.manifest = ExportManifest(ExportManifest.manifest_path(dst), os.path.abspath(src))
+        with self.stats.span('manifest'):
+            self.manifest.load()
+        self.reserve_outputs(dst)
+        if not self.incremental:
+            # 不做增量导出时上次的清单只用来保留各源文件原来的导出文件名，所有文件都重新导出
+            self.manifest.files = {}
+        self.prepare_filter(src, dst)
+        try:
+            self.log(f"✅ 复制表情包文件到: {dst}")
+            self.copy_directory_with_progress(src, dst)
+        except ExportCancelled:
+            cancelled = True
+            self.log("💬 导出已取消")
+        finally:
+            # 取消或出错时也保存清单，已复制的文件下次不必重新复制
+            if self.copied or self.skipped:
+                try:
+                    with self.stats.span('manifest'):
+                        self.manifest.save()
+                except OSError as e:
+                    self.log(f"❌ 保存导出清单失败: {e}")
+            self.flush_catalog()
+        if self.filtered:
+            self.log(f"💬 已按筛选条件排除 {self.filtered} 个文件")
+        if self.skipped:
+            self.log(f"💬 已跳过 {self.skipped} 个上次已导出且未变化的文件")
+        if self.duplicates:
+            self.log(f"💬 已合并 {len(self.duplicates)} 个内容重复的文件")
+        return self.result(dst, cancelled)
+
+    def result(self, dst, cancelled=False):
+        """返回目前为止的统计结果"""
+        return {
+            'copied': self.copied,
+            'skipped': self.skipped,
+            'filtered': self.filtered,
+            'renamed': self.renamed,
+            'name_conflicts': self.name_conflicts,
+            'duplicates': list(self.duplicates),
+            'errors': list(self.errors),
+            'cancelled': cancelled,
+            'output_dir': dst,
+            'strategies': dict(self.strategies),
+        }
+
+    def export_archive(self, src, archive_path):
+        """把表情目录写入单个压缩包，文件名在写入时按实际格式修正，返回统计结果"""
+        if not os.path.exists(src):
+            self.log(f"❌ 源目录不存在: {src}")
+            self.errors.append((src, '源目录不存在'))
+            return self.result(archive_path)
+
+        cancelled = False
+        self.prepare_filter(src)
+        self.log(f"✅ 导出表情包到压缩包: {archive_path}")
+        writer = None
+        try:
+            writer = ArchiveWriter(archive_path, self.archive)
+            with self.stats.span('archive'):
+                self.write_archive(src, writer)
+                writer.commit()
+            writer = None
+            self.log("✅ 压缩包写入完成")
+        except ExportCancelled:
+            cancelled = True
+            self.log("💬 导出已取消")
+        except Exception as e:
+            self.errors.append((archive_path, str(e)))
+            self.log(f"❌ 写入压缩包时出错: {e}")
+        finally:
+            # 没有完整写完的压缩包不保留
+            if writer:
+                writer.abort()
+            self.flush_catalog()
+        if self.filtered:
+            self.log(f"💬 已按筛选条件排除 {self.filtered} 个文件")
+        if self.duplicates:
+            self.log(f"💬 已合并 {len(self.duplicates)} 个内容重复的文件")
+        return self.result(archive_path, cancelled)
+
+    def prepare_filter(self, src, dst=None):
+        """确定“上次导出后新增”的参照时间并输出筛选条件
+
+        导出到文件夹时取导出清单的保存时间，导出为压缩包时没有清单，取表情目录中该账号最近一次导出的时间
+        """
+        if not self.export_filter:
+            return
+        if self.export_filter.new_since_last_export:
+            last_export = None
+            if dst is not None:
+                last_export = self.manifest.updated
+            elif self.catalog:
+                try:
+                    last_export = self.catalog.last_export_time(self.account)
+                except sqlite3.Error as e:
+                    self.log(f"❌ 读取表情目录失败: {e}")
+            self.export_filter = self.export_filter.with_last_export(last_export)
+        self.log(f"💬 只导出符合条件的表情：{self.export_filter.describe()}")
+
+    def scan_files(self, src):
+        """用 os.scandir 单次遍历源目录，逐个产出 (DirEntry, 相对目录)
+
+        只保存待遍历的子目录，不会一次性列出全部文件
+        """
+        pending_dirs = [(src, '')]
+        while pending_dirs:
+            directory, rel_dir = pending_dirs.pop()
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending_dirs.append((entry.path, os.path.join(rel_dir, entry.name)))
+                    elif entry.is_file():
+                        # Windows 下 stat 信息随目录项一起返回，这里顺便缓存下来供复制阶段使用
+                        entry.stat()
+                        yield entry, rel_dir
+
+    def iter_scan_ahead(self, src):
+        """在单独的线程中扫描源目录，复制阶段边扫描边消费
+
+        扫描结果通过有界队列传递，扫描线程最多领先 SCAN_LOOKAHEAD 个文件，
+        已发现的文件数会实时计入进度条总数
+        """
+        items = queue.Queue(self.SCAN_LOOKAHEAD)
+        stop_event = threading.Event()
+
+        def put(item):
+            while not stop_event.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def producer():
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            found = 0
+            found_bytes = 0
+            export_filter = self.export_filter
+            filter_time = 0.0
+            try:
+                for item in self.scan_files(src):
+                    if self.is_cancelled():
+                        break
+                    if export_filter:
+                        # 在扫描线程中判断，被排除的文件不计入进度总数，也不会进入复制阶段
+                        filter_start = time.perf_counter()
+                        accepted = export_filter.accepts(item[0])
+                        filter_time += time.perf_counter() - filter_start
+                        if not accepted:
+                            self.filtered += 1
+                            continue
+                    found += 1
+                    found_bytes += item[0].stat().st_size
+                    self.discovered += 1
+                    if not put(item):
+                        break
+            except Exception as e:
+                put(e)
+            finally:
+                # 扫描线程有一部分时间在等待复制阶段消费，所以这里的实际耗时包含等待时间
+                self.stats.add('scan', time.perf_counter() - wall_start, time.thread_time() - cpu_start,
+                               files=found, bytes=found_bytes)
+                if export_filter:
+                    self.stats.add('filter', filter_time, files=found + self.filtered, excluded=self.filtered)
+                self.scan_finished = True
+                put(_SCAN_DONE)
+
+        scanner = threading.Thread(target=producer, name='emoji-scanner', daemon=True)
+        scanner.start()
+        try:
+            while True:
+                item = items.get()
+                if item is _SCAN_DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop_event.set()
+            scanner.join()
+
+    def copy_directory_with_progress(self, src, dst):
+        """单次遍历源目录，多线程复制文件并立即修正扩展名
+
+        进度和日志按扫描顺序上报，单个文件出错只记录到 errors，不会中断整个导出
+        """
+        with self.stats.span('copy'):
+            self._copy_directory(src, dst)
+
+    def _copy_directory(self, src, dst):
+        if not os.path.exists(src):
+            self.log(f"❌ 源目录不存在: {src}")
+            self.errors.append((src, '源目录不存在'))
+            return
+
+        tuner, pool_size = self._create_tuner()
+        created_dirs = set()
+        in_flight = deque()
+        self.progress(self.done_count())
+        executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='emoji-copy')
+        try:
+            for entry, rel_dir in self.iter_scan_ahead(src):
+                self.check_cancelled()
+                dest_path = os.path.join(dst, rel_dir)
+                if dest_path not in created_dirs:
+                    os.makedirs(dest_path, exist_ok=True)
+                    created_dirs.add(dest_path)
+
+                rel_path = os.path.join(rel_dir, entry.name).replace(os.sep, '/')
+                stat = entry.stat()
+                if self.manifest and self.manifest.is_unchanged(rel_path, stat, dst):
+                    self.skipped += 1
+                    self.stats.count('copy', skipped=1)
+                    if self.dedup:
+                        self.dedup.add(entry.path, stat.st_size, rel_path)
+                    if self.catalog:
+                        output = self.manifest.output_for(rel_path)
+                        self.add_to_catalog(entry.path, stat, os.path.join(dst, output) if output else None)
+                    self.progress(self.done_count())
+                    continue
+
+                if self.dedup:
+                    kept_rel_path = self.find_duplicate(entry.path, stat.st_size, rel_path)
+                    if kept_rel_path:
+                        self.duplicates.append((rel_path, kept_rel_path))
+                        self.remove_previous_output(rel_path)
+                        if self.manifest:
+                            self.manifest.update_duplicate(rel_path, stat, kept_rel_path)
+                        if self.catalog:
+                            self.add_to_catalog(entry.path, stat)
+                        self.log(f"💬 跳过重复文件: {entry.path} 与 {kept_rel_path} 内容相同")
+                        self.progress(self.done_count())
+                        continue
+
+                limit = tuner.limit if tuner else pool_size
+                while len(in_flight) >= limit:
+                    self._finish_copy(in_flight.popleft(), tuner, dst)
+
+                dest_file = os.path.join(dest_path, entry.name)
+                digest = self.new_digest() if self.catalog else None
+                future = executor.submit(self.copy_file, entry.path, dest_file, rel_path, digest)
+                in_flight.append((entry.path, rel_path, stat, dest_file, digest, future))
+
+            while in_flight:
+                self.check_cancelled()
+                self._finish_copy(in_flight.popleft(), tuner, dst)
+            # 扫描线程发现取消后会直接结束，此时可能没有正在复制的文件，这里再确认一次，避免把中途取消当作完成
+            self.check_cancelled()
+        except ExportCancelled:
+            raise
+        except Exception as e:
+            self.errors.append((src, str(e)))
+            self.log(f"❌ 复制目录时出错: {e}")
+            return
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        if tuner:
+            self.log(f"💬 自动并发调整结束，最终使用 {tuner.limit} 个复制线程")
+        if self.strategies:
+            self.log(f"💬 导出方式：{describe_strategies(self.strategies)}")
+        self.log("✅ 复制目录完成")
+
+    def find_duplicate(self, path, size, rel_path):
+        """查找内容相同的已导出文件，同时统计去重耗时"""
+        start = time.perf_counter()
+        kept_rel_path = self.dedup.find_duplicate(path, size, rel_path)
+        self.stats.add('dedup', time.perf_counter() - start, files=1, duplicates=1 if kept_rel_path else 0)
+        return kept_rel_path
+
+    def _create_tuner(self):
+        """返回 (并发调整器, 线程池大小)，固定线程数时调整器为 None"""
+        if self.workers == 'auto':
+            tuner = ConcurrencyTuner(min(self.AUTO_INITIAL_WORKERS, self.max_workers),
+                                     self.MIN_WORKERS, self.max_workers)
+            return tuner, self.max_workers
+        return None, max(self.MIN_WORKERS, min(self.max_workers, int(self.workers)))
+
+    def write_archive(self, src, writer):
+        """单次遍历源目录，多线程读取文件，按扫描顺序依次写入压缩包
+
+        压缩包只能顺序写入，读取线程负责提前把文件读进内存，写入本身在当前线程完成。
+        单个文件读取失败只记录到 errors，写入压缩包失败会中断整个导出
+        """
+        tuner, pool_size = self._create_tuner()
+        in_flight = deque()
+        self.progress(self.done_count())
+        executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='emoji-read')
+        try:
+            for entry, rel_dir in self.iter_scan_ahead(src):
+                self.check_cancelled()
+                rel_path = os.path.join(rel_dir, entry.name).replace(os.sep, '/')
+                stat = entry.stat()
+                if self.dedup:
+                    kept_rel_path = self.find_duplicate(entry.path, stat.st_size, rel_path)
+                    if kept_rel_path:
+                        self.duplicates.append((rel_path, kept_rel_path))
+                        if self.catalog:
+                            self.add_to_catalog(entry.path, stat)
+                        self.log(f"💬 跳过重复文件: {entry.path} 与 {kept_rel_path} 内容相同")
+                        self.progress(self.done_count())
+                        continue
+
+                limit = tuner.limit if tuner else pool_size
+                while len(in_flight) >= limit:
+                    self._finish_archive(in_flight.popleft(), tuner, writer)
+
+                future = executor.submit(self.read_for_archive, entry.path, stat.st_size)
+                in_flight.append((entry.path, rel_path, stat, future))
+
+            while in_flight:
+                self.check_cancelled()
+                self._finish_archive(in_flight.popleft(), tuner, writer)
+            # 扫描线程发现取消后会直接结束，这里再确认一次，避免把不完整的压缩包当作完成
+            self.check_cancelled()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        if tuner:
+            self.log(f"💬 自动并发调整结束，最终使用 {tuner.limit} 个读取线程")
+
+    def read_for_archive(self, src_file, size):
+        """在读取线程中执行，返回 (数据, 是否完整)
+
+        大文件只读取识别格式所需的第一块，写入时再从源文件流式读取
+        """
+        with open(src_file, 'rb') as f:
+            if size <= self.ARCHIVE_BUFFER_LIMIT:
+                return f.read(), True
+            return f.read(self.COPY_CHUNK_SIZE), False
+
+    def _finish_archive(self, task, tuner, writer):
+        src_file, rel_path, stat, future = task
+        try:
+            data, complete = future.result()
+        except Exception as e:
+            self.errors.append((src_file, str(e)))
+            self.stats.count('archive', errors=1)
+            self.log(f"❌ 读取文件 {src_file} 时出错: {e}")
+        else:
+            start = time.perf_counter()
+            corrected = self.get_corrected_path(rel_path, data)
+            self.stats.add('classify', time.perf_counter() - start, files=1)
+            name = writer.unique_name(corrected, rel_path)
+            if complete:
+                writer.add_bytes(name, data, stat.st_mtime)
+            else:
+                with open(src_file, 'rb') as f:
+                    writer.add_file(name, f, stat.st_size, stat.st_mtime)
+            self.copied += 1
+            self.stats.count('archive', files=1, bytes=stat.st_size)
+            self.log(f"添加文件: {src_file} 为 {name}{self.count_rename(rel_path, name)}")
+            if self.catalog:
+                content_hash = self.new_digest()
+                content_hash.update(data)
+                self.add_to_catalog(src_file, stat, os.path.join(writer.path, name),
+                                    content_hash.hexdigest() if complete else None)
+        if tuner:
+            tuner.record()
+        self.progress(self.done_count())
+
+    def copy_file(self, src_file, dest_file, rel_path, digest=None):
+        """导出单个文件，在复制线程中执行，返回 (最终文件路径, 实际使用的导出方式, 改为完整复制的原因)
+
+        读到的第一块数据同时用来识别实际格式，直接以正确的扩展名写入，
+        不需要复制后再打开文件读取文件头并重命名。只有完整复制时才会用传入的 digest 计算文件内容的哈希，
+        克隆和链接不读取文件内容。rel_path 为源文件的相对路径，用来登记导出文件名。
+        复制线程中不输出日志，所选方式不可用时把 (方式, 原因) 返回给调用方，由 record_copy 提示
+        """
+        with open(src_file, 'rb') as fsrc:
+            head = fsrc.read(self.COPY_CHUNK_SIZE)
+            start = time.perf_counter()
+            final_path = self.get_corrected_path(dest_file, head)
+            self.stats.add('classify', time.perf_counter() - start, files=1)
+            final_path = self.claim_output(final_path, dest_file, rel_path)
+            fallback = None
+
+            if self.strategy in ('hardlink', 'symlink'):
+                try:
+                    _, final_path = self.create_output(
+                        final_path, rel_path, lambda path: link_file(src_file, path, self.strategy))
+                    return final_path, self.strategy, None
+                except OSError as e:
+                    # 跨分区、文件系统不支持或没有创建链接的权限，改为复制
+                    fallback = (self.strategy, e)
+
+            fdst, final_path = self.create_output(final_path, rel_path, lambda path: open(path, 'xb'))
+            with fdst:
+                method = None
+                if self.strategy == 'reflink':
+                    method = clone_file(fsrc.fileno(), fdst.fileno(), os.fstat(fsrc.fileno()).st_size)
+                    if method is None:
+                        fallback = ('reflink', '当前系统或文件系统不支持')
+                        fdst.truncate(0)
+                if method is None:
+                    method = 'copy'
+                    if digest is not None:
+                        digest.update(head)
+                        fsrc = _DigestReader(fsrc, digest)
+                    fdst.write(head)
+                    shutil.copyfileobj(fsrc, fdst, self.COPY_CHUNK_SIZE)
+        shutil.copystat(src_file, final_path)
+        return final_path, method, fallback
+
+    def reserve_outputs(self, dst):
+        """登记导出清单中已有的导出文件，本次导出中其他源文件不会占用这些文件名"""
+        with self._outputs_lock:
+            for rel_path, record in self.manifest.files.items():
+                if record.get('output'):
+                    path = os.path.join(dst, record['output'])
+                    self._outputs[self._output_key(path)] = rel_path
+                    self._previous_outputs[rel_path] = path
+
+    @staticmethod
+    def _output_key(path):
+        # Windows 的文件名不区分大小写，a.JPG 与 a.jpg 是同一个文件
+        return os.path.normcase(os.path.abspath(path))
+
+    def claim_output(self, path, fallback, owner):
+        """为源文件 owner 选定导出文件名并登记，返回选定的路径
+
+        path 已属于其他源文件时先尝试 fallback（修正扩展名前的文件名），仍被占用时在文件名后追加序号，
+        与 ArchiveWriter.unique_name 的规则相同。上次导出留下的、不属于任何源文件的同名文件会被覆盖
+        """
+        with self._outputs_lock:
+            # 上次导出的文件扩展名仍然正确时沿用原来的文件名（包括重名时追加了序号的），每次导出的文件名保持不变
+            previous = self._previous_outputs.get(owner)
+            if previous and self._same_name_apart_from_suffix(previous, path) and \
+                    self._outputs.get(self._output_key(previous)) == owner:
+                return previous
+            for candidate in (path, fallback):
+                key = self._output_key(candidate)
+                if self._outputs.get(key, owner) == owner:
+                    self._outputs[key] = owner
+                    return candidate
+            return self._claim_unique(path, owner)
+
+    @staticmethod
+    def _same_name_apart_from_suffix(previous, path):
+        """previous 是否为 path 本身或 path 追加序号后的文件名"""
+        base, ext = os.path.splitext(path)
+        previous_base, previous_ext = os.path.splitext(previous)
+        if os.path.normcase(previous_ext) != os.path.normcase(ext):
+            return False
+        if os.path.normcase(previous_base) == os.path.normcase(base):
+            return True
+        prefix, _, index = previous_base.rpartition('_')
+        return index.isdigit() and os.path.normcase(prefix) == os.path.normcase(base)
+
+    def _claim_unique(self, path, owner):
+        # 调用方需持有 _outputs_lock
+        base, ext = os.path.splitext(path)
+        index = 1
+        while True:
+            candidate = f"{base}_{index}{ext}"
+            key = self._output_key(candidate)
+            if key not in self._outputs and not os.path.lexists(candidate):
+                self._outputs[key] = owner
+                return candidate
+            index += 1
+
+    def create_output(self, path, owner, create):
+        """用 create(path) 创建已登记的导出文件或链接，返回 (create 的返回值, 实际路径)
+
+        同名的旧文件（上次导出的结果）先删除再创建，而不是打开后截断：旧文件可能是指向QQ原图的硬链接或符号链接，
+        截断会连原图一起改掉。create 需要在文件已存在时抛出 FileExistsError，
+        此时说明有其他程序在同时写入，改用追加序号的文件名，不会覆盖别人的文件
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        while True:
+            try:
+                return create(path), path
+            except FileExistsError:
+                with self._outputs_lock:
+                    path = self._claim_unique(path, owner)
+
+    def _log_fallback(self, strategy, reason):
+        # 每种方式只提示一次，避免每个文件都输出一条
+        if strategy in self._fallback_logged:
+            return
+        self._fallback_logged.add(strategy)
+        self.log(f"💬 无法使用{STRATEGY_NAMES[strategy]}（{reason}），这些文件改为完整复制")
+
+    def get_corrected_path(self, file_path, header):
+        """根据文件头返回扩展名正确的路径，无需修正时原样返回"""
+        actual_ext = self.detect_extension(header)
+        if not actual_ext:
+            return file_path
+
+        recommended_ext = self.get_recommended_extension(file_path)
+        if recommended_ext and actual_ext.lower() != recommended_ext.lower():
+            base_name, _ = os.path.splitext(file_path)
+            return f"{base_name}.{actual_ext}"
+        return file_path
+
+    def _finish_copy(self, task, tuner, dst):
+        src_file, rel_path, stat, dest_file, digest, future = task
+        try:
+            final_path, method, fallback = future.result()
+        except Exception as e:
+            self.errors.append((src_file, str(e)))
+            self.stats.count('copy', errors=1)
+            self.log(f"❌ 复制文件 {src_file} 时出错: {e}")
+        else:
+            self.record_copy(src_file, rel_path, stat, dest_file, final_path, dst,
+                             digest.hexdigest() if digest and method == 'copy' else None, method, fallback)
+        if tuner:
+            tuner.record()
+        self.progress(self.done_count())
+
+    def record_copy(self, src_file, rel_path, stat, dest_file, final_path, dst, content_hash=None, method='copy',
+                    fallback=None):
+        """记录一个复制成功的文件：更新计数、日志、导出清单和表情目录"""
+        if fallback:
+            self._log_fallback(*fallback)
+        self.copied += 1
+        self.strategies[method] = self.strategies.get(method, 0) + 1
+        self.stats.count('copy', files=1, bytes=stat.st_size)
+        self.log(f"复制文件: {src_file} 到 {final_path}{self.count_rename(dest_file, final_path)}")
+        self.remove_previous_output(rel_path, final_path)
+        if self.manifest:
+            self.manifest.update(rel_path, stat, os.path.relpath(final_path, dst).replace(os.sep, '/'))
+        if self.catalog:
+            self.add_to_catalog(src_file, stat, final_path, content_hash)
+
+    def count_rename(self, original, final):
+        """分别统计修正扩展名和因重名追加序号的文件，返回日志中的说明"""
+        original_base, original_ext = os.path.splitext(original)
+        final_base, final_ext = os.path.splitext(final)
+        notes = []
+        if final_ext != original_ext:
+            self.renamed += 1
+            self.stats.count('classify', renamed=1)
+            notes.append('已按实际格式修正扩展名')
+        if final_base != original_base:
+            self.name_conflicts += 1
+            self.stats.count('classify', name_conflicts=1)
+            notes.append('与其他文件重名，已追加序号')
+        return f"（{'，'.join(notes)}）" if notes else ''
+
+    def remove_previous_output(self, rel_path, keep=None):
+        """删除源文件上次导出的、这次不再使用的文件，keep 为这次的导出文件
+
+        源文件变化后修正出的扩展名可能不同（例如 a.png 原来是 JPEG，导出为 a.jpg，后来变成了真正的 PNG），
+        或者变成了其他文件的重复，旧文件不删除就会留在导出目录里，与导出清单对不上。
+        旧文件已被其他源文件占用时保留
+        """
+        with self._outputs_lock:
+            previous = self._previous_outputs.pop(rel_path, None)
+            if keep is not None:
+                self._previous_outputs[rel_path] = keep
+            if previous is None:
+                return
+            key = self._output_key(previous)
+            if keep is not None and key == self._output_key(keep):
+                return
+            if self._outputs.get(key) != rel_path:
+                return
+            del self._outputs[key]
+        try:
+            os.remove(previous)
+            self.log(f"删除旧的导出文件: {previous}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.log(f"❌ 删除旧的导出文件 {previous} 时出错: {e}")
+
+    @staticmethod
+    def new_digest():
+        # 与缩略图缓存使用相同的内容哈希
+        return hashlib.blake2b(digest_size=16)
+
+    def add_to_catalog(self, src_file, stat, output_path=None, content_hash=None):
+        file_format = None
+        if output_path:
+            file_format = os.path.splitext(output_path)[1][1:].lower() or None
+        try:
+            self.catalog.add(self.account, os.path.abspath(src_file), stat.st_size, stat.st_mtime_ns, time.time(),
+                             output_path=output_path, content_hash=content_hash, file_format=file_format)
+        except sqlite3.Error as e:
+            self.log(f"❌ 写入表情目录失败，本次不再记录: {e}")
+            self.catalog = None
+
+    def flush_catalog(self):
+        if not self.catalog:
+            return
+        try:
+            with self.stats.span('catalog'):
+                self.catalog.flush()
+        except sqlite3.Error as e:
+            self.log(f"❌ 写入表情目录失败: {e}")
+
+    def rename_outputs(self, dst, renamed):
+        """导出的文件被改名（例如转换了格式）后同步更新导出清单和表情目录，renamed 为 {原相对路径: 新相对路径}"""
+        if not renamed:
+            return
+        if self.manifest:
+            self.manifest.rename_outputs(renamed)
+            try:
+                self.manifest.save()
+            except OSError as e:
+                self.log(f"❌ 保存导出清单失败: {e}")
+        if self.catalog:
+            try:
+                self.catalog.rename_outputs({os.path.join(dst, *old.split('/')): os.path.join(dst, *new.split('/'))
+                                             for old, new in renamed.items()})
+            except sqlite3.Error as e:
+                self.log(f"❌ 写入表情目录失败: {e}")
+
+    def update_output_contents(self, dst, contents):
+        """导出的文件内容被替换（例如压缩了图片）后更新表情目录，contents 为 {相对路径: (内容哈希, 大小)}"""
+        if not contents or not self.catalog:
+            return
+        try:
+            self.catalog.update_contents({os.path.join(dst, *rel_path.split('/')): value
+                                          for rel_path, value in contents.items()})
+        except sqlite3.Error as e:
+            self.log(f"❌ 写入表情目录失败: {e}")
+
+    def get_actual_extension(self, file_path):
+        return self.detect_extension(self._read_header(file_path))
+
+    def detect_extension(self, header):
+        return default_classifier.classify(header)
+
+    def get_recommended_extension(self, file_path):
+        mime_type, _ = mimetypes.guess_type(file_path)
+        if mime_type:
+            for ext, mt in self.MIME_MAPPING.items():
+                if mt == mime_type:
+                    return ext
+        return None
+
+    def fix_file_extension(self, file_path):
+        """按文件头修正已存在文件的扩展名，返回重命名后的路径，无需重命名时返回 None"""
+        new_file_path = self.get_corrected_path(file_path, self._read_header(file_path))
+        if new_file_path == file_path or os.path.exists(new_file_path):
+            return None
+        os.rename(file_path, new_file_path)
+        return new_file_path
+
+    @staticmethod
+    def _read_header(file_path):
+        with open(file_path, 'rb') as f:
+            return f.read(default_classifier.header_size)
+
+    def correct_file_extension(self, file_path):
+        try:
+            new_file_path = self.fix_file_extension(file_path)
+        except Exception as e:
+            self.errors.append((file_path, str(e)))
+            self.log(f"❌ 重命名文件时出错: {e}")
+            return
+        if new_file_path:
+            self.renamed += 1
+            self.log(f"💬 重命名文件: {file_path} 为 {new_file_path}")
+
+    def batch_correct_extensions(self, directory):
+        """修正已有导出目录中所有文件的扩展名（新导出已在复制时完成修正）"""
+        with self.stats.span('rename'):
+            for root, dirs, files in os.walk(directory):
+                for file in files:
+                    self.check_cancelled()
+                    file_path = os.path.join(root, file)
+                    mime_type, _ = mimetypes.guess_type(file_path)
+                    if mime_type and mime_type.startswith('image/'):
+                        self.stats.count('rename', files=1)
+                        self.correct_file_extension(file_path)
@@ -0,0 +1,135 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+import os
+import copy
+import time
+from datetime import datetime
+from file_signature import default_classifier
+
+# 同一种格式的不同扩展名
+FORMAT_ALIASES = {'jpeg': 'jpg', 'tif': 'tiff'}
+
+
+def normalize_format(name):
+    name = name.strip().lower().lstrip('.')
+    return FORMAT_ALIASES.get(name, name)
+
+
+def parse_formats(text):
+    """把 "gif, png" 这样的文字解析为格式集合，空白时返回 None"""
+    formats = {normalize_format(item) for item in text.replace('，', ',').split(',') if item.strip()}
+    return formats or None
+
+
+def parse_size(text):
+    """把 "500k"、"2m" 这样的文字解析为字节数"""
+    units = {'k': 1024, 'm': 1024 * 1024, 'g': 1024 * 1024 * 1024}
+    text = text.strip().lower().rstrip('b')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def parse_date(text):
+    """把 "2024-01-31" 解析为当天零点（本地时间）的时间戳"""
+    return datetime.strptime(text.strip(), '%Y-%m-%d').timestamp()
+
+
+class ExportFilter:
+    """导出筛选条件
+
+    在扫描源目录时逐个判断文件是否需要导出：先用扫描时已经拿到的 stat 信息比较大小和修改时间，
+    只有通过这些条件并且指定了格式时，才读取文件开头几个字节识别实际格式（QQ 缓存中的扩展名经常不对）。
+    被排除的文件不会进入复制阶段，复制和修正扩展名的工作量只与选中的文件数有关。
+    """
+
+    def __init__(self, formats=None, min_size=None, max_size=None, modified_after=None, modified_before=None,
+                 new_since_last_export=False):
+        # modified_after、modified_before 为时间戳（秒），前者包含、后者不包含；
+        # new_since_last_export 为 True 时只导出修改时间不早于上次导出的文件，
+        # 上次导出的时间由导出引擎通过 with_last_export() 给出
+        self.formats = frozenset(normalize_format(name) for name in formats) if formats else None
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_after = modified_after
+        self.modified_before = modified_before
+        self.new_since_last_export = new_since_last_export
+        self.last_export = None
+        self._update_bounds()
+
+    def _update_bounds(self):
+        # 比较修改时间时统一使用纳秒整数，避免每个文件都做浮点换算
+        after = [t for t in (self.modified_after, self.last_export) if t is not None]
+        self._after_ns = int(max(after) * 1e9) if after else None
+        self._before_ns = int(self.modified_before * 1e9) if self.modified_before is not None else None
+
+    def with_last_export(self, timestamp):
+        """返回以 timestamp 作为上次导出时间的副本，批量导出时各账号共用同一份筛选条件"""
+        export_filter = copy.copy(self)
+        export_filter.last_export = timestamp
+        export_filter._update_bounds()
+        return export_filter
+
+    def is_active(self):
+        return bool(self.formats or self.min_size or self.max_size or self.modified_after is not None or
+                    self.modified_before is not None or self.new_since_last_export)
+
+    def accepts(self, entry):
+        """entry 为扫描得到的 os.DirEntry，stat 信息已在扫描时缓存"""
+        stat = entry.stat()
+        size = stat.st_size
+        if self.min_size is not None and size < self.min_size:
+            return False
+        if self.max_size is not None and size > self.max_size:
+            return False
+        mtime_ns = stat.st_mtime_ns
+        if self._after_ns is not None and mtime_ns < self._after_ns:
+            return False
+        if self._before_ns is not None and mtime_ns >= self._before_ns:
+            return False
+        if self.formats is None:
+            return True
+        return self.detect_format(entry.path) in self.formats
+
+    @staticmethod
+    def detect_format(path):
+        """按文件头识别格式，无法识别时使用扩展名"""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(default_classifier.header_size)
+        except OSError:
+            header = b''
+        return default_classifier.classify(header) or normalize_format(os.path.splitext(path)[1])
+
+    def describe(self):
+        """返回筛选条件的文字说明"""
+        parts = []
+        if self.formats:
+            parts.append(f"格式为 {', '.join(sorted(self.formats))}")
+        if self.min_size is not None:
+            parts.append(f"不小于 {self.min_size / 1024:.0f} KB")
+        if self.max_size is not None:
+            parts.append(f"不大于 {self.max_size / 1024:.0f} KB")
+        if self.modified_after is not None:
+            parts.append(f"{time.strftime('%Y-%m-%d', time.localtime(self.modified_after))} 起")
+        if self.modified_before is not None:
+            parts.append(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(self.modified_before))} 前")
+        if self.new_since_last_export:
+            if self.last_export is None:
+                parts.append("上次导出后新增（没有找到上次导出的记录）")
+            else:
+                parts.append(f"上次导出（{time.strftime('%Y-%m-%d %H:%M', time.localtime(self.last_export))}）后新增")
+        return '，'.join(parts)
+
+    def to_dict(self):
+        return {
+            'formats': sorted(self.formats) if self.formats else None,
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'modified_after': self.modified_after,
+            'modified_before': self.modified_before,
+            'new_since_last_export': self.new_since_last_export,
+            'last_export': self.last_export,
+        }
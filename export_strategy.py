@@ -0,0 +1,72 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 没有 fcntl，写时复制克隆不可用，直接复制
+    fcntl = None
+
+# 导出方式 -> 说明
+EXPORT_STRATEGIES = {
+    'copy': '完整复制',
+    'reflink': '写时复制克隆',
+    'hardlink': '硬链接',
+    'symlink': '符号链接',
+}
+
+# 实际使用的方式在 EXPORT_STRATEGIES 之外还可能是内核复制
+STRATEGY_NAMES = dict(EXPORT_STRATEGIES, copy_file_range='内核复制')
+
+# linux/fs.h 中的 FICLONE，整个文件共享数据块，btrfs、XFS 等文件系统支持
+FICLONE = 0x40049409
+
+COPY_FILE_RANGE_CHUNK = 64 * 1024 * 1024
+
+
+def clone_file(src_fd, dst_fd, size):
+    """把 src_fd 的全部内容克隆到空文件 dst_fd，返回实际使用的方式，都不支持时返回 None
+
+    先尝试 FICLONE，只需修改元数据，不复制任何数据；不支持时用 copy_file_range 在内核中复制，
+    在支持的文件系统上同样会共享数据块，跨文件系统时也比在 Python 中读写快。
+    失败时 dst_fd 可能已写入部分内容，调用方需要清空后再用普通方式复制。
+    """
+    if fcntl is not None:
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            return 'reflink'
+        except OSError:
+            pass
+    if not hasattr(os, 'copy_file_range'):
+        return None
+    offset = 0
+    try:
+        while offset < size:
+            copied = os.copy_file_range(src_fd, dst_fd, min(COPY_FILE_RANGE_CHUNK, size - offset), offset, offset)
+            if copied == 0:
+                # 文件在复制过程中变短了
+                break
+            offset += copied
+    except OSError:
+        return None
+    return 'copy_file_range'
+
+
+def link_file(src_file, dest_file, strategy):
+    """用硬链接或符号链接导出文件，不支持时抛出 OSError
+
+    dest_file 已存在时抛出 FileExistsError，不会删除，由调用方决定是否可以覆盖
+    """
+    if strategy == 'hardlink':
+        os.link(src_file, dest_file)
+    else:
+        os.symlink(os.path.abspath(src_file), dest_file)
+
+
+def describe_strategies(counts):
+    """把 {方式: 文件数} 格式化为一行文字"""
+    return '，'.join(f"{STRATEGY_NAMES.get(strategy, strategy)} {count} 个"
+                    for strategy, count in sorted(counts.items(), key=lambda item: -item[1]))
@@ -0,0 +1,80 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+# 文件头特征表：每条规则为 (扩展名, ((偏移, 特征字节), ...))，所有字段都匹配才算命中。
+# 同一偏移处的规则按表中顺序优先匹配。
+FILE_SIGNATURES = (
+    ('jpg', ((0, b'\xff\xd8\xff'),)),
+    ('png', ((0, b'\x89PNG\r\n\x1a\n'),)),
+    ('gif', ((0, b'GIF87a'),)),
+    ('gif', ((0, b'GIF89a'),)),
+    ('bmp', ((0, b'BM'),)),
+    ('tiff', ((0, b'II*\x00'),)),
+    ('tiff', ((0, b'MM\x00*'),)),
+    # RIFF 是通用容器（wav、avi 也是），第 8 字节起必须是 WEBP 才是图片
+    ('webp', ((0, b'RIFF'), (8, b'WEBP'))),
+    ('ico', ((0, b'\x00\x00\x01\x00'),)),
+    ('ico', ((0, b'\x00\x00\x02\x00'),)),
+    ('psd', ((0, b'8BPS'),)),
+    ('svg', ((0, b'<?xml'),)),
+    ('svg', ((0, b'<svg'),)),
+    # ISO BMFF 格式开头 4 字节是 box 长度，ftyp 和品牌从第 4 字节开始
+    ('heic', ((4, b'ftypheic'),)),
+    ('heic', ((4, b'ftypheix'),)),
+    ('heic', ((4, b'ftyphevc'),)),
+    ('heic', ((4, b'ftyphevx'),)),
+    ('avif', ((4, b'ftypavif'),)),
+    ('avif', ((4, b'ftypavis'),)),
+)
+
+
+class SignatureClassifier:
+    """按文件头识别文件格式
+
+    规则按第一个字段的偏移和该偏移处的首字节分组，识别时只需一次字典查找
+    就能排除绝大多数规则，再逐个校验剩余规则的全部字段。
+    偏移较小的规则先于偏移较大的规则匹配。
+    """
+
+    def __init__(self, signatures=FILE_SIGNATURES):
+        dispatch = {}
+        header_size = 0
+        for ext, fields in signatures:
+            offset, magic = fields[0]
+            table = dispatch.setdefault(offset, {})
+            table.setdefault(magic[0], []).append((ext, fields[1:], magic))
+            for field_offset, field_magic in fields:
+                header_size = max(header_size, field_offset + len(field_magic))
+        self._dispatch = tuple((offset, {k: tuple(v) for k, v in dispatch[offset].items()})
+                               for offset in sorted(dispatch))
+        # 识别所需的最少文件头字节数
+        self.header_size = header_size
+
+    def classify(self, header):
+        """返回文件头对应的扩展名，无法识别时返回 None"""
+        size = len(header)
+        for offset, table in self._dispatch:
+            if size <= offset:
+                break
+            rules = table.get(header[offset])
+            if not rules:
+                continue
+            for ext, extra_fields, magic in rules:
+                if not header.startswith(magic, offset):
+                    continue
+                for field_offset, field_magic in extra_fields:
+                    if not header.startswith(field_magic, field_offset):
+                        break
+                else:
+                    return ext
+        return None
+
+    def classify_many(self, headers):
+        """批量识别，返回与 headers 一一对应的扩展名列表"""
+        classify = self.classify
+        return [classify(header) for header in headers]
+
+
+# 默认识别器，识别表在导入时只构建一次
+default_classifier = SignatureClassifier()
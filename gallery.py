@@ -0,0 +1,377 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from PyQt5 import QtWidgets, QtGui, QtCore
+
+
+class ThumbnailCache:
+    """磁盘上的缩略图缓存
+
+    以图片内容的哈希为键，同一张图即使文件名或位置变了也能直接命中。
+    另外保存一份 路径+大小+修改时间 → 哈希 的索引，文件没变时不需要读取内容计算哈希。
+    总大小超过 max_bytes 时按最近使用时间删除最旧的缩略图，直到降到上限的 90%。
+    """
+
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self._index = None
+        self._index_dirty = False
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def content_key(data):
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        try:
+            with open(os.path.join(self.directory, self.INDEX_FILE), encoding='utf-8') as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def key_for_file(self, path, stat):
+        """文件的大小和修改时间都和上次一样时返回上次计算的哈希，否则返回 None"""
+        with self._lock:
+            self._load_index()
+            record = self._index.get(path)
+        if record and record[0] == stat.st_size and record[1] == stat.st_mtime_ns:
+            return record[2]
+        return None
+
+    def remember_file(self, path, stat, key):
+        with self._lock:
+            self._load_index()
+            self._index[path] = [stat.st_size, stat.st_mtime_ns, key]
+            self._index_dirty = True
+
+    def save_index(self):
+        with self._lock:
+            if not self._index_dirty:
+                return
+            index_path = os.path.join(self.directory, self.INDEX_FILE)
+            # 先写临时文件再替换，避免中途出错留下损坏的索引
+            tmp_path = f"{index_path}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._index, f, ensure_ascii=False)
+                os.replace(tmp_path, index_path)
+            except OSError:
+                return
+            self._index_dirty = False
+
+    def path_for(self, key):
+        # 按哈希前两位分子目录，避免单个目录中文件过多
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+
+    def get(self, key):
+        """返回缓存的缩略图路径，没有时返回 None"""
+        path = self.path_for(key)
+        try:
+            # 更新修改时间，作为最近使用时间
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key, image):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        if not image.save(tmp_path, 'PNG'):
+            return
+        try:
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total()
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _list_files(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.png'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_total(self):
+        return sum(size for _, size, _ in self._list_files())
+
+    def _evict(self):
+        entries = sorted(self._list_files())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = set()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed.add(os.path.basename(path)[:-len('.png')])
+            except OSError:
+                pass
+        self._total_bytes = total
+        # 缩略图已删除的索引项没有用了，一并删掉，索引不会无限增长
+        if removed:
+            self._load_index()
+            stale = [path for path, record in self._index.items() if record[2] in removed]
+            for path in stale:
+                del self._index[path]
+            self._index_dirty = self._index_dirty or bool(stale)
+
+
+class _ThumbnailSignals(QtCore.QObject):
+    loaded = QtCore.pyqtSignal(int, str, QtGui.QImage)
+    listed = QtCore.pyqtSignal(str, list)
+
+
+class _ListTask(QtCore.QRunnable):
+    """在线程池中列出目录里的图片，表情很多时不会卡住界面"""
+
+    def __init__(self, directory, signals):
+        super().__init__()
+        self.directory = directory
+        self.signals = signals
+
+    def run(self):
+        try:
+            paths = list_images(self.directory)
+        except OSError:
+            paths = []
+        self.signals.listed.emit(self.directory, paths)
+
+
+class _ThumbnailTask(QtCore.QRunnable):
+    """在线程池中读取图片，优先使用磁盘缓存，没有缓存时解码并缩小后写入缓存
+
+    文件没有变化时按索引直接找到缓存的缩略图，不需要读取原图。
+    """
+
+    def __init__(self, row, path, size, cache, signals):
+        super().__init__()
+        self.row = row
+        self.path = path
+        self.size = size
+        self.cache = cache
+        self.signals = signals
+
+    def run(self):
+        image = QtGui.QImage()
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            stat = None
+        if stat is not None:
+            key = self.cache.key_for_file(self.path, stat)
+            cached = self.cache.get(key) if key else None
+            if cached:
+                image.load(cached)
+                if not image.isNull():
+                    self.signals.loaded.emit(self.row, self.path, image)
+                    return
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = None
+        if data:
+            key = self.cache.content_key(data)
+            if stat is not None:
+                self.cache.remember_file(self.path, stat, key)
+            cached = self.cache.get(key)
+            if cached:
+                image.load(cached)
+            if image.isNull():
+                image = self._decode(data)
+                if not image.isNull():
+                    self.cache.put(key, image)
+        self.signals.loaded.emit(self.row, self.path, image)
+
+    def _decode(self, data):
+        buffer = QtCore.QBuffer()
+        buffer.setData(data)
+        buffer.open(QtCore.QIODevice.ReadOnly)
+        reader = QtGui.QImageReader(buffer)
+        original = reader.size()
+        if original.isValid():
+            # 支持的格式（如 JPEG）在解码时直接缩小，动图只取第一帧
+            reader.setScaledSize(original.scaled(self.size, self.size, QtCore.Qt.KeepAspectRatio))
+        image = reader.read()
+        if not image.isNull() and (image.width() > self.size or image.height() > self.size):
+            image = image.scaled(self.size, self.size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+        return image
+
+
+class ThumbnailModel(QtCore.QAbstractListModel):
+    """缩略图列表模型
+
+    只有视图真正需要显示某一行时才在线程池中加载缩略图，
+    内存中最多保留 MEMORY_ITEMS 张，其余的需要时再从磁盘缓存读取。
+    """
+
+    THUMBNAIL_SIZE = 96
+    MEMORY_ITEMS = 1000
+
+    def __init__(self, paths, cache, parent=None):
+        super().__init__(parent)
+        self.paths = list(paths)
+        self.cache = cache
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(max(2, min(8, QtCore.QThread.idealThreadCount())))
+        self._images = OrderedDict()
+        self._pending = set()
+        # 无法解码的行，不再重复加载
+        self._failed = set()
+        self._signals = _ThumbnailSignals(self)
+        self._signals.loaded.connect(self._on_loaded)
+        self._signals.listed.connect(self._on_listed)
+        self._placeholder = QtGui.QPixmap(self.THUMBNAIL_SIZE, self.THUMBNAIL_SIZE)
+        self._placeholder.fill(QtGui.QColor('#e0e0e0'))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        path = self.paths[row]
+        if role == QtCore.Qt.DisplayRole:
+            return os.path.basename(path)
+        if role in (QtCore.Qt.ToolTipRole, QtCore.Qt.UserRole):
+            return path
+        if role == QtCore.Qt.DecorationRole:
+            image = self._images.get(row)
+            if image is not None:
+                self._images.move_to_end(row)
+                return image
+            if row not in self._failed:
+                self._request(row)
+            return self._placeholder
+        return None
+
+    def load_directory(self, directory):
+        """在线程池中列出目录里的图片，完成后重置模型（发出 modelReset）"""
+        self.pool.start(_ListTask(directory, self._signals))
+
+    def _on_listed(self, directory, paths):
+        self.beginResetModel()
+        self.paths = paths
+        self._images.clear()
+        self._pending.clear()
+        self._failed.clear()
+        self.endResetModel()
+
+    def _request(self, row):
+        if row in self._pending:
+            return
+        self._pending.add(row)
+        self.pool.start(_ThumbnailTask(row, self.paths[row], self.THUMBNAIL_SIZE, self.cache, self._signals))
+
+    def _on_loaded(self, row, path, image):
+        self._pending.discard(row)
+        if row >= len(self.paths) or self.paths[row] != path:
+            return
+        if image.isNull():
+            self._failed.add(row)
+            return
+        self._images[row] = image
+        if len(self._images) > self.MEMORY_ITEMS:
+            self._images.popitem(last=False)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
+    def cancel_pending(self):
+        """丢弃还没开始的加载任务（例如快速滚动时已经滚出视图的行），正在显示的行会重新请求"""
+        self.pool.clear()
+        self._pending.clear()
+
+    def shutdown(self):
+        self.cancel_pending()
+        self.pool.waitForDone()
+        self.cache.save_index()
+
+
+def list_images(directory):
+    """列出目录中 Qt 能读取的所有图片，按路径排序"""
+    formats = {bytes(name).decode('ascii', 'ignore').lower()
+               for name in QtGui.QImageReader.supportedImageFormats()}
+    paths = []
+    pending_dirs = [directory]
+    while pending_dirs:
+        with os.scandir(pending_dirs.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    pending_dirs.append(entry.path)
+                elif os.path.splitext(entry.name)[1][1:].lower() in formats:
+                    paths.append(entry.path)
+    paths.sort()
+    return paths
+
+
+class GalleryDialog(QtWidgets.QDialog):
+    """在程序内预览导出的表情，双击用系统默认程序打开"""
+
+    def __init__(self, directory, cache, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"表情预览 - {os.path.basename(directory)}")
+        self.resize(900, 640)
+        self.model = ThumbnailModel([], cache, self)
+
+        size = ThumbnailModel.THUMBNAIL_SIZE
+        self.view = QtWidgets.QListView()
+        self.view.setViewMode(QtWidgets.QListView.IconMode)
+        self.view.setResizeMode(QtWidgets.QListView.Adjust)
+        self.view.setMovement(QtWidgets.QListView.Static)
+        self.view.setIconSize(QtCore.QSize(size, size))
+        self.view.setGridSize(QtCore.QSize(size + 24, size + 36))
+        # 所有项目大小相同，视图不需要逐个计算尺寸，只会向模型请求可见的行
+        self.view.setUniformItemSizes(True)
+        self.view.setLayoutMode(QtWidgets.QListView.Batched)
+        self.view.setModel(self.model)
+        self.view.doubleClicked.connect(self.openItem)
+        self.view.verticalScrollBar().valueChanged.connect(self.model.cancel_pending)
+        # 无论以何种方式关闭窗口，都等待后台加载结束
+        self.finished.connect(self.model.shutdown)
+
+        self.label = QtWidgets.QLabel("正在读取表情列表…")
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.label)
+        layout.addWidget(self.view)
+        self.model.modelReset.connect(self.updateLabel)
+        self.model.load_directory(directory)
+
+    def updateLabel(self):
+        self.label.setText(f"共 {self.model.rowCount()} 个表情，双击打开")
+
+    def openItem(self, index):
+        path = index.data(QtCore.Qt.UserRole)
+        if path:
+            QtGui.QDesktopServices.openUrl(QtCore.QUrl.fromLocalFile(path))
@@ -0,0 +1,155 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# 设置此环境变量后导出时启用 cProfile，值为 1 时分析结果保存在导出目录旁边，也可以指定保存目录
+PROFILE_ENV = 'QQ_EMOJI_PROFILE'
+
+
+class StageStats:
+    """按阶段统计耗时和计数，可在多个线程中同时使用
+
+    span() 记录一段代码的实际耗时和这段时间内整个进程消耗的 CPU 时间
+    （复制等阶段的工作在线程池中完成，只统计当前线程会漏掉这部分）；
+    add() 用于在各个工作线程中累加零散的耗时，例如每个文件的格式识别。
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def _stage(self, name):
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = {'wall_s': 0.0, 'cpu_s': 0.0, 'calls': 0}
+        return stage
+
+    @contextmanager
+    def span(self, name):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall_start, time.process_time() - cpu_start)
+
+    def add(self, name, wall, cpu=0.0, **counters):
+        with self._lock:
+            stage = self._stage(name)
+            stage['wall_s'] += wall
+            stage['cpu_s'] += cpu
+            stage['calls'] += 1
+            for key, value in counters.items():
+                stage[key] = stage.get(key, 0) + value
+
+    def count(self, name, **counters):
+        """只累加计数，不计时"""
+        with self._lock:
+            stage = self._stage(name)
+            for key, value in counters.items():
+                stage[key] = stage.get(key, 0) + value
+
+    def to_dict(self):
+        with self._lock:
+            return {name: {key: round(value, 4) if isinstance(value, float) else value
+                           for key, value in stage.items()}
+                    for name, stage in self._stages.items()}
+
+
+def report_path(dst):
+    return f"{dst}_导出报告.json"
+
+
+def build_report(result, stages, started_at, finished_at, **extra):
+    """把导出结果和各阶段统计合并为报告"""
+    report = {
+        'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started_at)),
+        'finished_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(finished_at)),
+        'wall_s': round(finished_at - started_at, 3),
+        'output': result.get('output_dir'),
+        'cancelled': result.get('cancelled', False),
+        'counters': {
+            'copied': result.get('copied', 0),
+            'skipped': result.get('skipped', 0),
+            'filtered': result.get('filtered', 0),
+            'renamed': result.get('renamed', 0),
+            'name_conflicts': result.get('name_conflicts', 0),
+            'duplicates': len(result.get('duplicates', ())),
+            'errors': len(result.get('errors', ())),
+        },
+        # 实际使用的导出方式 -> 文件数
+        'strategies': result.get('strategies', {}),
+        'stages': stages,
+    }
+    report.update(extra)
+    return report
+
+
+def write_report(report, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def profile_output_path(dst):
+    """启用了性能分析时返回分析结果的保存路径，否则返回 None"""
+    value = os.environ.get(PROFILE_ENV, '').strip()
+    if not value or value == '0':
+        return None
+    name = f"{os.path.basename(dst)}_性能分析.prof"
+    if value == '1':
+        return os.path.join(os.path.dirname(os.path.abspath(dst)), name)
+    os.makedirs(value, exist_ok=True)
+    return os.path.join(value, name)
+
+
+@contextmanager
+def maybe_profile(path):
+    """path 不为 None 时用 cProfile 分析这段代码并保存结果
+
+    这段代码中启动的线程（扫描线程、复制线程池等）各自使用一个分析器，结束时合并到同一个结果中。
+    """
+    if not path:
+        yield
+        return
+    import sys
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    thread_profilers = []
+    lock = threading.Lock()
+
+    def profile_thread(frame, event, arg):
+        # 新线程第一次触发时创建自己的分析器，enable() 会替换掉这个钩子
+        thread_profiler = cProfile.Profile()
+        with lock:
+            thread_profilers.append(thread_profiler)
+        thread_profiler.enable()
+
+    # Python 3.12 起 cProfile 基于 sys.monitoring，一个分析器就能记录所有线程，同时只能启用一个
+    per_thread = sys.version_info < (3, 12)
+    if per_thread:
+        threading.setprofile(profile_thread)
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        if per_thread:
+            threading.setprofile(None)
+        stats = pstats.Stats(profiler)
+        with lock:
+            for thread_profiler in thread_profilers:
+                thread_profiler.create_stats()
+                # 没有执行任何代码的线程没有数据，pstats 不接受空的分析器
+                if thread_profiler.stats:
+                    stats.add(thread_profiler)
+        stats.dump_stats(path)
@@ -2,19 +2,37 @@
 # @Author：香草味的纳西妲
 # Email：nahida1027@126.com
 
+import time
+
+# 程序启动时间，用于统计首次绘制窗口的耗时，需要在导入其他模块之前记录
+_START_TIME = time.perf_counter()
+
 import os
 import sys
 import json
-import time
-import shutil
-import chardet
-import requests
-import mimetypes
+import sqlite3
+import threading
 import subprocess
+import multiprocessing
 import configparser
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from PyQt5 import QtWidgets, QtGui, QtCore
 from PyQt5.QtGui import QIcon
+from export_engine import ExportEngine
+from emoji_watcher import EmojiWatcher
+import near_dup
+import optimizer
+from gallery import GalleryDialog, ThumbnailCache
+from catalog import EmojiCatalog, default_catalog_path, describe_formats, format_size
+import instrumentation
+from instrumentation import StageStats
+from nickname import NicknameResolver, NicknameCache
+from export_strategy import EXPORT_STRATEGIES
+from export_filter import ExportFilter, parse_formats
+from qq_config import (DEFAULT_INI_PATH, get_app_data_dir, get_encoding_cache, read_user_data_save_path,
+                       list_accounts, get_emoji_dir, sanitize_filename, get_account_index)
 
 # 版本号
 VERSION = "1.4.3"
@@ -22,12 +40,528 @@ VERSION = "1.4.3"
 icon = os.path.dirname(os.path.abspath(__file__))
 
 
+class LogSink(QtCore.QObject):
+    """日志缓冲区
+
+    日志先放进内存中的环形缓冲区，由定时器批量写入文本框，
+    文本框最多保留 max_lines 行；需要完整日志时可以同时写入文件。
+    错误日志会立即写入文本框。
+    """
+
+    FLUSH_INTERVAL_MS = 200
+    MAX_WIDGET_LINES = 2000
+
+    def __init__(self, text_edit, status_label, max_lines=MAX_WIDGET_LINES, parent=None):
+        super().__init__(parent)
+        self.text_edit = text_edit
+        self.status_label = status_label
+        self.text_edit.document().setMaximumBlockCount(max_lines)
+        self._buffer = deque(maxlen=max_lines)
+        self._dropped = 0
+        self._spill_file = None
+        # 写入文本框的累计耗时和行数，用于导出报告
+        self.flush_seconds = 0.0
+        self.flushed_lines = 0
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.FLUSH_INTERVAL_MS)
+        self._timer.timeout.connect(self.flush)
+
+    def write(self, message):
+        if len(self._buffer) == self._buffer.maxlen:
+            # 两次刷新之间的日志超过文本框容量，最早的几行反正会被挤掉，直接丢弃
+            self._dropped += 1
+        self._buffer.append(message)
+        if self._spill_file:
+            self._spill_file.write(message + '\n')
+        if message.startswith('❌'):
+            self.flush()
+        elif not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        self._timer.stop()
+        if not self._buffer:
+            return
+        start = time.perf_counter()
+        lines = list(self._buffer)
+        self._buffer.clear()
+        if self._dropped:
+            lines.insert(0, f"……省略了 {self._dropped} 行日志……")
+            self._dropped = 0
+
+        document = self.text_edit.document()
+        cursor = QtGui.QTextCursor(document)
+        cursor.movePosition(QtGui.QTextCursor.End)
+        text = '\n'.join(lines)
+        cursor.insertText(text if document.isEmpty() else '\n' + text)
+        # 同时更新状态标签
+        self.status_label.setText(lines[-1])
+        # 自动滚动到底部
+        scrollbar = self.text_edit.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+        self.flush_seconds += time.perf_counter() - start
+        self.flushed_lines += len(lines)
+
+    def open_spill_file(self, path):
+        """把之后的所有日志完整写入 path"""
+        self.close_spill_file()
+        self._spill_file = open(path, 'a', encoding='utf-8')
+
+    def close_spill_file(self):
+        if self._spill_file:
+            self._spill_file.close()
+            self._spill_file = None
+
+
+def optimize_exported_images(engine, result, report_base, mode, on_log, on_progress, max_workers=None):
+    """导出完成后压缩或转换导出的图片，返回处理报告；导出为压缩包或出错时返回 None"""
+    output_dir = result['output_dir']
+    if not os.path.isdir(output_dir):
+        on_log("💬 导出为压缩包时不处理图片")
+        return None
+    try:
+        image_optimizer = optimizer.ImageOptimizer(
+            mode, max_workers=max_workers, on_log=on_log,
+            on_progress=lambda done, total: on_progress(done, total, True),
+            is_cancelled=engine.is_cancelled)
+        report = image_optimizer.run(output_dir, optimizer.ImageOptimizer.record_path(report_base))
+    except Exception as e:
+        on_log(f"❌ 处理图片时出错: {e}")
+        return None
+    # 转换了格式的文件需要更新导出清单，否则下次增量导出会重新复制原图
+    renamed = report.pop('renamed')
+    engine.rename_outputs(output_dir, renamed)
+    engine.update_output_contents(output_dir, report.pop('rewritten'))
+    report['renamed'] = len(renamed)
+    report['errors'] = len(report['errors'])
+    return report
+
+
+def find_similar_in_export(engine, result, report_base, on_log, on_progress):
+    """在导出的图片中查找相似表情，结果保存在导出目录旁边"""
+    output_dir = result['output_dir']
+    if not os.path.isdir(output_dir):
+        on_log("💬 导出为压缩包时不查找相似表情")
+        return
+    try:
+        finder = near_dup.NearDuplicateFinder(
+            on_log=on_log,
+            on_progress=lambda done, total: on_progress(done, total, True),
+            is_cancelled=engine.is_cancelled)
+        report = finder.run(output_dir)
+        if engine.is_cancelled():
+            return
+        report_path = near_dup.NearDuplicateFinder.report_path(report_base)
+        near_dup.NearDuplicateFinder.write_report(report, report_path)
+    except Exception as e:
+        on_log(f"❌ 查找相似表情时出错: {e}")
+        return
+    on_log(f"💬 相似表情列表已保存到: {report_path}")
+
+
+class ExportWorker(QtCore.QThread):
+    """在后台线程中运行导出引擎，进度和日志按固定间隔批量发送给界面"""
+    progressChanged = QtCore.pyqtSignal(int, int, bool)
+    logBatch = QtCore.pyqtSignal(list)
+    exportFinished = QtCore.pyqtSignal(dict)
+
+    # 两次向界面发送信号之间的最小间隔（秒）
+    EMIT_INTERVAL = 0.1
+
+    def __init__(self, src, dst, workers='auto', incremental=True, dedup=True, archive=None,
+                 find_similar=False, account=None, strategy='copy', optimize=None, export_filter=None, parent=None):
+        super().__init__(parent)
+        self.src = src
+        self.dst = dst
+        self.find_similar = find_similar
+        self.optimize = optimize
+        self.account = account
+        # 指定账号时把导出结果记录到表情目录
+        self.catalog = EmojiCatalog(default_catalog_path()) if account else None
+        self.engine = ExportEngine(on_log=self._on_log, on_progress=self._on_progress,
+                                   workers=workers, incremental=incremental, dedup=dedup, archive=archive,
+                                   catalog=self.catalog, account=account, strategy=strategy,
+                                   export_filter=export_filter)
+        self._pending_logs = []
+        self._progress = (0, 0, False)
+        self._last_emit = 0.0
+
+    def cancel(self):
+        self.engine.cancel()
+
+    def _on_log(self, message):
+        self._pending_logs.append(message)
+        # 错误信息立即发送，其余日志按间隔合并发送
+        self._maybe_emit(force=message.startswith('❌'))
+
+    def _on_progress(self, done, total, scan_finished):
+        self._progress = (done, total, scan_finished)
+        self._maybe_emit()
+
+    def _maybe_emit(self, force=False):
+        if force or time.monotonic() - self._last_emit >= self.EMIT_INTERVAL:
+            self._flush()
+
+    def _flush(self):
+        self._last_emit = time.monotonic()
+        if self._pending_logs:
+            self.logBatch.emit(self._pending_logs)
+            self._pending_logs = []
+        self.progressChanged.emit(*self._progress)
+
+    def run(self):
+        # 设置了 QQ_EMOJI_PROFILE 环境变量时用 cProfile 分析导出过程
+        profile_path = instrumentation.profile_output_path(self.dst)
+        started_at = time.time()
+        with instrumentation.maybe_profile(profile_path):
+            result = self.engine.export(self.src, self.dst)
+            if self.optimize and not result['cancelled']:
+                with self.engine.stats.span('optimize'):
+                    self.optimize_images(result)
+            if self.find_similar and not result['cancelled']:
+                with self.engine.stats.span('similar'):
+                    self.find_similar_emojis(result)
+            self.report_catalog(started_at)
+        self.finish(result, profile_path)
+
+    def finish(self, result, profile_path=None):
+        result['stats'] = self.engine.stats.to_dict()
+        result['report_base'] = self.dst
+        if self.engine.export_filter:
+            result['filter'] = self.engine.export_filter.to_dict()
+        if profile_path:
+            result['profile'] = profile_path
+            self._on_log(f"💬 性能分析结果已保存到: {profile_path}")
+        self._flush()
+        self.exportFinished.emit(result)
+
+    def report_catalog(self, started_at):
+        if not self.catalog:
+            return
+        try:
+            rows = self.catalog.count_by_format(self.account)
+            new_rows = self.catalog.new_since(started_at, self.account)
+            self.catalog.close()
+        except sqlite3.Error as e:
+            self._on_log(f"❌ 读取表情目录失败: {e}")
+            return
+        if new_rows:
+            self._on_log(f"💬 本次新增 {len(new_rows)} 个表情（{format_size(sum(row[4] for row in new_rows))}）")
+        if rows:
+            self._on_log(f"💬 该账号已导出的表情：{describe_formats(rows)}")
+
+    def optimize_images(self, result):
+        report = optimize_exported_images(self.engine, result, self.dst, self.optimize, self._on_log, self._on_progress)
+        if report is not None:
+            result['optimize'] = report
+
+    def find_similar_emojis(self, result):
+        find_similar_in_export(self.engine, result, self.dst, self._on_log, self._on_progress)
+
+
+class WatchWorker(ExportWorker):
+    """在后台线程中监视表情目录，新表情写完后立即导出，直到调用 cancel()"""
+
+    def __init__(self, src, dst, dedup=True, account=None, strategy='copy', parent=None):
+        super().__init__(src, dst, incremental=True, dedup=dedup, account=account, strategy=strategy, parent=parent)
+        self.watcher = EmojiWatcher(src, dst, on_log=self._on_log, on_progress=self._on_progress,
+                                    on_idle=self._maybe_emit, dedup=dedup, catalog=self.catalog, account=account,
+                                    strategy=strategy)
+        self.engine = self.watcher.engine
+
+    def cancel(self):
+        self.watcher.stop()
+
+    def run(self):
+        started_at = time.time()
+        result = self.watcher.run()
+        self.report_catalog(started_at)
+        self.finish(result)
+
+
+class BatchExportWorker(QtCore.QThread):
+    """同时导出多个账号
+
+    最多 MAX_PARALLEL_ACCOUNTS 个账号并行导出，复制线程数在并行的账号之间平分，
+    各账号的进度和日志按固定间隔合并发送给界面，全部完成后写入一份结果汇总。
+    """
+    accountProgress = QtCore.pyqtSignal(str, int, int, bool)
+    accountFinished = QtCore.pyqtSignal(str, dict)
+    progressChanged = QtCore.pyqtSignal(int, int, bool)
+    logBatch = QtCore.pyqtSignal(list)
+    batchFinished = QtCore.pyqtSignal(dict)
+
+    EMIT_INTERVAL = 0.1
+    MAX_PARALLEL_ACCOUNTS = 3
+
+    def __init__(self, jobs, summary_path, workers='auto', incremental=True, dedup=True, archive=None,
+                 strategy='copy', export_filter=None, find_similar=False, optimize=None, parent=None):
+        # jobs: [(QQ号, 表情目录, 输出目录), ...]；各账号共用同一份筛选条件，上次导出的时间由各自的引擎确定。
+        # find_similar、optimize 与单个账号导出相同，在每个账号导出完成后分别执行
+        super().__init__(parent)
+        self.jobs = list(jobs)
+        self.summary_path = summary_path
+        self.workers = workers
+        self.incremental = incremental
+        self.dedup = dedup
+        self.archive = archive
+        self.strategy = strategy
+        self.export_filter = export_filter
+        self.find_similar = find_similar
+        self.optimize = optimize
+        self.parallel = max(1, min(self.MAX_PARALLEL_ACCOUNTS, len(self.jobs)))
+        self._lock = threading.Lock()
+        self._cancel_event = threading.Event()
+        self._engines = {}
+        self._progress = {qq: (0, 0, False) for qq, _, _ in self.jobs}
+        self._changed = set()
+        self._pending_logs = []
+        self._last_emit = 0.0
+
+    def cancel(self):
+        self._cancel_event.set()
+        with self._lock:
+            engines = list(self._engines.values())
+        for engine in engines:
+            engine.cancel()
+
+    def _on_log(self, qq_number, message):
+        with self._lock:
+            self._pending_logs.append(f"[{qq_number}] {message}")
+        self._maybe_emit(force=message.startswith('❌'))
+
+    def _on_progress(self, qq_number, done, total, scan_finished):
+        with self._lock:
+            self._progress[qq_number] = (done, total, scan_finished)
+            self._changed.add(qq_number)
+        self._maybe_emit()
+
+    def _maybe_emit(self, force=False):
+        if force or time.monotonic() - self._last_emit >= self.EMIT_INTERVAL:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            self._last_emit = time.monotonic()
+            logs, self._pending_logs = self._pending_logs, []
+            changed = {qq: self._progress[qq] for qq in self._changed}
+            self._changed.clear()
+            progress = list(self._progress.values())
+        if logs:
+            self.logBatch.emit(logs)
+        for qq_number, (done, total, scan_finished) in changed.items():
+            self.accountProgress.emit(qq_number, done, total, scan_finished)
+        self.progressChanged.emit(sum(p[0] for p in progress), sum(p[1] for p in progress),
+                                  all(p[2] for p in progress))
+
+    def _create_engine(self, qq_number, catalog):
+        # 复制线程总数在并行导出的账号之间平分，避免某个账号占满磁盘带宽
+        budget = ExportEngine.MAX_WORKERS if self.workers == 'auto' else int(self.workers)
+        share = max(1, budget // self.parallel)
+        return ExportEngine(
+            on_log=lambda message: self._on_log(qq_number, message),
+            on_progress=lambda done, total, scan_finished: self._on_progress(qq_number, done, total, scan_finished),
+            workers='auto' if self.workers == 'auto' else share,
+            incremental=self.incremental, dedup=self.dedup, max_workers=share, archive=self.archive,
+            catalog=catalog, account=qq_number, strategy=self.strategy, export_filter=self.export_filter)
+
+    def _export_account(self, qq_number, src, dst):
+        # 每个账号使用单独的数据库连接，写入由 SQLite 串行化
+        catalog = EmojiCatalog(default_catalog_path())
+        engine = self._create_engine(qq_number, catalog)
+        with self._lock:
+            self._engines[qq_number] = engine
+        if self._cancel_event.is_set():
+            engine.cancel()
+        try:
+            result = engine.export(src, dst)
+            self._post_process(qq_number, engine, result, dst)
+            result['stats'] = engine.stats.to_dict()
+            return result
+        finally:
+            with self._lock:
+                self._engines.pop(qq_number, None)
+            try:
+                catalog.close()
+            except sqlite3.Error as e:
+                self._on_log(qq_number, f"❌ 写入表情目录失败: {e}")
+
+    def _post_process(self, qq_number, engine, result, dst):
+        if result['cancelled']:
+            return
+        on_log = lambda message: self._on_log(qq_number, message)
+        on_progress = lambda done, total, scan_finished: self._on_progress(qq_number, done, total, scan_finished)
+        if self.optimize:
+            # 处理图片的进程数同样在并行导出的账号之间平分
+            with engine.stats.span('optimize'):
+                report = optimize_exported_images(engine, result, dst, self.optimize, on_log, on_progress,
+                                                  max_workers=max(1, (os.cpu_count() or 1) // self.parallel))
+            if report is not None:
+                result['optimize'] = report
+        if self.find_similar:
+            with engine.stats.span('similar'):
+                find_similar_in_export(engine, result, dst, on_log, on_progress)
+
+    def run(self):
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix='emoji-account') as executor:
+            futures = {executor.submit(self._export_account, qq, src, dst): qq for qq, src, dst in self.jobs}
+            for future in as_completed(futures):
+                qq_number = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'copied': 0, 'skipped': 0, 'filtered': 0, 'renamed': 0, 'duplicates': [],
+                              'errors': [(qq_number, str(e))], 'cancelled': False, 'output_dir': ''}
+                results[qq_number] = result
+                self._flush()
+                self.accountFinished.emit(qq_number, result)
+
+        summary = self.build_summary(results)
+        try:
+            with open(self.summary_path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            self._on_log('-', f"❌ 写入结果汇总失败: {e}")
+        self._flush()
+        self.batchFinished.emit(summary)
+
+    def build_summary(self, results):
+        accounts = []
+        for qq_number, _, _ in self.jobs:
+            result = results.get(qq_number)
+            if result is None:
+                continue
+            accounts.append({
+                'qq': qq_number,
+                'output_dir': result['output_dir'],
+                'copied': result['copied'],
+                'skipped': result['skipped'],
+                'filtered': result.get('filtered', 0),
+                'duplicates': len(result['duplicates']),
+                'renamed': result['renamed'],
+                'errors': [list(error) for error in result['errors']],
+                'cancelled': result['cancelled'],
+                'strategies': result.get('strategies', {}),
+                'optimize': result.get('optimize'),
+                'stages': result.get('stats', {}),
+            })
+        return {
+            'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'summary_path': self.summary_path,
+            'accounts': accounts,
+            'total': {key: sum(len(a[key]) if key == 'errors' else a[key] for a in accounts)
+                      for key in ('copied', 'skipped', 'filtered', 'duplicates', 'renamed', 'errors')},
+            'cancelled': any(a['cancelled'] for a in accounts),
+        }
+
+
+class BatchProgressDialog(QtWidgets.QDialog):
+    """批量导出时显示每个账号的进度"""
+
+    def __init__(self, accounts, parent=None):
+        # accounts: [(QQ号, 显示名称), ...]
+        super().__init__(parent)
+        self.setWindowTitle('批量导出进度')
+        self.resize(640, 360)
+        layout = QtWidgets.QVBoxLayout()
+        self.tree = QtWidgets.QTreeWidget()
+        self.tree.setHeaderLabels(['账号', '进度', '状态'])
+        self.tree.setRootIsDecorated(False)
+        self.tree.setColumnWidth(0, 220)
+        self.tree.setColumnWidth(1, 220)
+        self.items = {}
+        self.bars = {}
+        for qq_number, display_name in accounts:
+            item = QtWidgets.QTreeWidgetItem([display_name, '', '等待中'])
+            self.tree.addTopLevelItem(item)
+            bar = QtWidgets.QProgressBar()
+            bar.setMaximum(0)
+            self.tree.setItemWidget(item, 1, bar)
+            self.items[qq_number] = item
+            self.bars[qq_number] = bar
+        layout.addWidget(self.tree)
+        self.setLayout(layout)
+
+    def updateAccount(self, qq_number, done, total, scan_finished):
+        bar = self.bars[qq_number]
+        bar.setFormat('%p%' if scan_finished else '%v / %m+')
+        bar.setMaximum(max(total, 1))
+        bar.setValue(done)
+        self.items[qq_number].setText(2, '导出中')
+
+    def finishAccount(self, qq_number, result):
+        if result['cancelled']:
+            status = '已取消'
+        elif result['errors']:
+            status = f"完成，{len(result['errors'])} 个错误"
+        else:
+            status = f"完成，复制 {result['copied']} 个"
+        self.items[qq_number].setText(2, status)
+
+
+class NicknameWorker(QtCore.QThread):
+    """在后台线程中并发查询昵称，每查到一个就通知界面"""
+    nicknameResolved = QtCore.pyqtSignal(str, str)
+
+    def __init__(self, qq_numbers, parent=None):
+        super().__init__(parent)
+        self.qq_numbers = list(qq_numbers)
+
+    def run(self):
+        resolver = NicknameResolver()
+        try:
+            for qq_number, nickname in resolver.resolve_many(self.qq_numbers):
+                if nickname:
+                    self.nicknameResolved.emit(qq_number, nickname)
+        finally:
+            resolver.close()
+
+
+class AccountIndexWorker(QtCore.QThread):
+    """在后台线程中统计各账号的表情数量和大小，目录没有变化的账号直接使用缓存"""
+    accountScanned = QtCore.pyqtSignal(str, int, 'qint64')
+
+    def __init__(self, userdata_save_path, qq_numbers, parent=None):
+        super().__init__(parent)
+        self.userdata_save_path = userdata_save_path
+        self.qq_numbers = list(qq_numbers)
+
+    def run(self):
+        index = get_account_index()
+        for qq_number, count, total, _ in index.iter_accounts(self.userdata_save_path, self.qq_numbers):
+            self.accountScanned.emit(qq_number, count, total)
+            if self.isInterruptionRequested():
+                # 关闭窗口时不再统计剩余账号，已统计的结果仍然保存
+                index.save()
+                return
+
+
 class QQNTEmojiExporter(QtWidgets.QWidget):
+    # 窗口第一次绘制完成
+    firstPainted = QtCore.pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.savePath = None
-        self.default_ini_path = r'C:\Users\Public\Documents\Tencent\QQ\UserDataInfo.ini'
+        self.default_ini_path = DEFAULT_INI_PATH
         self.userdata_save_path_cache = None
+        self.exportWorker = None
+        self.batchDialog = None
+        self.nicknameWorker = None
+        self.accountIndexWorker = None
+        # 下拉框中显示的昵称和表情统计，QQ号 -> 昵称 / (文件数, 字节数)
+        self.account_nicknames = {}
+        self.account_stats = {}
+        self.nickname_cache = None
+        self.thumbnail_cache = None
+        # 界面线程中各阶段的耗时，写入导出报告：启动时查询昵称只有一次，读取配置每次导出单独统计
+        self.startup_stats = StageStats()
+        self.export_stats = StageStats()
+        self._export_started = None
+        self._log_flush_mark = (0.0, 0)
+        self._first_painted = False
         self.initUI()
 
     def initUI(self):
@@ -77,10 +611,116 @@ class QQNTEmojiExporter(QtWidgets.QWidget):
         form_layout.addRow(user_label, user_layout)
         layout.addLayout(form_layout)
 
+        # 导出选项分页显示，窗口大小固定，全部放在一页里日志区域会被挤得几乎看不见
+        self.optionsTabWidget = QtWidgets.QTabWidget()
+        self.set_font(self.optionsTabWidget)
+        export_page = QtWidgets.QWidget()
+        export_form = QtWidgets.QFormLayout(export_page)
+        post_page = QtWidgets.QWidget()
+        post_form = QtWidgets.QFormLayout(post_page)
+
+        self.workersComboBox = QtWidgets.QComboBox()
+        self.set_font(self.workersComboBox)
+        self.workersComboBox.addItem('自动（根据复制速度调整）', 'auto')
+        for count in (1, 2, 4, 8, 16, 32):
+            self.workersComboBox.addItem(f'{count} 个线程', count)
+        workers_label = QtWidgets.QLabel('复制线程:')
+        workers_label.setFont(QtGui.QFont("SimHei", 11, QtGui.QFont.Bold))
+        export_form.addRow(workers_label, self.workersComboBox)
+
+        self.outputComboBox = QtWidgets.QComboBox()
+        self.set_font(self.outputComboBox)
+        self.outputComboBox.addItem('文件夹', None)
+        self.outputComboBox.addItem('ZIP 压缩包（单个文件，方便移动）', 'zip')
+        self.outputComboBox.addItem('TAR 归档（单个文件，不压缩）', 'tar')
+        self.outputComboBox.currentIndexChanged.connect(self.onOutputFormatChanged)
+        output_label = QtWidgets.QLabel('导出为:')
+        output_label.setFont(QtGui.QFont("SimHei", 11, QtGui.QFont.Bold))
+        export_form.addRow(output_label, self.outputComboBox)
+
+        self.strategyComboBox = QtWidgets.QComboBox()
+        self.set_font(self.strategyComboBox)
+        for strategy, name in EXPORT_STRATEGIES.items():
+            self.strategyComboBox.addItem(name, strategy)
+        # 克隆和链接只有保存位置与QQ数据在同一个分区时才有效，不支持的文件会自动改为完整复制
+        self.strategyComboBox.setToolTip('写时复制克隆、硬链接、符号链接几乎不占用额外空间，\n'
+                                         '只在保存位置与QQ数据位于同一分区时有效，不支持时自动改为完整复制。\n'
+                                         '注意：硬链接与QQ数据共用同一份文件，修改导出的表情会同时修改QQ中的原图；\n'
+                                         '符号链接在QQ清理缓存后会失效。')
+        strategy_label = QtWidgets.QLabel('导出方式:')
+        strategy_label.setFont(QtGui.QFont("SimHei", 11, QtGui.QFont.Bold))
+        export_form.addRow(strategy_label, self.strategyComboBox)
+
+        self.incrementalCheckBox = QtWidgets.QCheckBox('增量导出（跳过上次已导出且未变化的文件）')
+        self.set_font(self.incrementalCheckBox)
+        self.incrementalCheckBox.setChecked(True)
+        export_form.addRow('', self.incrementalCheckBox)
+
+        self.dedupCheckBox = QtWidgets.QCheckBox('去除重复表情（内容完全相同的文件只导出一份）')
+        self.set_font(self.dedupCheckBox)
+        self.dedupCheckBox.setChecked(True)
+        export_form.addRow('', self.dedupCheckBox)
+
+        self.similarCheckBox = QtWidgets.QCheckBox('导出后查找相似表情（重新压缩、缩放过的同一张图）')
+        self.set_font(self.similarCheckBox)
+        self.similar_available = near_dup.is_available()
+        if not self.similar_available:
+            self.similarCheckBox.setEnabled(False)
+            self.similarCheckBox.setToolTip('需要安装 numpy 和 Pillow')
+        post_form.addRow('', self.similarCheckBox)
+
+        self.optimizeComboBox = QtWidgets.QComboBox()
+        self.set_font(self.optimizeComboBox)
+        self.optimizeComboBox.addItem('不处理', None)
+        for mode, name in optimizer.OPTIMIZE_MODES.items():
+            self.optimizeComboBox.addItem(name, mode)
+        self.optimize_available = optimizer.is_available()
+        if self.optimize_available:
+            self.optimizeComboBox.setToolTip('导出后用多个进程压缩或转换图片，动图保持原样，已处理过的图片不会重复处理')
+        else:
+            self.optimizeComboBox.setEnabled(False)
+            self.optimizeComboBox.setToolTip('需要安装 Pillow')
+        optimize_label = QtWidgets.QLabel('图片处理:')
+        optimize_label.setFont(QtGui.QFont("SimHei", 11, QtGui.QFont.Bold))
+        post_form.addRow(optimize_label, self.optimizeComboBox)
+
+        self.saveLogCheckBox = QtWidgets.QCheckBox('保存完整日志到文件（窗口中只保留最近的日志）')
+        self.set_font(self.saveLogCheckBox)
+        post_form.addRow('', self.saveLogCheckBox)
+
+        self.filterGroupBox = self.create_filter_group()
+        self.optionsTabWidget.addTab(export_page, '导出设置')
+        self.optionsTabWidget.addTab(post_page, '导出后处理')
+        self.optionsTabWidget.addTab(self.filterGroupBox, '筛选')
+        # 筛选条件在单独的页面中，启用时在标签上提示，避免忘记
+        self.filterGroupBox.toggled.connect(lambda checked: self.optionsTabWidget.setTabText(
+            self.optionsTabWidget.indexOf(self.filterGroupBox), '筛选（已启用）' if checked else '筛选'))
+        layout.addWidget(self.optionsTabWidget)
+
+        button_layout = QtWidgets.QHBoxLayout()
         self.startButton = QtWidgets.QPushButton('开始导出')
         self.set_font(self.startButton)
         self.startButton.clicked.connect(self.startExport)
-        layout.addWidget(self.startButton)
+        button_layout.addWidget(self.startButton)
+        self.exportAllButton = QtWidgets.QPushButton('导出全部账号')
+        self.set_font(self.exportAllButton)
+        self.exportAllButton.clicked.connect(self.startBatchExport)
+        button_layout.addWidget(self.exportAllButton)
+        self.watchButton = QtWidgets.QPushButton('实时监视导出')
+        self.set_font(self.watchButton)
+        self.watchButton.setToolTip('一边在QQ中滚动浏览收藏的表情，一边自动导出新加载的表情')
+        self.watchButton.clicked.connect(self.startWatch)
+        button_layout.addWidget(self.watchButton)
+        self.galleryButton = QtWidgets.QPushButton('预览已导出的表情')
+        self.set_font(self.galleryButton)
+        self.galleryButton.clicked.connect(self.openGallery)
+        button_layout.addWidget(self.galleryButton)
+        self.cancelButton = QtWidgets.QPushButton('取消导出')
+        self.set_font(self.cancelButton)
+        self.cancelButton.setEnabled(False)
+        self.cancelButton.clicked.connect(self.cancelExport)
+        button_layout.addWidget(self.cancelButton)
+        layout.addLayout(button_layout)
 
         self.progressBar = QtWidgets.QProgressBar()
         self.progressBar.setStyleSheet("""
@@ -113,6 +753,7 @@ class QQNTEmojiExporter(QtWidgets.QWidget):
         self.set_font(self.statusLabel)
         self.statusLabel.setStyleSheet("QLabel {font-size: 20px;}")
         layout.addWidget(self.statusLabel)
+        self.logSink = LogSink(self.logTextEdit, self.statusLabel, parent=self)
 
         # 添加反馈按钮
         self.feedbackButton = QtWidgets.QPushButton('👉使用中遇到问题？点我加群反馈！👈')
@@ -127,7 +768,14 @@ class QQNTEmojiExporter(QtWidgets.QWidget):
         self.log("💡Tips: 使用中遇到问题或者反馈bug，可点击程序下方按钮反馈！")
         self.log("💡建议在使用前提前打开要提取表情包的账户，随便选择一个聊天窗口，将表情全部加载出来，这样提取的表情包更齐全。")
 
-        self.populateUserComboBox()
+        # 读取配置文件、查找账号放到窗口显示出来之后再做
+        self.firstPainted.connect(lambda: QtCore.QTimer.singleShot(0, self.populateUserComboBox))
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._first_painted:
+            self._first_painted = True
+            self.firstPainted.emit()
 
     def set_font(self, widget):
         font = QtGui.QFont("SimHei", 11)  # 使用系统自带的黑体字体
@@ -142,57 +790,80 @@ class QQNTEmojiExporter(QtWidgets.QWidget):
             self.log(f"✅ 已将保存路径设置为: {directory}")
 
     def get_nickname_cache_path(self):
-        appdata_path = os.getenv('LOCALAPPDATA')
-        if not appdata_path:
-            appdata_path = os.path.join(os.getenv('USERPROFILE'), 'AppData', 'LocalLow')
-        cache_dir = os.path.join(appdata_path, 'QQ表情包批量提取工具数据目录')
-        os.makedirs(cache_dir, exist_ok=True)
-        return os.path.join(cache_dir, '用户昵称缓存.json')
-
-    def load_nickname_cache(self):
-        cache_path = self.get_nickname_cache_path()
-        if os.path.exists(cache_path):
-            try:
-                with open(cache_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
-
-    def save_nickname_cache(self, cache_data):
-        cache_path = self.get_nickname_cache_path()
+        return os.path.join(get_app_data_dir(), '用户昵称缓存.json')
+
+    def get_nickname_cache(self):
+        if self.nickname_cache is None:
+            self.nickname_cache = NicknameCache(self.get_nickname_cache_path())
+        return self.nickname_cache
+
+    def save_nickname_cache(self):
         try:
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
-        except:
+            self.get_nickname_cache().flush()
+        except OSError:
             self.log("❌ 保存昵称缓存失败")
 
-    def get_user_nickname(self, qq_number):
-        cache = self.load_nickname_cache()
-        now = int(time.time())
-        
-        # 检查缓存中是否有有效数据
-        if qq_number in cache and \
-           'username_expire_time' in cache[qq_number] and \
-           cache[qq_number]['username_expire_time'] > now:
-            return cache[qq_number].get('name', '')
-        
-        # 从API获取新数据
-        try:
-            response = requests.get(f"https://uapis.cn/api/v1/social/qq/userinfo?qq={qq_number}")
-            data = response.json()
-            if response.status_code == 200 and data["nickname"]:
-                # 更新缓存
-                cache[qq_number] = {
-                    'name': data['nickname'],
-                    'username_expire_time': now + 3600  # 1小时后过期
-                }
-                self.save_nickname_cache(cache)
-                return data['nickname']
-        except:
-            pass
-        
-        return ''
+    def addUsersToComboBox(self, qq_numbers, userdata_save_path=None):
+        """先用QQ号和缓存中的昵称填充下拉框，缓存中没有的昵称在后台并发查询，
+        同时在后台统计每个账号的表情数量和大小"""
+        cache = self.get_nickname_cache()
+        pending = []
+        for qq_number in qq_numbers:
+            # 检查缓存中是否有有效数据
+            nickname = cache.get(qq_number)
+            if nickname:
+                self.account_nicknames[qq_number] = nickname
+            else:
+                pending.append(qq_number)
+            self.userComboBox.addItem(self.account_label(qq_number), qq_number)
+
+        if userdata_save_path and not self.accountIndexWorker:
+            self.accountIndexWorker = AccountIndexWorker(userdata_save_path, qq_numbers, self)
+            self.accountIndexWorker.accountScanned.connect(self.onAccountScanned)
+            self.accountIndexWorker.finished.connect(self.onAccountIndexFinished)
+            self.accountIndexWorker.start()
+
+        if pending:
+            self.nicknameWorker = NicknameWorker(pending, self)
+            self._nickname_started = time.perf_counter()
+            self.nicknameWorker.nicknameResolved.connect(self.onNicknameResolved)
+            self.nicknameWorker.finished.connect(self.onNicknamesFinished)
+            self.nicknameWorker.start()
+
+    def account_label(self, qq_number):
+        nickname = self.account_nicknames.get(qq_number)
+        label = f"{nickname}（{qq_number}）" if nickname else qq_number
+        stats = self.account_stats.get(qq_number)
+        if stats:
+            label += f"  ·  {stats[0]} 个表情，{format_size(stats[1])}"
+        return label
+
+    def updateAccountItem(self, qq_number):
+        index = self.userComboBox.findData(qq_number)
+        if index >= 0:
+            self.userComboBox.setItemText(index, self.account_label(qq_number))
+
+    def onNicknameResolved(self, qq_number, nickname):
+        self.account_nicknames[qq_number] = nickname
+        self.updateAccountItem(qq_number)
+        self.get_nickname_cache().set(qq_number, nickname)
+
+    def onAccountScanned(self, qq_number, count, total):
+        self.account_stats[qq_number] = (count, total)
+        self.updateAccountItem(qq_number)
+
+    def onAccountIndexFinished(self):
+        if self.sender() is self.accountIndexWorker:
+            self.accountIndexWorker = None
+
+    def onNicknamesFinished(self):
+        # 所有昵称查询结束后统一写一次缓存；重新填充下拉框时可能先后有多个查询线程
+        worker = self.sender()
+        self.startup_stats.add('nickname', time.perf_counter() - self._nickname_started,
+                               accounts=len(worker.qq_numbers))
+        self.save_nickname_cache()
+        if worker is self.nicknameWorker:
+            self.nicknameWorker = None
 
     def populateUserComboBox(self):
         configPath = self.default_ini_path
@@ -201,13 +872,7 @@ class QQNTEmojiExporter(QtWidgets.QWidget):
             if userdata_save_path:
                 numeric_subdirs = self.get_numeric_subdirectories(userdata_save_path)
                 if numeric_subdirs:
-                    for subdir in numeric_subdirs:
-                        nickname = self.get_user_nickname(subdir)
-                        if nickname:
-                            display_name = f"{nickname}（{subdir}）"
-                            self.userComboBox.addItem(display_name, subdir)
-                        else:
-                            self.userComboBox.addItem(subdir, subdir)
+                    self.addUsersToComboBox(numeric_subdirs, userdata_save_path)
                 else:
                     self.log("❌ 未找到任何用户目录")
                     reply = QtWidgets.QMessageBox.question(
@@ -231,13 +896,7 @@ class QQNTEmojiExporter(QtWidgets.QWidget):
                             self.log(f"✅ 已手动选择目录: {directory}")
                             numeric_subdirs = self.get_numeric_subdirectories(directory)
                             if numeric_subdirs:
-                                for subdir in numeric_subdirs:
-                                    nickname = self.get_user_nickname(subdir)
-                                    if nickname:
-                                        display_name = f"{nickname}（{subdir}）"
-                                        self.userComboBox.addItem(display_name, subdir)
-                                    else:
-                                        self.userComboBox.addItem(subdir, subdir)
+                                self.addUsersToComboBox(numeric_subdirs, directory)
                             else:
                                 self.log("❌ 手动选择的目录中也未找到任何用户目录")
                         else:
@@ -270,13 +929,7 @@ class QQNTEmojiExporter(QtWidgets.QWidget):
                     if userdata_save_path:
                         numeric_subdirs = self.get_numeric_subdirectories(userdata_save_path)
                         if numeric_subdirs:
-                            for subdir in numeric_subdirs:
-                                nickname = self.get_user_nickname(subdir)
-                                if nickname:
-                                    display_name = f"{nickname}（{subdir}）"
-                                    self.userComboBox.addItem(display_name, subdir)
-                                else:
-                                    self.userComboBox.addItem(subdir, subdir)
+                            self.addUsersToComboBox(numeric_subdirs, userdata_save_path)
                         else:
                             self.log("❌ 未找到任何用户目录")
                             reply = QtWidgets.QMessageBox.question(
@@ -300,13 +953,7 @@ class QQNTEmojiExporter(QtWidgets.QWidget):
                                     self.log(f"✅ 已手动选择目录: {directory}")
                                     numeric_subdirs = self.get_numeric_subdirectories(directory)
                                     if numeric_subdirs:
-                                        for subdir in numeric_subdirs:
-                                            nickname = self.get_user_nickname(subdir)
-                                            if nickname:
-                                                display_name = f"{nickname}（{subdir}）"
-                                                self.userComboBox.addItem(display_name, subdir)
-                                            else:
-                                                self.userComboBox.addItem(subdir, subdir)
+                                        self.addUsersToComboBox(numeric_subdirs, directory)
                                     else:
                                         self.log("❌ 手动选择的目录中也未找到任何用户目录")
                                 else:
@@ -321,16 +968,82 @@ class QQNTEmojiExporter(QtWidgets.QWidget):
                     sys.exit()
 
     def sanitize_filename(self, name):
-        # Windows文件名非法字符
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            name = name.replace(char, '')
-        return name.strip()
+        return sanitize_filename(name)
+
+    def create_filter_group(self):
+        """只导出部分表情的筛选条件，勾选标题后生效"""
+        group = QtWidgets.QGroupBox('只导出符合条件的表情')
+        self.set_font(group)
+        group.setCheckable(True)
+        group.setChecked(False)
+        group.setToolTip('在扫描时就排除不符合条件的文件，只复制选中的表情。实时监视导出不使用这些条件')
+        filter_layout = QtWidgets.QFormLayout(group)
+
+        self.formatsLineEdit = QtWidgets.QLineEdit()
+        self.set_font(self.formatsLineEdit)
+        self.formatsLineEdit.setPlaceholderText('例如 gif, png，留空表示全部格式')
+        self.formatsLineEdit.setToolTip('按文件头识别实际格式，与文件原来的扩展名无关')
+        filter_layout.addRow('格式:', self.formatsLineEdit)
+
+        size_layout = QtWidgets.QHBoxLayout()
+        self.minSizeSpinBox = QtWidgets.QSpinBox()
+        self.maxSizeSpinBox = QtWidgets.QSpinBox()
+        for spin_box in (self.minSizeSpinBox, self.maxSizeSpinBox):
+            self.set_font(spin_box)
+            spin_box.setRange(0, 1024 * 1024)
+            spin_box.setSuffix(' KB')
+            spin_box.setSpecialValueText('不限')
+        size_layout.addWidget(self.minSizeSpinBox)
+        size_layout.addWidget(QtWidgets.QLabel('至'))
+        size_layout.addWidget(self.maxSizeSpinBox)
+        size_layout.addStretch()
+        filter_layout.addRow('大小:', size_layout)
+
+        date_layout = QtWidgets.QHBoxLayout()
+        self.dateCheckBox = QtWidgets.QCheckBox('修改日期')
+        self.set_font(self.dateCheckBox)
+        today = QtCore.QDate.currentDate()
+        self.dateFromEdit = QtWidgets.QDateEdit(today.addMonths(-1))
+        self.dateToEdit = QtWidgets.QDateEdit(today)
+        for date_edit in (self.dateFromEdit, self.dateToEdit):
+            self.set_font(date_edit)
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat('yyyy-MM-dd')
+            date_edit.setEnabled(False)
+            self.dateCheckBox.toggled.connect(date_edit.setEnabled)
+        date_layout.addWidget(self.dateCheckBox)
+        date_layout.addWidget(self.dateFromEdit)
+        date_layout.addWidget(QtWidgets.QLabel('至'))
+        date_layout.addWidget(self.dateToEdit)
+        date_layout.addStretch()
+        filter_layout.addRow('', date_layout)
+
+        self.newOnlyCheckBox = QtWidgets.QCheckBox('只导出上次导出之后新增的表情')
+        self.set_font(self.newOnlyCheckBox)
+        filter_layout.addRow('', self.newOnlyCheckBox)
+        return group
+
+    def get_export_filter(self):
+        """根据界面上的筛选条件返回 ExportFilter，没有启用任何条件时返回 None"""
+        if not self.filterGroupBox.isChecked():
+            return None
+        modified_after = modified_before = None
+        if self.dateCheckBox.isChecked():
+            # 结束日期包含当天，比较时使用下一天的零点
+            modified_after = QtCore.QDateTime(self.dateFromEdit.date()).toSecsSinceEpoch()
+            modified_before = QtCore.QDateTime(self.dateToEdit.date().addDays(1)).toSecsSinceEpoch()
+        export_filter = ExportFilter(
+            formats=parse_formats(self.formatsLineEdit.text()),
+            min_size=self.minSizeSpinBox.value() * 1024 or None,
+            max_size=self.maxSizeSpinBox.value() * 1024 or None,
+            modified_after=modified_after, modified_before=modified_before,
+            new_since_last_export=self.newOnlyCheckBox.isChecked())
+        return export_filter if export_filter.is_active() else None
 
     def get_display_name(self, qq_number):
-        cache = self.load_nickname_cache()
-        if qq_number in cache and 'name' in cache[qq_number]:
-            return f"{cache[qq_number]['name']}（{qq_number}）"
+        nickname = self.get_nickname_cache().get_name(qq_number)
+        if nickname:
+            return f"{nickname}（{qq_number}）"
         return qq_number
 
     def startExport(self):
@@ -340,63 +1053,321 @@ class QQNTEmojiExporter(QtWidgets.QWidget):
             QtWidgets.QMessageBox.information(self, '提示', '你还没有选择用户呢，请先选择一个用户！', QtWidgets.QMessageBox.Ok)
             return
 
+        if not self.checkSavePath():
+            return
+
+        self.export_stats = StageStats()
+        userdata_save_path = self.resolveUserdataSavePath()
+        if userdata_save_path:
+            emoji_path = self.get_emoji_path(userdata_save_path, selected_data)
+            output_dir = self.get_output_dir(selected_data)
+
+            workers = self.workersComboBox.currentData()
+            incremental = self.incrementalCheckBox.isChecked()
+            dedup = self.dedupCheckBox.isChecked()
+            archive = self.outputComboBox.currentData()
+            find_similar = self.similarCheckBox.isChecked()
+            strategy = self.strategyComboBox.currentData()
+            optimize = self.optimizeComboBox.currentData()
+            export_filter = self.get_export_filter()
+            self.exportWorker = ExportWorker(str(emoji_path), output_dir, workers, incremental, dedup, archive,
+                                             find_similar, selected_data, strategy, optimize, export_filter, self)
+            self.exportWorker.progressChanged.connect(self.onExportProgress)
+            self.exportWorker.logBatch.connect(self.onExportLogs)
+            self.exportWorker.exportFinished.connect(self.onExportFinished)
+            if self.saveLogCheckBox.isChecked():
+                self.openLogFile(f"{output_dir}_导出日志.txt")
+            self.setExportRunning(True)
+            self.exportWorker.start()
+        else:
+            self.log("❌ 读取配置文件失败")
+
+    def startWatch(self):
+        selected_data = self.userComboBox.currentData()
+        if not selected_data:
+            self.log("❌ 你还没有选择用户呢，请先选择一个用户！")
+            QtWidgets.QMessageBox.information(self, '提示', '你还没有选择用户呢，请先选择一个用户！', QtWidgets.QMessageBox.Ok)
+            return
+
+        if not self.checkSavePath():
+            return
+
+        self.export_stats = StageStats()
+        userdata_save_path = self.resolveUserdataSavePath()
+        if not userdata_save_path:
+            self.log("❌ 读取配置文件失败")
+            return
+
+        emoji_path = self.get_emoji_path(userdata_save_path, selected_data)
+        output_dir = self.get_output_dir(selected_data)
+        self.exportWorker = WatchWorker(str(emoji_path), output_dir, self.dedupCheckBox.isChecked(), selected_data,
+                                        self.strategyComboBox.currentData(), self)
+        self.exportWorker.progressChanged.connect(self.onExportProgress)
+        self.exportWorker.logBatch.connect(self.onExportLogs)
+        self.exportWorker.exportFinished.connect(self.onWatchFinished)
+        if self.saveLogCheckBox.isChecked():
+            self.openLogFile(f"{output_dir}_导出日志.txt")
+        self.setExportRunning(True)
+        self.cancelButton.setText('停止监视')
+        self.log("💡现在可以在QQ中打开表情面板，滚动浏览收藏的表情，新加载的表情会自动导出。")
+        self.exportWorker.start()
+
+    def onWatchFinished(self, result):
+        self.writeExportReport(result)
+        self.setExportRunning(False)
+        self.cancelButton.setText('取消导出')
+        self.exportWorker = None
+        if result['errors']:
+            self.log(f"❌ 有 {len(result['errors'])} 个文件处理失败")
+        self.logSink.flush()
+        self.logSink.close_spill_file()
+
+    def get_thumbnail_cache(self):
+        if self.thumbnail_cache is None:
+            self.thumbnail_cache = ThumbnailCache(os.path.join(get_app_data_dir(), '缩略图缓存'))
+        return self.thumbnail_cache
+
+    def openGallery(self):
+        selected_data = self.userComboBox.currentData()
+        if not selected_data:
+            self.log("❌ 你还没有选择用户呢，请先选择一个用户！")
+            QtWidgets.QMessageBox.information(self, '提示', '你还没有选择用户呢，请先选择一个用户！', QtWidgets.QMessageBox.Ok)
+            return
+        if not self.checkSavePath():
+            return
+        output_dir = self.get_output_dir(selected_data)
+        if not os.path.isdir(output_dir):
+            self.log(f"❌ 还没有导出过这个账号的表情: {output_dir}")
+            QtWidgets.QMessageBox.information(self, '提示', '还没有导出过这个账号的表情，请先导出！', QtWidgets.QMessageBox.Ok)
+            return
+        dialog = GalleryDialog(output_dir, self.get_thumbnail_cache(), self)
+        dialog.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        dialog.show()
+
+    def startBatchExport(self):
+        qq_numbers = [self.userComboBox.itemData(i) for i in range(self.userComboBox.count())]
+        # 下拉框里可能有重复的账号，去重并保持原有顺序
+        qq_numbers = list(dict.fromkeys(qq for qq in qq_numbers if qq))
+        if not qq_numbers:
+            self.log("❌ 没有可以导出的账号！")
+            QtWidgets.QMessageBox.information(self, '提示', '没有可以导出的账号！', QtWidgets.QMessageBox.Ok)
+            return
+
+        if not self.checkSavePath():
+            return
+
+        self.export_stats = StageStats()
+        userdata_save_path = self.resolveUserdataSavePath()
+        if not userdata_save_path:
+            self.log("❌ 读取配置文件失败")
+            return
+
+        jobs = [(qq, str(self.get_emoji_path(userdata_save_path, qq)), self.get_output_dir(qq)) for qq in qq_numbers]
+        summary_path = os.path.join(self.savePath, '批量导出结果.json')
+        self.log(f"💬 开始批量导出 {len(jobs)} 个账号……")
+
+        self.exportWorker = BatchExportWorker(jobs, summary_path, self.workersComboBox.currentData(),
+                                              self.incrementalCheckBox.isChecked(),
+                                              self.dedupCheckBox.isChecked(),
+                                              self.outputComboBox.currentData(),
+                                              self.strategyComboBox.currentData(),
+                                              self.get_export_filter(),
+                                              find_similar=self.similarCheckBox.isChecked(),
+                                              optimize=self.optimizeComboBox.currentData(), parent=self)
+        self.batchDialog = BatchProgressDialog([(qq, self.get_display_name(qq)) for qq in qq_numbers], self)
+        self.exportWorker.accountProgress.connect(self.batchDialog.updateAccount)
+        self.exportWorker.accountFinished.connect(self.batchDialog.finishAccount)
+        self.exportWorker.progressChanged.connect(self.onExportProgress)
+        self.exportWorker.logBatch.connect(self.onExportLogs)
+        self.exportWorker.batchFinished.connect(self.onBatchExportFinished)
+        if self.saveLogCheckBox.isChecked():
+            self.openLogFile(os.path.join(self.savePath, '批量导出日志.txt'))
+        self.setExportRunning(True)
+        self.batchDialog.show()
+        self.exportWorker.start()
+
+    def checkSavePath(self):
         if not self.savePath:
             self.log("❌ 你还没有选择保存路径呢，请先选择保存路径！")
             QtWidgets.QMessageBox.information(self, '提示', '你还没有选择保存路径呢，请先选择保存路径！', QtWidgets.QMessageBox.Ok)
-            return
+            return False
+        return True
 
+    def resolveUserdataSavePath(self):
         configPath = self.default_ini_path
         if not os.path.exists(configPath):
             self.log("❌ 未找到配置文件，请手动选择！")
             configPath, _ = QtWidgets.QFileDialog.getOpenFileName(self, "💬 选择配置文件", "", "INI Files (*.ini);;All Files (*)")
             if not configPath:
                 self.log("💬 请先选择配置文件！")
-                return
+                return None
 
         self.log("💬 正在读取配置文件……")
-        userdata_save_path = self.get_userdata_save_path(configPath)
-        if userdata_save_path:
-            file_path = Path(os.path.join(userdata_save_path, selected_data))
-            emoji_path = file_path / "nt_qq" / "nt_data" / "Emoji" / "personal_emoji" / "Ori"
-            display_name = self.get_display_name(selected_data)
-            safe_name = self.sanitize_filename(display_name)
-            output_dir = f"{self.savePath}/{safe_name}_提取的表情"
-            
-            self.log(f"✅ 复制表情包文件到: {output_dir}")
-            self.copy_directory_with_progress(str(emoji_path), output_dir)
-            self.log("✅ 复制完成！开始重命名文件")
-            self.batch_correct_extensions(output_dir)
-            self.log("✅ 完成！正在打开输出文件夹……")
-            try:
-                subprocess.Popen(['explorer', os.path.abspath(output_dir)])
-                QtWidgets.QMessageBox.information(self, '完成', '提取成功！', QtWidgets.QMessageBox.Ok)
+        with self.export_stats.span('config'):
+            return self.get_userdata_save_path(configPath)
 
+    def get_emoji_path(self, userdata_save_path, qq_number):
+        return Path(get_emoji_dir(userdata_save_path, qq_number))
 
-            except Exception as e:
-                self.log(f"❌ 无法打开资源管理器: {e}")
-        else:
-            self.log("❌ 读取配置文件失败")
+    def get_output_dir(self, qq_number):
+        display_name = self.get_display_name(qq_number)
+        safe_name = self.sanitize_filename(display_name)
+        return f"{self.savePath}/{safe_name}_提取的表情"
+
+    def openLogFile(self, log_path):
+        try:
+            self.logSink.open_spill_file(log_path)
+            self.log(f"💬 完整日志将保存到: {log_path}")
+        except OSError as e:
+            self.log(f"❌ 无法创建日志文件: {e}")
+
+    def setExportRunning(self, running):
+        if running:
+            self._export_started = time.time()
+            self._log_flush_mark = (self.logSink.flush_seconds, self.logSink.flushed_lines)
+        self.startButton.setEnabled(not running)
+        self.exportAllButton.setEnabled(not running)
+        self.watchButton.setEnabled(not running)
+        self.cancelButton.setEnabled(running)
+        self.userComboBox.setEnabled(not running)
+        self.workersComboBox.setEnabled(not running)
+        self.outputComboBox.setEnabled(not running)
+        # 导出为压缩包时每次都会重新生成整个文件，增量导出不适用，导出方式也只能是写入压缩包
+        self.incrementalCheckBox.setEnabled(not running and self.outputComboBox.currentData() is None)
+        self.strategyComboBox.setEnabled(not running and self.outputComboBox.currentData() is None)
+        self.dedupCheckBox.setEnabled(not running)
+        self.similarCheckBox.setEnabled(not running and self.similar_available)
+        self.optimizeComboBox.setEnabled(not running and self.optimize_available and
+                                         self.outputComboBox.currentData() is None)
+        self.filterGroupBox.setEnabled(not running)
+        self.saveLogCheckBox.setEnabled(not running)
+        self.selectDirButton.setEnabled(not running)
+
+    def onOutputFormatChanged(self):
+        self.incrementalCheckBox.setEnabled(self.outputComboBox.currentData() is None)
+        self.strategyComboBox.setEnabled(self.outputComboBox.currentData() is None)
+        self.optimizeComboBox.setEnabled(self.optimize_available and self.outputComboBox.currentData() is None)
+
+    def cancelExport(self):
+        if self.exportWorker and self.exportWorker.isRunning():
+            if isinstance(self.exportWorker, WatchWorker):
+                self.log("💬 正在停止监视……")
+            else:
+                self.log("💬 正在取消导出……")
+            self.exportWorker.cancel()
+
+    def onExportProgress(self, done, total, scan_finished):
+        # 扫描未结束时总数还在增长，只显示已完成数和已发现数
+        self.progressBar.setFormat('%p%' if scan_finished else '%v / %m+')
+        self.progressBar.setMaximum(total)
+        self.progressBar.setValue(done)
+
+    def onExportLogs(self, messages):
+        for message in messages:
+            self.log(message)
+
+    def writeExportReport(self, result):
+        """把导出结果和各阶段耗时写入导出目录旁边的报告文件"""
+        self.logSink.flush()
+        stages = dict(result.get('stats', {}))
+        stages.update(self.startup_stats.to_dict())
+        stages.update(self.export_stats.to_dict())
+        flush_seconds, flushed_lines = self._log_flush_mark
+        stages['log_widget'] = {
+            'wall_s': round(self.logSink.flush_seconds - flush_seconds, 4),
+            'lines': self.logSink.flushed_lines - flushed_lines,
+        }
+        report = instrumentation.build_report(result, stages, self._export_started, time.time(),
+                                              version=VERSION, profile=result.get('profile'),
+                                              optimize=result.get('optimize'), filter=result.get('filter'))
+        path = instrumentation.report_path(result['report_base'])
+        try:
+            instrumentation.write_report(report, path)
+            self.log(f"💬 导出报告已保存到: {path}")
+        except OSError as e:
+            self.log(f"❌ 保存导出报告失败: {e}")
+
+    def onExportFinished(self, result):
+        self.writeExportReport(result)
+        self.setExportRunning(False)
+        self.exportWorker = None
+        if result['cancelled']:
+            self.logSink.close_spill_file()
+            return
+        if result['errors']:
+            self.log(f"❌ 有 {len(result['errors'])} 个文件处理失败")
+        self.log("✅ 完成！正在打开输出文件夹……")
+        self.logSink.flush()
+        self.logSink.close_spill_file()
+        try:
+            output_path = os.path.abspath(result['output_dir'])
+            if os.path.isfile(output_path):
+                # 导出为压缩包时打开所在文件夹并选中该文件
+                subprocess.Popen(['explorer', '/select,', output_path])
+            else:
+                subprocess.Popen(['explorer', output_path])
+            QtWidgets.QMessageBox.information(self, '完成', '提取成功！', QtWidgets.QMessageBox.Ok)
+
+
+        except Exception as e:
+            self.log(f"❌ 无法打开资源管理器: {e}")
+
+    def onBatchExportFinished(self, summary):
+        self.setExportRunning(False)
+        self.exportWorker = None
+        total = summary['total']
+        self.log(f"✅ 批量导出结束：共 {len(summary['accounts'])} 个账号，复制 {total['copied']} 个文件，"
+                 f"跳过 {total['skipped']} 个，按条件排除 {total['filtered']} 个，合并重复 {total['duplicates']} 个，失败 {total['errors']} 个")
+        self.log(f"💬 结果汇总已保存到: {summary['summary_path']}")
+        self.logSink.flush()
+        self.logSink.close_spill_file()
+        if summary['cancelled']:
+            return
+        try:
+            subprocess.Popen(['explorer', os.path.abspath(self.savePath)])
+            QtWidgets.QMessageBox.information(self, '完成', '批量提取完成！', QtWidgets.QMessageBox.Ok)
+        except Exception as e:
+            self.log(f"❌ 无法打开资源管理器: {e}")
+
+    def closeEvent(self, event):
+        # 关闭窗口时先停止后台导出，避免线程在窗口销毁后继续运行
+        if self.exportWorker and self.exportWorker.isRunning():
+            self.exportWorker.cancel()
+            self.exportWorker.wait()
+        if self.nicknameWorker and self.nicknameWorker.isRunning():
+            self.nicknameWorker.wait()
+        if self.accountIndexWorker and self.accountIndexWorker.isRunning():
+            self.accountIndexWorker.requestInterruption()
+            self.accountIndexWorker.wait()
+        if self.nickname_cache is not None:
+            self.save_nickname_cache()
+        self.logSink.flush()
+        self.logSink.close_spill_file()
+        super().closeEvent(event)
 
     def get_userdata_save_path(self, ini_file_path):
         # 优先使用缓存的目录
         if self.userdata_save_path_cache:
             return self.userdata_save_path_cache
             
-        config = configparser.ConfigParser()
-        target_string = '[UserDataSet]'
         userdata_save_path = None
         
         try:
             self.log(f"💬 开始检测QQ配置文件编码类型……")
-            encode = self.read_file_with_correct_encoding(ini_file_path, target_string)
-            if encode:
-                config.read(ini_file_path, encoding=encode)
-                if 'UserDataSet' in config:
-                    userdata_save_path = config.get('UserDataSet', 'UserDataSavePath', fallback=None)
+            userdata_save_path, encoding, cached = read_user_data_save_path(ini_file_path, get_encoding_cache())
+            if not encoding:
+                self.log("❌ 解码失败，未找到匹配编码。请联系开发者或者查看常见问题指南")
+            elif cached:
+                self.log(f"✅ 配置文件未变化，使用上次检测到的编码类型: {encoding}")
+            else:
+                self.log(f"✅ 成功解码！ | 检测到的编码类型为: {encoding.ljust(12)}")
         except UnicodeDecodeError:
+            # 缓存的编码已在读取时清除，下次重新检测
             self.log(f"❌ 解码QQ配置文件出错！")
         except FileNotFoundError:
             self.log(f"❌ 配置文件不存在！")
+        except OSError as e:
+            self.log(f"❌ 文件读取失败: {e}")
         except configparser.Error as e:
             self.log(f"❌ 配置文件解析错误: {e}")
         
@@ -435,174 +1406,13 @@ class QQNTEmojiExporter(QtWidgets.QWidget):
 
     def get_numeric_subdirectories(self, parent_dir):
         try:
-            subdirs = [name for name in os.listdir(parent_dir) if os.path.isdir(os.path.join(parent_dir, name))]
-            numeric_subdirs = [name for name in subdirs if name.isdigit()]
-            return numeric_subdirs
-        except FileNotFoundError:
-            return []
+            return list_accounts(parent_dir)
         except Exception as e:
             self.log(f"❌ 获取子目录时出错: {e}")
             return []
 
-    def copy_directory_with_progress(self, src, dst):
-        try:
-            if not os.path.exists(src):
-                self.log(f"❌ 源目录不存在: {src}")
-                return
-
-            if not os.path.exists(dst):
-                os.makedirs(dst)
-
-            total_files = sum(len(files) for _, _, files in os.walk(src))
-            self.progressBar.setMaximum(total_files)
-
-            file_count = 0
-            for root, dirs, files in os.walk(src):
-                rel_path = os.path.relpath(root, src)
-                dest_path = os.path.join(dst, rel_path)
-                if not os.path.exists(dest_path):
-                    os.makedirs(dest_path)
-
-                for file in files:
-                    src_file = os.path.join(root, file)
-                    dest_file = os.path.join(dest_path, file)
-                    shutil.copy2(src_file, dest_file)
-                    file_count += 1
-                    self.progressBar.setValue(file_count)
-                    self.log(f"复制文件: {src_file} 到 {dest_file}")
-                    QtCore.QCoreApplication.processEvents()  # 更新进度条显示
-            self.log("✅ 复制目录完成")
-        except Exception as e:
-            self.log(f"❌ 复制目录时出错: {e}")
-
     def log(self, message):
-        self.logTextEdit.append(message)
-        # 同时更新状态标签
-        self.statusLabel.setText(message)
-        # 自动滚动到底部
-        scrollbar = self.logTextEdit.verticalScrollBar()
-        scrollbar.setValue(scrollbar.maximum())
-        self.logTextEdit.ensureCursorVisible()
-
-    def is_content_valid(self, content, min_chinese=1):
-        # 验证内容是否包含至少一个中文字符（避免误判为拉丁编码）
-        chinese_chars = sum('\u4e000' <= char <= '\u9fff' for char in content)
-        return chinese_chars >= min_chinese
-
-    def read_file_with_correct_encoding(self, file_path, target_string):
-        try:
-            with open(file_path, 'rb') as f:
-                data = f.read()
-        except Exception as e:
-            self.log(f"❌ 文件读取失败: {e}")
-            return False
-
-        # ------------------------- 编码检测优化 -------------------------
-        # 1. 优先尝试中文相关编码（GB18030覆盖GBK，兼容性更好）
-        priority_encodings = ['gb18030', 'utf-8', 'utf-16', 'ascii']
-        
-        # 2. 使用cchardet检测（比chardet更快更准）
-        try:
-            detected = chardet.detect(data)
-            if detected['encoding']:
-                # 如果检测到的是非中文编码且置信度低，将其后置
-                if detected['confidence'] < 0.7 or detected['encoding'].lower() not in ['gb18030', 'gbk', 'utf-8']:
-                    priority_encodings.append(detected['encoding'])
-                else:
-                    priority_encodings.insert(0, detected['encoding'])  # 高置信度中文编码前置
-        except:
-            pass
-        
-        # 3. 补充其他可能编码并去重
-        encodings = priority_encodings + [
-            'gbk', 'big5', 'utf-16-le', 'utf-16-be', 'shift_jis',
-            'iso-8859-1', 'latin-1', 'cp936', 'cp950', 'utf-7'
-        ]
-        seen = set()
-        ordered_encodings = []
-        for enc in encodings:
-            enc_lower = enc.lower()
-            if enc_lower not in seen:
-                seen.add(enc_lower)
-                ordered_encodings.append(enc)
-        
-        # ------------------------- 解码验证优化 -------------------------
-        for enc in ordered_encodings:
-            try:
-                content = data.decode(enc, errors='strict')  # 严格模式避免静默错误
-            except (UnicodeDecodeError, LookupError):
-                continue
-            # 改进验证：检查目标字符串且无异常字符（如乱码）
-            if target_string in content and self.is_content_valid(content):
-                self.log(f"✅ 成功解码！ | 检测到的编码类型为: {enc.ljust(12)}")
-                return enc.ljust(12)
-        self.log("❌ 解码失败，未找到匹配编码。请联系开发者或者查看常见问题指南")
-        return None
-
-    FILE_SIGNATURES = {
-        'jpg': (b'\xff\xd8\xff', b'\xff\xd8\xff\xe0', b'\xff\xd8\xff\xe1'),
-        'png': (b'\x89PNG\r\n\x1a\n',),
-        'gif': (b'GIF87a', b'GIF89a'),
-        'bmp': (b'BM',),
-        'tiff': (b'II*\x00', b'MM\x00*'),
-        'webp': (b'RIFF', b'WEBP'),
-        'ico': (b'\x00\x00\x01\x00', b'\x00\x00\x02\x00'),
-        'psd': (b'8BPS',),
-        'svg': (b'<?xml', b'<svg'),
-        'heic': (b'ftypheic', b'ftypheix', b'ftyphevc', b'ftyphevx'),
-        'avif': (b'ftypavif', b'ftypavis'),
-    }
-
-    MIME_MAPPING = {
-        'jpg': 'image/jpeg',
-        'png': 'image/png',
-        'gif': 'image/gif',
-        'bmp': 'image/bmp',
-        'tiff': 'image/tiff',
-        'webp': 'image/webp',
-        'ico': 'image/x-icon',
-        'psd': 'image/vnd.adobe.photoshop',
-        'svg': 'image/svg+xml',
-        'heic': 'image/heic',
-        'avif': 'image/avif',
-    }
-
-    def get_actual_extension(self, file_path):
-        with open(file_path, 'rb') as f:
-            header = f.read(16)
-
-        for ext, signatures in self.FILE_SIGNATURES.items():
-            for sig in signatures:
-                if header.startswith(sig):
-                    return ext
-        return None
-
-    def get_recommended_extension(self, file_path):
-        mime_type, _ = mimetypes.guess_type(file_path)
-        if mime_type:
-            for ext, mt in self.MIME_MAPPING.items():
-                if mt == mime_type:
-                    return ext
-        return None
-
-    def correct_file_extension(self, file_path):
-        actual_ext = self.get_actual_extension(file_path)
-        if not actual_ext:
-            return
-
-        recommended_ext = self.get_recommended_extension(file_path)
-        if recommended_ext:
-            if actual_ext.lower() != recommended_ext.lower():
-                base_name, _ = os.path.splitext(file_path)
-                new_file_path = f"{base_name}.{actual_ext}"
-                if os.path.exists(new_file_path):
-                    return
-                try:
-                    os.rename(file_path, new_file_path)
-                    self.log(f"💬 重命名文件: {file_path} 为 {new_file_path}")
-                except Exception as e:
-                    self.log(f"❌ 重命名文件时出错: {e}")
-                    return
+        self.logSink.write(message)
 
     def showHelp(self):
         """显示帮助信息"""
@@ -621,19 +1431,24 @@ class QQNTEmojiExporter(QtWidgets.QWidget):
             help_text,
             QtWidgets.QMessageBox.Ok
         )
-    
-    def batch_correct_extensions(self, directory):
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                file_path = os.path.join(root, file)
-                mime_type, _ = mimetypes.guess_type(file_path)
-                if mime_type and mime_type.startswith('image/'):
-                    self.correct_file_extension(file_path)
+
+def report_startup_time():
+    """输出从启动到首次绘制窗口的耗时并退出，用于统计启动速度（见 bench_startup.py）"""
+    elapsed_ms = (time.perf_counter() - _START_TIME) * 1000
+    print(json.dumps({'time_to_first_paint_ms': round(elapsed_ms, 2)}), flush=True)
+    QtWidgets.QApplication.instance().quit()
+
 
 def main():
+    # 打包后的程序用进程池处理图片时，子进程需要由这里接管
+    multiprocessing.freeze_support()
     app = QtWidgets.QApplication(sys.argv)
     ex = QQNTEmojiExporter()
     app.setWindowIcon(QIcon(os.path.join(icon, "icon.ico")))
+    if os.environ.get('QQ_EMOJI_STARTUP_BENCH'):
+        # 只测量启动速度，不读取配置文件
+        ex.firstPainted.disconnect()
+        ex.firstPainted.connect(report_startup_time)
     ex.show()
     sys.exit(app.exec_())
 
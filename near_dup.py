@@ -0,0 +1,230 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+import os
+import json
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+# 能用 Pillow 打开的图片扩展名
+IMAGE_EXTENSIONS = frozenset(('jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'tiff', 'ico'))
+
+HASH_METHODS = ('dhash', 'phash')
+
+
+def is_available():
+    """是否安装了相似图片检测所需的 numpy 和 Pillow（只检查，不导入）"""
+    return all(importlib.util.find_spec(name) is not None for name in ('numpy', 'PIL'))
+
+
+class _DisjointSet:
+    def __init__(self):
+        self._parent = {}
+
+    def find(self, item):
+        parent = self._parent.setdefault(item, item)
+        root = item
+        while parent != root:
+            root = parent
+            parent = self._parent[root]
+        # 路径压缩
+        while item != root:
+            self._parent[item], item = root, self._parent[item]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self._parent[root_b] = root_a
+
+
+class NearDuplicateFinder:
+    """查找看起来相同的表情（重新编码、缩放过的同一张图）
+
+    用 Pillow 多线程解码并缩小图片，按批用 NumPy 计算 64 位感知哈希（dHash 或 pHash），
+    再用分段索引查找汉明距离不超过 threshold 的哈希值，用并查集把它们合并成相似组。
+    需要安装 numpy 和 Pillow，二者只在真正使用时才导入。
+    """
+
+    DEFAULT_THRESHOLD = 6
+    BATCH_SIZE = 512
+    # 分桶比较时每次最多比较的哈希值对数
+    COMPARE_BLOCK = 1 << 20
+    MAX_WORKERS = 8
+
+    def __init__(self, method='dhash', threshold=DEFAULT_THRESHOLD, max_workers=MAX_WORKERS,
+                 on_log=None, on_progress=None, is_cancelled=None):
+        # on_progress(done, total) 在计算哈希时调用；is_cancelled() 返回 True 时尽快结束
+        if method not in HASH_METHODS:
+            raise ValueError(f"不支持的哈希算法: {method}")
+        import numpy
+        from PIL import Image
+
+        self._np = numpy
+        self._image = Image
+        self.method = method
+        self.threshold = threshold
+        self.max_workers = max_workers
+        self.on_log = on_log
+        self.on_progress = on_progress
+        self.is_cancelled = is_cancelled or (lambda: False)
+        # dHash 比较相邻像素，需要多一列；pHash 先做 32x32 的 DCT 再取低频部分
+        self._sample_size = (9, 8) if method == 'dhash' else (32, 32)
+        self._dct_matrix = self._build_dct_matrix(32) if method == 'phash' else None
+        # 每个字节中 1 的个数，用于批量计算汉明距离
+        self._popcount_table = numpy.array([bin(i).count('1') for i in range(256)], dtype=numpy.uint8)
+
+    def log(self, message):
+        if self.on_log:
+            self.on_log(message)
+
+    def list_images(self, directory):
+        paths = []
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if os.path.splitext(name)[1][1:].lower() in IMAGE_EXTENSIONS:
+                    paths.append(os.path.join(root, name))
+        return paths
+
+    def hash_files(self, paths):
+        """计算每个文件的感知哈希，返回 {路径: 哈希值}，无法解码的文件会被跳过"""
+        np = self._np
+        hashes = {}
+        total = len(paths)
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='emoji-phash') as executor:
+            for start in range(0, total, self.BATCH_SIZE):
+                if self.is_cancelled():
+                    break
+                batch = paths[start:start + self.BATCH_SIZE]
+                pixels = list(executor.map(self._load_pixels, batch))
+                loaded = [(path, array) for path, array in zip(batch, pixels) if array is not None]
+                if loaded:
+                    values = self._hash_batch(np.stack([array for _, array in loaded]))
+                    hashes.update(zip((path for path, _ in loaded), values))
+                if self.on_progress:
+                    self.on_progress(min(start + len(batch), total), total)
+        return hashes
+
+    def _load_pixels(self, path):
+        Image = self._image
+        try:
+            with Image.open(path) as image:
+                # JPEG 可以在解码时直接缩小，大图能快很多；动图只取第一帧
+                image.draft('L', (self._sample_size[0] * 4, self._sample_size[1] * 4))
+                image = image.convert('L').resize(self._sample_size, Image.BILINEAR)
+                return self._np.asarray(image, dtype=self._np.uint8)
+        except Exception:
+            return None
+
+    def _hash_batch(self, pixels):
+        """pixels: (N, 高, 宽) 的灰度图数组，返回 N 个 64 位整数哈希"""
+        np = self._np
+        if self.method == 'dhash':
+            bits = pixels[:, :, 1:] > pixels[:, :, :-1]
+        else:
+            dct = self._dct_matrix
+            coefficients = dct @ pixels.astype(np.float32) @ dct.T
+            low = coefficients[:, :8, :8].reshape(len(pixels), 64)
+            bits = low > np.median(low[:, 1:], axis=1, keepdims=True)
+        packed = np.packbits(bits.reshape(len(pixels), 64), axis=1)
+        return [int(value) for value in packed.view('>u8').ravel()]
+
+    def _build_dct_matrix(self, size):
+        np = self._np
+        n = np.arange(size)
+        matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size)) * np.sqrt(2 / size)
+        matrix[0] /= np.sqrt(2)
+        return matrix.astype(np.float32)
+
+    def find_clusters(self, hashes):
+        """把哈希值相近的文件分组，返回 [[路径, ...], ...]，只包含两个及以上文件的组，大组在前"""
+        # 哈希完全相同的文件先合并，每个不同的哈希值只参与一次比较
+        by_hash = {}
+        for path, value in hashes.items():
+            by_hash.setdefault(value, []).append(path)
+        values = list(by_hash)
+
+        groups = _DisjointSet()
+        for i, j in self._similar_pairs(values):
+            groups.union(values[i], values[j])
+
+        clusters = {}
+        for value, paths in by_hash.items():
+            clusters.setdefault(groups.find(value), []).extend(paths)
+        result = [sorted(paths) for paths in clusters.values() if len(paths) > 1]
+        result.sort(key=lambda paths: (-len(paths), paths[0]))
+        return result
+
+    def _similar_pairs(self, values):
+        """找出汉明距离不超过 threshold 的所有哈希值下标对
+
+        把 64 位哈希分成 threshold + 1 段，距离不超过 threshold 的两个哈希值至少有一段完全相同
+        （抽屉原理）。每一段按取值分桶，只比较同一个桶里的哈希值，比较本身用 NumPy 批量完成。
+        """
+        np = self._np
+        if len(values) < 2:
+            return set()
+        array = np.array(values, dtype=np.uint64)
+        segments = min(self.threshold + 1, 64)
+        bounds = [64 * k // segments for k in range(segments + 1)]
+        pairs = set()
+        for low, high in zip(bounds, bounds[1:]):
+            if self.is_cancelled():
+                break
+            keys = (array >> np.uint64(low)) & np.uint64((1 << (high - low)) - 1)
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            ends = np.r_[starts[1:], len(order)]
+            for start, end in zip(starts, ends):
+                if end - start > 1:
+                    pairs.update(self._compare_bucket(array, order[start:end]))
+        return pairs
+
+    def _popcount(self, array):
+        """逐元素统计 uint64 数组中 1 的个数"""
+        array = self._np.ascontiguousarray(array)
+        return self._popcount_table[array.view(self._np.uint8)].reshape(array.shape + (8,)).sum(axis=-1)
+
+    def _compare_bucket(self, array, members):
+        np = self._np
+        # 分块比较，避免大桶一次生成过大的矩阵
+        block = max(1, self.COMPARE_BLOCK // len(members))
+        for start in range(0, len(members), block):
+            rows = members[start:start + block]
+            distances = self._popcount(array[rows][:, None] ^ array[members][None, :])
+            row_index, column_index = np.nonzero(distances <= self.threshold)
+            for i, j in zip(rows[row_index].tolist(), members[column_index].tolist()):
+                if i < j:
+                    yield i, j
+
+    def run(self, directory):
+        """分析 directory 中的所有图片，返回报告"""
+        paths = self.list_images(directory)
+        self.log(f"💬 正在计算 {len(paths)} 张图片的感知哈希……")
+        hashes = self.hash_files(paths)
+        clusters = self.find_clusters(hashes) if not self.is_cancelled() else []
+        report = {
+            'directory': directory,
+            'method': self.method,
+            'threshold': self.threshold,
+            'images': len(paths),
+            'unreadable': len(paths) - len(hashes),
+            'clusters': [[os.path.relpath(path, directory).replace(os.sep, '/') for path in cluster]
+                         for cluster in clusters],
+        }
+        similar = sum(len(cluster) for cluster in clusters)
+        self.log(f"✅ 找到 {len(clusters)} 组相似表情，共 {similar} 张图片")
+        return report
+
+    @staticmethod
+    def report_path(dst):
+        return f"{dst}_相似表情.json"
+
+    @staticmethod
+    def write_report(report, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
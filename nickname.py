@@ -0,0 +1,203 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+NICKNAME_API_URL = "https://uapis.cn/api/v1/social/qq/userinfo"
+
+
+class NicknameResolver:
+    """并发查询QQ昵称
+
+    所有请求共用一个带连接池的会话，连接和读取都有超时，
+    网络很慢或者连不上时也能在几秒内返回。
+    """
+
+    CONNECT_TIMEOUT = 3
+    READ_TIMEOUT = 5
+    MAX_WORKERS = 8
+
+    def __init__(self, api_url=NICKNAME_API_URL, max_workers=MAX_WORKERS,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+        # requests 导入较慢，只有真正需要联网查询时才导入
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.api_url = api_url
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, qq_number):
+        """查询单个QQ号的昵称，失败时返回空字符串"""
+        import requests
+
+        try:
+            response = self.session.get(self.api_url, params={'qq': qq_number}, timeout=self.timeout)
+            if response.status_code == 200:
+                return response.json().get('nickname') or ''
+        except (requests.RequestException, ValueError, AttributeError):
+            pass
+        return ''
+
+    def resolve_many(self, qq_numbers):
+        """并发查询多个QQ号，按完成顺序逐个产出 (QQ号, 昵称)"""
+        qq_numbers = list(qq_numbers)
+        if not qq_numbers:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(qq_numbers)),
+                                thread_name_prefix='nickname') as executor:
+            futures = {executor.submit(self.fetch, qq): qq for qq in qq_numbers}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def close(self):
+        self.session.close()
+
+
+class NicknameCache:
+    """昵称缓存
+
+    只在第一次使用时读取一次缓存文件，之后都在内存中查询，每条记录单独过期。
+    新查到的昵称先记在内存里，flush() 时与磁盘上的最新内容合并后一次性写入：
+    先写临时文件再替换，并用锁文件避免多个程序同时写入时互相覆盖。
+    """
+
+    DEFAULT_TTL = 3600  # 1小时后过期
+    LOCK_TIMEOUT = 2
+    STALE_LOCK_AGE = 10
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._entries = None
+        self._dirty = {}
+        self._lock = threading.Lock()
+
+    def _read_file(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _ensure_loaded(self):
+        if self._entries is None:
+            self._entries = self._read_file()
+
+    def get(self, qq_number, now=None):
+        """返回未过期的昵称，没有或已过期时返回 None"""
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(qq_number)
+        now = int(time.time()) if now is None else now
+        if isinstance(entry, dict) and entry.get('name') and \
+           entry.get('username_expire_time', 0) > now:
+            return entry['name']
+        return None
+
+    def get_name(self, qq_number):
+        """返回缓存中的昵称，即使已经过期（仅用于显示）"""
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(qq_number)
+        if isinstance(entry, dict):
+            return entry.get('name') or None
+        return None
+
+    def set(self, qq_number, name, now=None):
+        now = int(time.time()) if now is None else now
+        entry = {'name': name, 'username_expire_time': now + self.ttl}
+        with self._lock:
+            self._ensure_loaded()
+            self._entries[qq_number] = entry
+            self._dirty[qq_number] = entry
+
+    def flush(self):
+        """把尚未保存的记录写入缓存文件"""
+        with self._lock:
+            if not self._dirty:
+                return
+            dirty = self._dirty
+            self._dirty = {}
+
+        with self._file_lock():
+            # 合并其他程序实例在此期间写入的内容，同一QQ号保留过期时间较晚的记录
+            merged = self._read_file()
+            for qq_number, entry in dirty.items():
+                existing = merged.get(qq_number)
+                if not isinstance(existing, dict) or \
+                   existing.get('username_expire_time', 0) <= entry['username_expire_time']:
+                    merged[qq_number] = entry
+
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(merged, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                # 写入失败时放回待保存列表，下次再试
+                with self._lock:
+                    for qq_number, entry in dirty.items():
+                        self._dirty.setdefault(qq_number, entry)
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+
+        with self._lock:
+            for qq_number, entry in merged.items():
+                if qq_number not in self._dirty:
+                    self._entries[qq_number] = entry
+
+    def _file_lock(self):
+        return _LockFile(f"{self.path}.lock", self.LOCK_TIMEOUT, self.STALE_LOCK_AGE)
+
+
+class _LockFile:
+    """基于独占创建文件的简单跨进程锁，超时后放弃加锁直接写入（写入本身仍是原子的）"""
+
+    def __init__(self, path, timeout, stale_age):
+        self.path = path
+        self.timeout = timeout
+        self.stale_age = stale_age
+        self._acquired = False
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                self._acquired = True
+                return self
+            except FileExistsError:
+                try:
+                    # 程序异常退出可能留下锁文件，超过一定时间视为失效
+                    if time.time() - os.path.getmtime(self.path) > self.stale_age:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    pass
+            except OSError:
+                return self
+            if time.monotonic() >= deadline:
+                return self
+            time.sleep(0.05)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._acquired:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        return False
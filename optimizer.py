@@ -0,0 +1,272 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+import io
+import os
+import json
+import hashlib
+import importlib.util
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# 处理方式 -> 说明
+OPTIMIZE_MODES = {
+    'lossless': '无损压缩 PNG/GIF/BMP',
+    'webp': '静态图片转换为 WebP',
+    'png': '静态图片转换为 PNG',
+}
+
+# 各处理方式会处理的扩展名。JPEG 和 WebP 重新编码总会有损失，无损压缩时不处理
+MODE_EXTENSIONS = {
+    'lossless': frozenset(('png', 'gif', 'bmp')),
+    'webp': frozenset(('png', 'gif', 'bmp', 'jpg', 'jpeg')),
+    'png': frozenset(('gif', 'bmp', 'jpg', 'jpeg', 'webp', 'png')),
+}
+
+# 转换为 WebP 时 JPEG 来源使用有损编码的质量，其余来源使用无损编码
+DEFAULT_WEBP_QUALITY = 90
+
+
+def is_available():
+    """是否安装了图片优化所需的 Pillow（只检查，不导入）"""
+    return importlib.util.find_spec('PIL') is not None
+
+
+def content_hash(data):
+    # 与表情目录、缩略图缓存使用相同的内容哈希
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _save_params(image, mode, quality):
+    """返回 (保存格式, 扩展名, 参数)，不需要处理时返回 None"""
+    source = image.format
+    if mode == 'lossless':
+        if source == 'PNG':
+            return 'PNG', 'png', {'optimize': True}
+        if source == 'GIF':
+            return 'GIF', 'gif', {'optimize': True}
+        if source == 'BMP':
+            return 'PNG', 'png', {'optimize': True}
+        return None
+    if mode == 'webp':
+        if source == 'WEBP':
+            return None
+        # 使用默认的压缩强度，最高强度体积只小几个百分点，耗时却要多好几倍
+        if source == 'JPEG':
+            return 'WEBP', 'webp', {'quality': quality}
+        return 'WEBP', 'webp', {'lossless': True}
+    if mode == 'png':
+        return 'PNG', 'png', {'optimize': True}
+    return None
+
+
+def _convert_mode(image, save_format):
+    if save_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        return image.convert('RGBA' if has_alpha else 'RGB')
+    return image
+
+
+def optimize_file(path, mode, quality=DEFAULT_WEBP_QUALITY):
+    """在子进程中处理单个图片，返回 (状态, 新路径, 原大小, 新大小, 新内容哈希或错误信息)
+
+    状态为 optimized（已替换为更小或转换后的文件）、unchanged（处理后没有变小，保留原文件）、
+    animated（动图，保持原样）、unsupported（无需处理）、exists（转换后的文件名已被占用）或 error。
+    新文件先写入临时文件再替换，导出方式为硬链接或符号链接时也不会改动QQ中的原图。
+    """
+    from PIL import Image
+
+    try:
+        old_size = os.path.getsize(path)
+        with Image.open(path) as image:
+            if getattr(image, 'n_frames', 1) > 1:
+                return 'animated', path, old_size, old_size, None
+            params = _save_params(image, mode, quality)
+            if params is None:
+                return 'unsupported', path, old_size, old_size, None
+            save_format, ext, options = params
+            image.load()
+            buffer = io.BytesIO()
+            _convert_mode(image, save_format).save(buffer, save_format, **options)
+        data = buffer.getvalue()
+
+        base, old_ext = os.path.splitext(path)
+        new_path = path if old_ext[1:].lower() == ext else f"{base}.{ext}"
+        if new_path == path and len(data) >= old_size:
+            # 格式不变时只保留更小的结果
+            return 'unchanged', path, old_size, old_size, None
+        if new_path != path and os.path.lexists(new_path):
+            return 'exists', path, old_size, old_size, None
+
+        tmp_path = f"{new_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, new_path)
+        if new_path != path:
+            os.remove(path)
+        return 'optimized', new_path, old_size, len(data), content_hash(data)
+    except Exception as e:
+        return 'error', path, 0, 0, str(e)
+
+
+class ImageOptimizer:
+    """导出完成后在进程池中压缩或转换导出的图片
+
+    图片编码是 CPU 密集的工作，用多个进程才能同时利用多个核心。
+    处理过的文件（以及处理后没有变小的文件）的内容哈希保存在导出目录旁边的记录中，
+    再次运行时内容没有变化的文件直接跳过。动图保持原样。需要安装 Pillow，只在子进程中导入。
+    """
+
+    RECORD_VERSION = 1
+
+    def __init__(self, mode='lossless', quality=DEFAULT_WEBP_QUALITY, max_workers=None,
+                 on_log=None, on_progress=None, is_cancelled=None):
+        # on_progress(done, total) 每处理完一个文件调用一次；is_cancelled() 返回 True 时尽快结束
+        if mode not in OPTIMIZE_MODES:
+            raise ValueError(f"不支持的处理方式: {mode}")
+        self.mode = mode
+        self.quality = quality
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.on_log = on_log
+        self.on_progress = on_progress
+        self.is_cancelled = is_cancelled or (lambda: False)
+
+    def log(self, message):
+        if self.on_log:
+            self.on_log(message)
+
+    @staticmethod
+    def record_path(dst):
+        return f"{dst}_图片优化记录.json"
+
+    def _settings(self):
+        return {'mode': self.mode, 'quality': self.quality}
+
+    def load_processed(self, path):
+        """返回已处理过的内容哈希集合，处理方式不同时之前的记录不再适用"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if data.get('version') != self.RECORD_VERSION or data.get('settings') != self._settings():
+            return set()
+        return set(data.get('hashes', ()))
+
+    def save_processed(self, path, hashes):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.RECORD_VERSION, 'settings': self._settings(), 'hashes': sorted(hashes)}, f)
+        os.replace(tmp_path, path)
+
+    def list_images(self, directory):
+        extensions = MODE_EXTENSIONS[self.mode]
+        paths = []
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if os.path.splitext(name)[1][1:].lower() in extensions:
+                    paths.append(os.path.join(root, name))
+        paths.sort()
+        return paths
+
+    def run(self, directory, record_path):
+        """处理 directory 中的图片，返回报告
+
+        其中 renamed 为转换了格式的文件 {原相对路径: 新相对路径}，
+        rewritten 为内容被替换的文件 {新相对路径: (新内容哈希, 新大小)}。
+        """
+        paths = self.list_images(directory)
+        processed = self.load_processed(record_path)
+        report = {
+            'mode': self.mode,
+            'images': len(paths),
+            'optimized': 0,
+            'skipped': 0,
+            'unchanged': 0,
+            'animated': 0,
+            'errors': [],
+            'bytes_before': 0,
+            'bytes_after': 0,
+            'renamed': {},
+            'rewritten': {},
+        }
+        self.log(f"💬 正在用 {self.max_workers} 个进程处理 {len(paths)} 张图片（{OPTIMIZE_MODES[self.mode]}）……")
+
+        in_flight = deque()
+        done = 0
+        executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        try:
+            for path in paths:
+                if self.is_cancelled():
+                    break
+                try:
+                    with open(path, 'rb') as f:
+                        digest = content_hash(f.read())
+                except OSError as e:
+                    report['errors'].append((path, str(e)))
+                    done += 1
+                    continue
+                if digest in processed:
+                    report['skipped'] += 1
+                    done += 1
+                    continue
+                # 限制同时提交的任务数，避免一次性为所有文件创建任务
+                while len(in_flight) >= self.max_workers * 4:
+                    done += 1
+                    self._finish(in_flight.popleft(), directory, processed, report)
+                    self._progress(done, len(paths))
+                in_flight.append((path, digest, executor.submit(optimize_file, path, self.mode, self.quality)))
+            while in_flight:
+                task = in_flight.popleft()
+                # 取消时丢弃还没开始的任务，已经开始的任务可能已替换了文件，仍需记录结果
+                if self.is_cancelled() and task[2].cancel():
+                    continue
+                done += 1
+                self._finish(task, directory, processed, report)
+                self._progress(done, len(paths))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            try:
+                self.save_processed(record_path, processed)
+            except OSError as e:
+                self.log(f"❌ 保存图片优化记录失败: {e}")
+
+        report['saved'] = report['bytes_before'] - report['bytes_after']
+        self.log(f"✅ 图片处理完成：处理 {report['optimized']} 个，跳过已处理的 {report['skipped']} 个，"
+                 f"无法变小 {report['unchanged']} 个，动图 {report['animated']} 个，"
+                 f"共节省 {report['saved'] / 1024 / 1024:.2f} MB")
+        return report
+
+    def _progress(self, done, total):
+        if self.on_progress:
+            self.on_progress(done, total)
+
+    def _finish(self, task, directory, processed, report):
+        path, digest, future = task
+        try:
+            status, new_path, old_size, new_size, extra = future.result()
+        except Exception as e:
+            status, extra = 'error', str(e)
+        if status == 'error':
+            report['errors'].append((path, extra))
+            self.log(f"❌ 处理图片 {path} 时出错: {extra}")
+            return
+        if status == 'optimized':
+            report['optimized'] += 1
+            report['bytes_before'] += old_size
+            report['bytes_after'] += new_size
+            processed.add(extra)
+            new_rel = os.path.relpath(new_path, directory).replace(os.sep, '/')
+            report['rewritten'][new_rel] = (extra, new_size)
+            if new_path != path:
+                report['renamed'][os.path.relpath(path, directory).replace(os.sep, '/')] = new_rel
+            return
+        if status == 'exists':
+            # 占用文件名的文件以后可能被删除，不记录，下次再尝试转换
+            self.log(f"💬 转换后的文件名已被占用，保留原图: {path}")
+            return
+        if status in ('unchanged', 'animated'):
+            report[status] += 1
+            # 没有改动的文件也记下来，下次不必再处理
+            processed.add(digest)
@@ -0,0 +1,337 @@
+# coding=utf-8
+# @Author：香草味的纳西妲
+# Email：nahida1027@126.com
+
+import os
+import json
+import codecs
+import configparser
+
+APP_DATA_DIR_NAME = 'QQ表情包批量提取工具数据目录'
+
+# QQNT 记录聊天数据保存位置的配置文件
+DEFAULT_INI_PATH = r'C:\Users\Public\Documents\Tencent\QQ\UserDataInfo.ini'
+INI_SECTION = 'UserDataSet'
+
+# 收藏表情原图相对于账号目录的位置
+EMOJI_SUBPATH = os.path.join('nt_qq', 'nt_data', 'Emoji', 'personal_emoji', 'Ori')
+
+# 带 BOM 的文件直接按 BOM 确定编码，UTF-32 的 BOM 以 UTF-16 的 BOM 开头，需要先判断
+BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# 没有 BOM 时优先尝试的编码。UTF-8 的严格解码几乎不会误判 GBK 内容，
+# 而 GB18030 能“解码”大部分 UTF-8 字节，所以 UTF-8 必须排在前面
+FAST_PATH_ENCODINGS = ('utf-8', 'gb18030')
+
+# 快速路径失败后，按原有顺序继续尝试的编码
+FALLBACK_ENCODINGS = (
+    'gb18030', 'utf-8', 'utf-16', 'ascii',
+    'gbk', 'big5', 'utf-16-le', 'utf-16-be', 'shift_jis',
+    'iso-8859-1', 'latin-1', 'cp936', 'cp950', 'utf-7',
+)
+
+
+def get_app_data_dir():
+    """返回程序数据目录（昵称缓存、编码缓存等都放在这里），不存在时自动创建"""
+    appdata_path = os.getenv('LOCALAPPDATA')
+    if not appdata_path:
+        appdata_path = os.path.join(os.getenv('USERPROFILE') or os.path.expanduser('~'), 'AppData', 'LocalLow')
+    cache_dir = os.path.join(appdata_path, APP_DATA_DIR_NAME)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def is_content_valid(content, min_chinese=1):
+    # 验证内容是否包含至少一个中文字符（避免误判为拉丁编码）
+    chinese_chars = 0
+    for char in content:
+        if '\u4e00' <= char <= '\u9fff':
+            chinese_chars += 1
+            if chinese_chars >= min_chinese:
+                return True
+    return False
+
+
+def _try_decode(data, encoding, target_string):
+    try:
+        content = data.decode(encoding, errors='strict')  # 严格模式避免静默错误
+    except (UnicodeDecodeError, LookupError):
+        return False
+    return target_string in content and is_content_valid(content)
+
+
+def detect_encoding(data, target_string):
+    """检测配置文件内容的编码，返回能正确解码且包含 target_string 的编码，找不到时返回 None
+
+    先看 BOM，再试 UTF-8 和 GB18030，只有这些都失败时才用 chardet 检测
+    """
+    for bom, encoding in BOM_ENCODINGS:
+        if data.startswith(bom):
+            if _try_decode(data, encoding, target_string):
+                return encoding
+            break
+
+    for encoding in FAST_PATH_ENCODINGS:
+        if _try_decode(data, encoding, target_string):
+            return encoding
+
+    encodings = list(FALLBACK_ENCODINGS)
+    try:
+        # chardet 导入较慢，只在快速路径失败时才导入
+        import chardet
+        detected = chardet.detect(data)
+        if detected['encoding']:
+            # 如果检测到的是非中文编码且置信度低，将其后置
+            if detected['confidence'] < 0.7 or detected['encoding'].lower() not in ['gb18030', 'gbk', 'utf-8']:
+                encodings.append(detected['encoding'])
+            else:
+                encodings.insert(0, detected['encoding'])  # 高置信度中文编码前置
+    except Exception:
+        pass
+
+    seen = set(FAST_PATH_ENCODINGS)
+    for encoding in encodings:
+        if encoding.lower() in seen:
+            continue
+        seen.add(encoding.lower())
+        if _try_decode(data, encoding, target_string):
+            return encoding
+    return None
+
+
+class EncodingCache:
+    """配置文件编码检测结果的持久化缓存
+
+    以文件路径为键，同时记录文件大小和修改时间，文件没有变化时直接使用上次的检测结果。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = None
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self._entries = data if isinstance(data, dict) else {}
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    @staticmethod
+    def _key(file_path):
+        return os.path.normcase(os.path.abspath(file_path))
+
+    def get(self, file_path, stat):
+        entry = self._load().get(self._key(file_path))
+        if isinstance(entry, dict) and \
+           entry.get('size') == stat.st_size and \
+           entry.get('mtime_ns') == stat.st_mtime_ns:
+            return entry.get('encoding')
+        return None
+
+    def set(self, file_path, stat, encoding):
+        self._load()[self._key(file_path)] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'encoding': encoding,
+        }
+        self._save()
+
+    def invalidate(self, file_path):
+        if self._load().pop(self._key(file_path), None) is not None:
+            self._save()
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # 缓存写不进去不影响使用，下次启动重新检测即可
+            pass
+
+
+def get_encoding_cache():
+    return EncodingCache(os.path.join(get_app_data_dir(), '编码检测缓存.json'))
+
+
+def detect_file_encoding(file_path, target_string, cache=None):
+    """检测文件编码，返回 (编码, 是否来自缓存)，检测失败时编码为 None
+
+    读取文件失败时抛出 OSError
+    """
+    stat = os.stat(file_path)
+    if cache is not None:
+        encoding = cache.get(file_path, stat)
+        if encoding:
+            return encoding, True
+
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    encoding = detect_encoding(data, target_string)
+    if encoding and cache is not None:
+        cache.set(file_path, stat, encoding)
+    return encoding, False
+
+
+def read_user_data_save_path(ini_file_path, cache=None):
+    """从 UserDataInfo.ini 中读取聊天数据保存位置，返回 (路径, 编码, 编码是否来自缓存)
+
+    检测不到编码时编码为 None，配置文件中没有该项时路径为 None。
+    读取失败时抛出 OSError，解码或解析失败时抛出 UnicodeDecodeError 或 configparser.Error，
+    解码失败时会清除缓存的编码，下次重新检测。
+    """
+    target_string = f'[{INI_SECTION}]'
+    encoding, cached = detect_file_encoding(ini_file_path, target_string, cache)
+    if not encoding:
+        return None, None, False
+    config = configparser.ConfigParser()
+    try:
+        config.read(ini_file_path, encoding=encoding)
+    except UnicodeDecodeError:
+        if cache is not None:
+            cache.invalidate(ini_file_path)
+        raise
+    if INI_SECTION not in config:
+        return None, encoding, cached
+    return config.get(INI_SECTION, 'UserDataSavePath', fallback=None), encoding, cached
+
+
+def list_accounts(userdata_save_path):
+    """返回聊天数据目录中所有以QQ号命名的子目录，目录不存在时返回空列表"""
+    try:
+        with os.scandir(userdata_save_path) as it:
+            return [entry.name for entry in it if entry.name.isdigit() and entry.is_dir()]
+    except FileNotFoundError:
+        return []
+
+
+def get_emoji_dir(userdata_save_path, qq_number):
+    return os.path.join(userdata_save_path, qq_number, EMOJI_SUBPATH)
+
+
+def sanitize_filename(name):
+    # Windows文件名非法字符
+    invalid_chars = '<>:"/\\|?*'
+    for char in invalid_chars:
+        name = name.replace(char, '')
+    return name.strip()
+
+
+def scan_emoji_dir(emoji_dir):
+    """统计表情目录中的文件数和总字节数，返回 (文件数, 字节数, {子目录相对路径: 修改时间})
+
+    用 os.scandir 遍历，目录项自带类型信息，判断文件还是目录不需要额外的 stat。
+    目录不存在时抛出 FileNotFoundError
+    """
+    count = 0
+    total = 0
+    dirs = {}
+    pending_dirs = [(emoji_dir, '')]
+    while pending_dirs:
+        directory, rel_dir = pending_dirs.pop()
+        dirs[rel_dir] = os.stat(directory).st_mtime_ns
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    pending_dirs.append((entry.path, f"{rel_dir}/{entry.name}" if rel_dir else entry.name))
+                elif entry.is_file():
+                    count += 1
+                    total += entry.stat().st_size
+    return count, total, dirs
+
+
+class AccountIndex:
+    """各账号收藏表情数量和大小的持久化缓存
+
+    以表情目录路径为键，同时记录目录及其子目录的修改时间。增删文件会改变所在目录的修改时间，
+    目录都没有变化时直接使用上次的统计结果，不必再遍历目录中的每个文件。
+    """
+
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = None
+        self._dirty = False
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            if not isinstance(data, dict) or data.get('version') != self.VERSION:
+                data = {}
+            self._entries = data.get('accounts', {})
+        return self._entries
+
+    @staticmethod
+    def _key(emoji_dir):
+        return os.path.normcase(os.path.abspath(emoji_dir))
+
+    @staticmethod
+    def _is_fresh(emoji_dir, entry):
+        dirs = entry.get('dirs')
+        if not isinstance(dirs, dict) or '' not in dirs:
+            return False
+        for rel_dir, mtime_ns in dirs.items():
+            try:
+                if os.stat(os.path.join(emoji_dir, rel_dir)).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def get_stats(self, emoji_dir):
+        """返回 (文件数, 字节数, 是否来自缓存)，表情目录不存在时返回 (0, 0, False)"""
+        entries = self._load()
+        key = self._key(emoji_dir)
+        entry = entries.get(key)
+        if isinstance(entry, dict) and self._is_fresh(emoji_dir, entry):
+            return entry['count'], entry['bytes'], True
+        try:
+            count, total, dirs = scan_emoji_dir(emoji_dir)
+        except OSError:
+            if entries.pop(key, None) is not None:
+                self._dirty = True
+            return 0, 0, False
+        entries[key] = {'count': count, 'bytes': total, 'dirs': dirs}
+        self._dirty = True
+        return count, total, False
+
+    def iter_accounts(self, userdata_save_path, qq_numbers=None):
+        """逐个产出 (QQ号, 文件数, 字节数, 是否来自缓存)，全部产出后保存缓存"""
+        if qq_numbers is None:
+            qq_numbers = list_accounts(userdata_save_path)
+        for qq_number in qq_numbers:
+            count, total, cached = self.get_stats(get_emoji_dir(userdata_save_path, qq_number))
+            yield qq_number, count, total, cached
+        self.save()
+
+    def save(self):
+        if not self._dirty:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'accounts': self._entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError:
+            # 缓存写不进去不影响使用，下次启动重新统计即可
+            pass
+
+
+def get_account_index():
+    return AccountIndex(os.path.join(get_app_data_dir(), '账号表情统计缓存.json'))
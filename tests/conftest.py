@@ -0,0 +1,6 @@
+# coding=utf-8
+import os
+import sys
+
+# 各模块直接放在仓库根目录，测试时从根目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
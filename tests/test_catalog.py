@@ -0,0 +1,72 @@
+# coding=utf-8
+"""表情目录和命令行查询的测试"""
+import io
+import json
+
+import cli
+from catalog import EmojiCatalog
+
+
+def add(catalog, source, seen_at, **fields):
+    catalog.add('10001', source, fields.pop('size', 10), fields.pop('mtime_ns', 1), seen_at, **fields)
+
+
+def test_upsert_keeps_first_seen_and_previous_values(tmp_path):
+    catalog = EmojiCatalog(str(tmp_path / 'catalog.db'))
+    add(catalog, '/src/a', 100.0, output_path='/out/a.gif', content_hash='h1', file_format='gif')
+    catalog.flush()
+    # 跳过的文件没有新的输出路径和哈希，只更新大小、修改时间和最近发现时间
+    add(catalog, '/src/a', 200.0, size=20, mtime_ns=2)
+    catalog.flush()
+
+    rows = catalog._query('SELECT output_path, content_hash, format, size, mtime_ns, first_seen, last_seen '
+                          'FROM emojis')
+    assert rows == [('/out/a.gif', 'h1', 'gif', 20, 2, 100.0, 200.0)]
+    assert catalog.last_export_time('10001') == 200.0
+    catalog.close()
+
+
+def test_queries(tmp_path):
+    catalog = EmojiCatalog(str(tmp_path / 'catalog.db'))
+    add(catalog, '/src/a', 100.0, output_path='/out/a.gif', content_hash='h1', size=10)
+    add(catalog, '/src/b', 300.0, output_path='/out/b.png', content_hash='h2', size=30)
+    catalog.add('10002', '/src/c', 5, 1, 400.0, output_path='/out2/c.gif', content_hash='h1')
+    catalog.flush()
+
+    assert catalog.accounts() == [('10001', 2, 40, 300.0), ('10002', 1, 5, 400.0)]
+    assert [row[1] for row in catalog.new_since(200.0)] == ['/src/b', '/src/c']
+    assert [row[1] for row in catalog.new_since(200.0, '10002')] == ['/src/c']
+    assert sorted(catalog.find_by_hash('h1')) == [('10001', '/src/a', '/out/a.gif'), ('10002', '/src/c', '/out2/c.gif')]
+    catalog.close()
+
+
+def run_query(monkeypatch, argv):
+    stdout = io.StringIO()
+    monkeypatch.setattr(cli.sys, 'stdout', stdout)
+    code = cli.main(argv)
+    return code, [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+
+def test_cli_query_same_file(tmp_path, monkeypatch):
+    emoji = tmp_path / 'a.gif'
+    emoji.write_bytes(b'GIF89a' + b'\0' * 32)
+    digest = cli.ExportEngine.new_digest()
+    digest.update(emoji.read_bytes())
+    path = str(tmp_path / 'catalog.db')
+    catalog = EmojiCatalog(path)
+    catalog.add('10001', '/src/a', 38, 1, 100.0, output_path='/out/a.gif', content_hash=digest.hexdigest())
+    catalog.close()
+
+    code, events = run_query(monkeypatch, ['--catalog', path, '--query', 'same', '--file', str(emoji)])
+
+    assert code == cli.EXIT_OK
+    assert events == [{'event': 'query', 'query': 'same', 'catalog': path,
+                       'rows': [{'qq': '10001', 'source': '/src/a', 'output': '/out/a.gif'}]}]
+
+
+def test_cli_query_without_catalog(tmp_path, monkeypatch):
+    code, events = run_query(monkeypatch, ['--catalog', str(tmp_path / 'missing.db'), '--query', 'accounts'])
+
+    assert code == cli.EXIT_CONFIG
+    assert events[0]['event'] == 'log'
+    assert not (tmp_path / 'missing.db').exists()
@@ -0,0 +1,111 @@
+# coding=utf-8
+"""导出引擎的测试，源目录和导出目录都在 pytest 的临时目录中"""
+import os
+
+from export_engine import ExportEngine, ExportManifest
+
+JPEG = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00'
+PNG = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR'
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def listdir(path):
+    return sorted(name for name in os.listdir(path))
+
+
+def test_cancel_before_any_copy_is_reported(tmp_path):
+    src, dst = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    for i in range(20):
+        write(os.path.join(src, f'{i}.png'), PNG + bytes([i]) * 100)
+    ExportEngine(workers=1).export(src, dst)
+
+    # 增量导出时所有文件都被跳过，没有正在复制的文件，取消仍应被报告
+    logs = []
+    engine = ExportEngine(workers=1, on_log=logs.append)
+    engine.cancel()
+    result = engine.export(src, dst)
+    assert result['cancelled']
+    assert "✅ 复制目录完成" not in logs
+
+
+def bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_changed_source_removes_previous_output(tmp_path):
+    src, dst = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    source = os.path.join(src, 'a.png')
+    # 扩展名是 png，内容其实是 JPEG
+    write(source, JPEG + b'old' * 100)
+    ExportEngine(workers=1).export(src, dst)
+    assert listdir(dst) == ['a.jpg']
+
+    write(source, PNG + b'new' * 100)
+    bump_mtime(source)
+    result = ExportEngine(workers=1).export(src, dst)
+    assert result['copied'] == 1
+    assert listdir(dst) == ['a.png']
+    manifest = ExportManifest(ExportManifest.manifest_path(dst), os.path.abspath(src))
+    manifest.load()
+    assert manifest.files['a.png']['output'] == 'a.png'
+
+
+def test_source_that_became_duplicate_removes_previous_output(tmp_path):
+    src, dst = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    # 根目录的文件先于子目录扫描，a.png 总是先被登记
+    duplicate = os.path.join(src, 'sub', 'b.png')
+    write(os.path.join(src, 'a.png'), PNG + b'a' * 100)
+    write(duplicate, PNG + b'b' * 100)
+    ExportEngine(workers=1).export(src, dst)
+    assert os.path.exists(os.path.join(dst, 'sub', 'b.png'))
+
+    # b.png 的内容变得与 a.png 相同
+    write(duplicate, PNG + b'a' * 100)
+    bump_mtime(duplicate)
+    result = ExportEngine(workers=1).export(src, dst)
+    assert result['duplicates'] == [('sub/b.png', 'a.png')]
+    assert listdir(os.path.join(dst, 'sub')) == []
+
+
+def contents(path):
+    result = {}
+    for name in os.listdir(path):
+        with open(os.path.join(path, name), 'rb') as f:
+            result[name] = f.read()
+    return result
+
+
+def test_name_collision_keeps_both_files_and_stable_names(tmp_path):
+    src, dst = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    # a.png 修正扩展名后与真正的 a.jpg 重名
+    write(os.path.join(src, 'a.png'), JPEG + b'1' * 100)
+    write(os.path.join(src, 'a.jpg'), JPEG + b'2' * 100)
+    for i in range(30):
+        write(os.path.join(src, f'{i}.png'), JPEG + bytes([i]) * 100)
+        write(os.path.join(src, f'{i}.jpg'), JPEG + bytes([i + 100]) * 100)
+
+    result = ExportEngine(workers=1, dedup=False).export(src, dst)
+    first = contents(dst)
+    assert result['copied'] == 62
+    assert len(first) == 62 and len(set(first.values())) == 62
+    # 只有真正修正了扩展名的文件计入 renamed，追加序号的文件单独统计
+    assert result['name_conflicts'] == result['renamed']
+    assert result['name_conflicts'] == sum('_' in name for name in first)
+
+    for kwargs in (dict(incremental=False), dict(incremental=False, workers=8), dict()):
+        ExportEngine(dedup=False, **kwargs).export(src, dst)
+        assert contents(dst) == first
+
+
+def test_collision_suffix_is_not_counted_as_format_fix(tmp_path):
+    engine = ExportEngine()
+    assert engine.count_rename('a.png', 'a.jpg') == '（已按实际格式修正扩展名）'
+    assert engine.count_rename('a.jpg', 'a_1.jpg') == '（与其他文件重名，已追加序号）'
+    assert engine.count_rename('a.jpg', 'a.jpg') == ''
+    assert (engine.renamed, engine.name_conflicts) == (1, 1)
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""文件头识别的正确性测试，覆盖容易混淆的容器格式和不完整的文件头"""
+import pytest
+
+from file_signature import FILE_SIGNATURES, SignatureClassifier, default_classifier
+
+
+def riff(form_type):
+    # RIFF 头：'RIFF' + 4 字节长度 + 4 字节类型
+    return b'RIFF' + b'\x24\x08\x00\x00' + form_type + b'\x00' * 16
+
+
+def ftyp(brand):
+    # ISO BMFF：4 字节 box 长度 + 'ftyp' + 主品牌
+    return b'\x00\x00\x00\x18ftyp' + brand + b'\x00\x00\x00\x00mif1'
+
+
+@pytest.mark.parametrize('header, expected', [
+    (b'\xff\xd8\xff\xe0\x00\x10JFIF\x00', 'jpg'),
+    (b'\xff\xd8\xff\xe1\x00\x10Exif\x00', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR', 'png'),
+    (b'GIF87a\x01\x00\x01\x00', 'gif'),
+    (b'GIF89a\x01\x00\x01\x00', 'gif'),
+    (b'BM\x36\x00\x00\x00', 'bmp'),
+    (b'II*\x00\x08\x00\x00\x00', 'tiff'),
+    (b'MM\x00*\x00\x00\x00\x08', 'tiff'),
+    (b'\x00\x00\x01\x00\x01\x00', 'ico'),
+    (b'\x00\x00\x02\x00\x01\x00', 'ico'),
+    (b'8BPS\x00\x01', 'psd'),
+    (b'<?xml version="1.0"?>', 'svg'),
+    (b'<svg xmlns="http://www.w3.org/2000/svg">', 'svg'),
+])
+def test_common_formats(header, expected):
+    assert default_classifier.classify(header) == expected
+
+
+@pytest.mark.parametrize('form_type, expected', [
+    (b'WEBP', 'webp'),
+    # wav 和 avi 同样是 RIFF 容器，不能识别为 webp
+    (b'WAVE', None),
+    (b'AVI ', None),
+])
+def test_riff_container(form_type, expected):
+    assert default_classifier.classify(riff(form_type)) == expected
+
+
+@pytest.mark.parametrize('brand, expected', [
+    (b'heic', 'heic'),
+    (b'heix', 'heic'),
+    (b'hevc', 'heic'),
+    (b'hevx', 'heic'),
+    (b'avif', 'avif'),
+    (b'avis', 'avif'),
+    # 同样以 ftyp 开头的 mp4、mov 不是图片
+    (b'isom', None),
+    (b'qt  ', None),
+])
+def test_iso_bmff_brand_at_offset_4(brand, expected):
+    assert default_classifier.classify(ftyp(brand)) == expected
+
+
+def test_brand_is_not_matched_at_offset_0():
+    assert default_classifier.classify(b'ftypheic\x00\x00\x00\x00') is None
+
+
+@pytest.mark.parametrize('header', [
+    b'',
+    b'\xff',
+    b'\xff\xd8',
+    b'\x89PNG',
+    b'GIF8',
+    b'RIFF',
+    b'RIFF\x24\x08\x00\x00',
+    b'RIFF\x24\x08\x00\x00WEB',
+    b'\x00\x00\x00\x18ftyphei',
+    b'\x00\x00\x00',
+])
+def test_truncated_header(header):
+    assert default_classifier.classify(header) is None
+
+
+def test_unknown_header():
+    assert default_classifier.classify(b'hello world, not an image') is None
+
+
+def test_header_size_covers_every_rule():
+    assert default_classifier.header_size == max(
+        offset + len(magic) for _, fields in FILE_SIGNATURES for offset, magic in fields)
+    # 读取 header_size 字节就足以识别所有规则
+    assert default_classifier.classify(riff(b'WEBP')[:default_classifier.header_size]) == 'webp'
+    assert default_classifier.classify(ftyp(b'avif')[:default_classifier.header_size]) == 'avif'
+
+
+def test_rule_order_within_same_offset():
+    classifier = SignatureClassifier((('first', ((0, b'AB'),)), ('second', ((0, b'ABC'),))))
+    assert classifier.classify(b'ABCD') == 'first'
+
+
+def test_smaller_offset_wins():
+    classifier = SignatureClassifier((('late', ((4, b'XY'),)), ('early', ((0, b'AB'),))))
+    assert classifier.classify(b'ABcdXY') == 'early'
+    assert classifier.classify(b'zzzzXY') == 'late'
+
+
+def test_classify_many_matches_classify():
+    headers = [riff(b'WEBP'), riff(b'WAVE'), ftyp(b'heic'), b'', b'GIF89a']
+    assert default_classifier.classify_many(headers) == [default_classifier.classify(h) for h in headers]
@@ -0,0 +1,42 @@
+# coding=utf-8
+"""缩略图缓存的测试，需要 PyQt5"""
+import os
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from gallery import ThumbnailCache
+
+
+def test_file_index_survives_reload_and_detects_changes(tmp_path):
+    source = tmp_path / 'a.gif'
+    source.write_bytes(b'GIF89a' + b'\0' * 32)
+    stat = os.stat(source)
+
+    cache = ThumbnailCache(str(tmp_path / 'cache'))
+    assert cache.key_for_file(str(source), stat) is None
+    cache.remember_file(str(source), stat, 'k' * 32)
+    cache.save_index()
+
+    reloaded = ThumbnailCache(str(tmp_path / 'cache'))
+    assert reloaded.key_for_file(str(source), stat) == 'k' * 32
+
+    source.write_bytes(b'GIF89a' + b'\1' * 64)
+    assert reloaded.key_for_file(str(source), os.stat(source)) is None
+
+
+def test_evicted_thumbnails_are_dropped_from_index(tmp_path):
+    cache = ThumbnailCache(str(tmp_path / 'cache'), max_bytes=1)
+    stat = os.stat(tmp_path)
+    key = 'ab' * 16
+    thumbnail = cache.path_for(key)
+    os.makedirs(os.path.dirname(thumbnail))
+    with open(thumbnail, 'wb') as f:
+        f.write(b'\0' * 16)
+    cache.remember_file('a.gif', stat, key)
+
+    cache._evict()
+
+    assert not os.path.exists(thumbnail)
+    assert cache.key_for_file('a.gif', stat) is None
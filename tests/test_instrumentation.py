@@ -0,0 +1,22 @@
+# coding=utf-8
+"""性能分析的测试"""
+import pstats
+import threading
+
+import instrumentation
+
+
+def work_in_thread():
+    return sum(range(1000))
+
+
+def test_profile_includes_worker_threads(tmp_path):
+    path = str(tmp_path / 'export.prof')
+    with instrumentation.maybe_profile(path):
+        thread = threading.Thread(target=work_in_thread)
+        thread.start()
+        thread.join()
+
+    names = {function for _, _, function in pstats.Stats(path).stats}
+    assert 'work_in_thread' in names
+    assert 'join' in names
@@ -0,0 +1,67 @@
+# coding=utf-8
+"""相似表情查找的测试，需要 numpy 和 Pillow"""
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+
+from near_dup import NearDuplicateFinder
+
+
+def brute_force_pairs(values, threshold):
+    return {(i, j) for i in range(len(values)) for j in range(i + 1, len(values))
+            if bin(values[i] ^ values[j]).count('1') <= threshold}
+
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def similar_values(count, rng):
+    # 每个基准值附近生成几个汉明距离很小的值
+    values = []
+    while len(values) < count:
+        base = rng.getrandbits(64)
+        values.append(base)
+        for _ in range(rng.randint(0, 3)):
+            values.append(flip_bits(base, rng.randint(1, 8), rng))
+    return values[:count]
+
+
+@pytest.mark.parametrize('size, block', [(5, 1), (5, 2), (7, 3), (6, 4), (9, 9)])
+def test_compare_bucket_uses_every_member_as_row(size, block):
+    finder = NearDuplicateFinder(threshold=64)
+    # 每次比较 block 行
+    finder.COMPARE_BLOCK = block * size
+    array = np.array([random.Random(i).getrandbits(64) for i in range(size)], dtype=np.uint64)
+    # 桶内成员的顺序不一定与下标顺序相同，最后一个成员的下标最小
+    members = np.arange(size)[::-1]
+    pairs = set(finder._compare_bucket(array, members))
+    # threshold 为 64 时任意两个哈希值都相似
+    assert pairs == {(i, j) for i in range(size) for j in range(i + 1, size)}
+
+
+@pytest.mark.parametrize('threshold', [0, 4, 6, 10])
+def test_similar_pairs_matches_brute_force(threshold):
+    rng = random.Random(threshold)
+    values = list(dict.fromkeys(similar_values(301, rng)))
+    finder = NearDuplicateFinder(threshold=threshold)
+    finder.COMPARE_BLOCK = 7 * 3
+    assert finder._similar_pairs(values) == brute_force_pairs(values, threshold)
+
+
+def test_find_clusters_groups_identical_and_similar_hashes():
+    finder = NearDuplicateFinder(threshold=2)
+    base = 0x0123456789ABCDEF
+    hashes = {
+        'a.png': base,
+        'b.png': base,
+        'c.png': base ^ 0b11,
+        'd.png': base ^ (0xFFFF << 32),
+        'e.png': 0,
+    }
+    assert finder.find_clusters(hashes) == [['a.png', 'b.png', 'c.png']]
@@ -0,0 +1,114 @@
+# coding=utf-8
+"""NicknameResolver 的测试，使用本机的 HTTP 桩服务器，不访问外网"""
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+from nickname import NicknameResolver
+
+# 桩服务器的读取超时，卡住的请求应在此时间左右失败
+READ_TIMEOUT = 0.5
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """按 qq 参数返回不同的响应"""
+
+    def do_GET(self):
+        qq = parse_qs(urlparse(self.path).query).get('qq', [''])[0]
+        if qq == 'stall':
+            # 不返回任何数据，直到测试结束
+            self.server.release.wait(10)
+            return
+        if qq == 'delayed':
+            time.sleep(0.4)
+        if qq == 'error':
+            self.reply(500, {'nickname': '不应被采用'})
+        elif qq == 'html':
+            self.reply(200, b'<html>not json</html>')
+        elif qq == 'list':
+            self.reply(200, ['a', 'b'])
+        elif qq == 'empty':
+            self.reply(200, {'nickname': None})
+        else:
+            self.reply(200, {'code': 200, 'nickname': f'昵称{qq}'})
+
+    def reply(self, status, body):
+        data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.release = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}/userinfo'
+    finally:
+        server.release.set()
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def resolver(api_url):
+    resolver = NicknameResolver(api_url=api_url, max_workers=4, timeout=(1, READ_TIMEOUT))
+    yield resolver
+    resolver.close()
+
+
+def test_fast_answer(resolver):
+    assert resolver.fetch('12345') == '昵称12345'
+
+
+def test_stalled_read_hits_timeout(resolver):
+    start = time.monotonic()
+    assert resolver.fetch('stall') == ''
+    elapsed = time.monotonic() - start
+    assert READ_TIMEOUT * 0.8 <= elapsed < READ_TIMEOUT + 2
+
+
+@pytest.mark.parametrize('qq', ['error', 'html', 'list', 'empty'])
+def test_bad_responses_return_empty(resolver, qq):
+    assert resolver.fetch(qq) == ''
+
+
+def test_connection_refused():
+    # 没有服务监听的端口
+    resolver = NicknameResolver(api_url='http://127.0.0.1:9/userinfo', timeout=(1, READ_TIMEOUT))
+    try:
+        assert resolver.fetch('12345') == ''
+    finally:
+        resolver.close()
+
+
+def test_resolve_many_yields_in_completion_order(resolver):
+    results = list(resolver.resolve_many(['delayed', '111', '222']))
+    assert dict(results) == {'delayed': '昵称delayed', '111': '昵称111', '222': '昵称222'}
+    # 慢的请求最后完成，不会挡住其他结果
+    assert results[-1][0] == 'delayed'
+
+
+def test_resolve_many_runs_concurrently(resolver):
+    start = time.monotonic()
+    results = dict(resolver.resolve_many(['delayed', 'stall', '1', '2']))
+    # 串行时至少需要 0.4 + READ_TIMEOUT 秒
+    assert time.monotonic() - start < 0.4 + READ_TIMEOUT
+    assert results['stall'] == '' and results['1'] == '昵称1'
+
+
+def test_resolve_many_empty(resolver):
+    assert list(resolver.resolve_many([])) == []
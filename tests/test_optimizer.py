@@ -0,0 +1,58 @@
+# coding=utf-8
+"""导出后处理图片的测试，需要 Pillow"""
+import os
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from catalog import EmojiCatalog
+from export_engine import ExportEngine
+from optimizer import ImageOptimizer, content_hash
+
+
+def save_image(path, save_format, **options):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new('RGB', (64, 64), (200, 30, 30)).save(path, save_format, **options)
+
+
+def test_name_taken_by_another_file_is_retried_next_time(tmp_path):
+    directory = str(tmp_path / 'out')
+    save_image(os.path.join(directory, 'a.jpg'), 'JPEG')
+    save_image(os.path.join(directory, 'a.png'), 'PNG')
+    record = str(tmp_path / 'record.json')
+
+    ImageOptimizer('png', max_workers=1).run(directory, record)
+    assert os.path.exists(os.path.join(directory, 'a.jpg'))
+
+    # 占用文件名的文件删除后，下次应该重新转换，而不是当作已处理跳过
+    os.remove(os.path.join(directory, 'a.png'))
+    report = ImageOptimizer('png', max_workers=1).run(directory, record)
+    assert report['renamed'] == {'a.jpg': 'a.png'}
+    assert report['skipped'] == 0
+
+
+def test_in_place_optimization_updates_catalog(tmp_path):
+    src, dst = str(tmp_path / 'src'), str(tmp_path / 'dst')
+    save_image(os.path.join(src, 'a.png'), 'PNG', compress_level=0)
+    catalog = EmojiCatalog(str(tmp_path / 'catalog.db'))
+    engine = ExportEngine(workers=1, catalog=catalog, account='10001')
+    engine.export(src, dst)
+
+    report = ImageOptimizer('lossless', max_workers=1).run(dst, str(tmp_path / 'record.json'))
+    assert report['optimized'] == 1
+    engine.rename_outputs(dst, report['renamed'])
+    engine.update_output_contents(dst, report['rewritten'])
+    catalog.flush()
+
+    output = os.path.join(dst, 'a.png')
+    with open(output, 'rb') as f:
+        data = f.read()
+    query = 'SELECT content_hash, size FROM emojis'
+    assert catalog._query(query) == [(content_hash(data), len(data))]
+
+    # 源文件没有变化，再次增量导出时保留压缩后的大小
+    ExportEngine(workers=1, catalog=catalog, account='10001').export(src, dst)
+    catalog.flush()
+    assert catalog._query(query) == [(content_hash(data), len(data))]
+    catalog.close()